@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from metrics import ADMISSION_WAIT, ADMISSIONS, REGISTRY
+
+# Admission control for graph runs (/start, /submit-essay and /ws actions of both apps).
+#
+# At most ADMISSION_MAX_ACTIVE runs execute at once per process, and one client may have
+# at most ADMISSION_PER_CLIENT runs active or waiting. Runs beyond the global limit wait in
+# a bounded queue (ADMISSION_QUEUE) for up to ADMISSION_QUEUE_TIMEOUT seconds; when the
+# queue is full, or the deadline passes, the run is refused straight away with a retry
+# hint (503 / {"type": "busy"}) rather than joining a backlog that would slow everyone.
+#
+# Resubmissions of a draft that already got feedback are queued ahead of new sessions:
+# those students are mid-loop, and a new session's first run is the cheaper one to defer.
+# A resubmission arriving at a full queue takes the place of the newest waiting new session.
+
+RESUBMISSION = 0
+NEW_SESSION = 1
+PRIORITY_NAMES = {RESUBMISSION: "resubmission", NEW_SESSION: "new"}
+
+class Busy(Exception):
+    """A run was refused: reason is "client_limit", "queue_full", "displaced" or "timeout"."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def frame(self) -> dict:
+        return {"type": "busy", "reason": self.reason, "retry_after": self.retry_after}
+
+class Ticket:
+    __slots__ = ("client", "priority", "started")
+
+    def __init__(self, client, priority: int):
+        self.client = client
+        self.priority = priority
+        self.started = time.monotonic()
+
+def client_key(connection) -> str:
+    """Who a request or WebSocket counts against: an X-Client-Id header, else the peer address."""
+    client_id = connection.headers.get("x-client-id")
+    if client_id:
+        return client_id
+    return connection.client.host if connection.client else "unknown"
+
+class AdmissionController:
+    def __init__(self, max_active: int = 0, per_client: int = 0, queue_size: int = 64,
+                 queue_timeout: float = 10.0):
+        # 0 = no limit; with both limits off every run is admitted at once
+        self.max_active = max_active
+        self.per_client = per_client
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self.clients = {}
+        # Recent run duration, for the retry hint
+        self.run_seconds = 1.0
+        self._waiters = []
+        self._order = itertools.count()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_active=int(os.getenv("ADMISSION_MAX_ACTIVE", "0")),
+            per_client=int(os.getenv("ADMISSION_PER_CLIENT", "0")),
+            queue_size=int(os.getenv("ADMISSION_QUEUE", "64")),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+        )
+
+    def retry_after(self) -> int:
+        """Seconds until a retry is likely to be admitted: the queue ahead drained at the current pace."""
+        ahead = self.queued + 1
+        slots = self.max_active or 1
+        return max(1, min(60, math.ceil(self.run_seconds * ahead / slots)))
+
+    def _refuse(self, reason: str, priority: int):
+        ADMISSIONS.inc(outcome=reason, priority=PRIORITY_NAMES[priority])
+        return Busy(reason, self.retry_after())
+
+    def _leave(self, client):
+        self.clients[client] -= 1
+        if not self.clients[client]:
+            del self.clients[client]
+
+    def _grant(self):
+        while self._waiters and (not self.max_active or self.active < self.max_active):
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self.queued -= 1
+            self.active += 1
+            waiter.set_result(True)
+
+    def _displace(self, priority: int) -> bool:
+        """Frees a queue place for `priority` by refusing the newest lower-priority waiter."""
+        worst = max((entry for entry in self._waiters if not entry[2].done()), default=None)
+        if worst is None or worst[0] <= priority:
+            return False
+        worst[2].set_result(False)
+        self.queued -= 1
+        return True
+
+    async def acquire(self, client, priority: int = NEW_SESSION) -> Ticket:
+        """Waits for a run slot; raises Busy if the client or the queue is full or the deadline passes."""
+        if self.per_client and self.clients.get(client, 0) >= self.per_client:
+            raise self._refuse("client_limit", priority)
+        ticket = Ticket(client, priority)
+        if not self.max_active or (self.active < self.max_active and not self.queued):
+            self.active += 1
+            self.clients[client] = self.clients.get(client, 0) + 1
+            ADMISSIONS.inc(outcome="admitted", priority=PRIORITY_NAMES[priority])
+            ADMISSION_WAIT.observe(0.0, priority=PRIORITY_NAMES[priority])
+            return ticket
+        if self.queued >= self.queue_size and not self._displace(priority):
+            raise self._refuse("queue_full", priority)
+
+        if len(self._waiters) > 2 * self.queue_size:
+            # Drop entries of waiters that timed out or were displaced
+            self._waiters = [entry for entry in self._waiters if not entry[2].done()]
+            heapq.heapify(self._waiters)
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        self.queued += 1
+        self.clients[client] = self.clients.get(client, 0) + 1
+        try:
+            # shield: on timeout or cancellation the waiter is inspected, not cancelled
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and waiter.result():
+                # Granted just as the wait ended
+                ticket.started = time.monotonic()
+                if isinstance(e, asyncio.CancelledError):
+                    self.release(ticket)
+                    raise
+                return ticket
+            if not waiter.done():
+                waiter.cancel()
+                self.queued -= 1
+            self._leave(client)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._refuse("timeout", priority)
+        if not waiter.result():
+            self._leave(client)
+            raise self._refuse("displaced", priority)
+        now = time.monotonic()
+        ADMISSIONS.inc(outcome="admitted", priority=PRIORITY_NAMES[priority])
+        ADMISSION_WAIT.observe(now - ticket.started, priority=PRIORITY_NAMES[priority])
+        ticket.started = now
+        return ticket
+
+    def release(self, ticket: Ticket):
+        self.active -= 1
+        self._leave(ticket.client)
+        self.run_seconds = 0.8 * self.run_seconds + 0.2 * (time.monotonic() - ticket.started)
+        self._grant()
+
+    @asynccontextmanager
+    async def admitted(self, client, priority: int = NEW_SESSION):
+        ticket = await self.acquire(client, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        return {"active": self.active, "queued": self.queued, "clients": len(self.clients),
+                "retry_after": self.retry_after()}
+
+admission = AdmissionController.from_env()
+
+def _admission_gauges():
+    stats = admission.stats()
+    return {
+        "essay_admission_active": ("Graph runs admitted and not yet finished.", stats["active"]),
+        "essay_admission_queued": ("Graph runs waiting for admission.", stats["queued"]),
+    }
+
+REGISTRY.add_collector(_admission_gauges)
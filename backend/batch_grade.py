@@ -0,0 +1,243 @@
+"""
+Batch grading: runs every (topic, essay) record of a JSONL file through the essay graph.
+
+    python backend/batch_grade.py essays.jsonl -o graded.jsonl --concurrency 16
+
+Input lines look like {"id": "c12-007", "topic": "...", "essay": "..."} ("essay_content"
+is accepted too; records without an id are keyed by line number, and a repeated id is
+warned about). Each record is graded as its own graph thread, starting at collect_essay
+with the given topic. A result line is appended to the output as soon as its record
+finishes:
+
+    {"id", "topic", "clarity_score", "depth_score", "vocab_score", "total_score", "passed",
+     "feedback", "cached", "seconds"}    or    {"id", "error"}
+
+With --prescore (default: the PRESCORE setting) records are first run through the local
+NumPy pre-scorer in batches; results gain "provisional" scores, and in gate mode records
+it rejects are written straight away with "rejected" set, without running the graph.
+With --near-dup seed or reuse (default: the NEAR_DUP setting), records that match an
+essay graded earlier on the same topic (in this run or, with NEAR_DUP_PATH, a previous
+one) gain "near_duplicate"; in reuse mode they take its scores without evaluator calls.
+
+The output file is the resume log: re-running the same command skips records already
+in it (add --retry-failed to grade errored records again), so a crashed run resumes
+where it stopped. <output>.progress holds running totals for monitoring.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from graph import NEAR_DUP, PRESCORE, PRESCORE_MIN_WORDS, build_workflow, check_pass_fail
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def read_records(path):
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record.setdefault("id", f"line-{number}")
+            if str(record["id"]) in seen:
+                # Still graded, but results and the resume log are keyed by id
+                print(f"[batch] line {number}: id {record['id']!r} repeats an earlier record; "
+                      f"results and resuming are keyed by id", file=sys.stderr)
+            seen.add(str(record["id"]))
+            yield record
+
+def essay_of(record):
+    return record.get("essay", record.get("essay_content", ""))
+
+def load_finished(path, retry_failed: bool):
+    """Ids already graded in an earlier run. Drops a torn last line left by a crash."""
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    good_bytes = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            try:
+                result = json.loads(raw)
+            except ValueError:
+                break
+            good_bytes += len(raw)
+            if not (retry_failed and "error" in result):
+                finished.add(str(result["id"]))
+    if good_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_bytes)
+    return finished
+
+class BatchGrader:
+    def __init__(self, graph_app, output, progress_path, concurrency: int, checkpoint_every: int,
+                 prescorer=None):
+        self.graph_app = graph_app
+        self.prescorer = prescorer
+        self.output = output
+        self.progress_path = progress_path
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+        self.latencies = []
+        self.graded = 0
+        self.failed = 0
+        self.passed = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self._threads = itertools.count()
+
+    async def grade(self, record):
+        # Ids may repeat in the input; each record still gets a thread of its own
+        thread_id = f"batch-{record['id']}-{next(self._threads)}"
+        config = {"configurable": {"thread_id": thread_id}}
+        essay = essay_of(record)
+        t0 = time.perf_counter()
+        try:
+            # Start the thread at collect_essay with the record's topic instead of generating one
+            await self.graph_app.aupdate_state(
+                config, {"topic": record.get("topic", ""), "essay_content": essay, "revision_count": 0},
+                as_node="collect_essay",
+            )
+            cached = []
+            async for event in self.graph_app.astream(None, config=config):
+                for node, data in event.items():
+                    if isinstance(data, dict) and node in data.get("cache_hits", []):
+                        cached.append(node)
+            values = (await self.graph_app.aget_state(config)).values
+            result = {
+                "id": record["id"],
+                "topic": values.get("topic"),
+                "clarity_score": values.get("clarity_score"),
+                "depth_score": values.get("depth_score"),
+                "vocab_score": values.get("vocab_score"),
+                "total_score": values.get("total_score"),
+                "passed": check_pass_fail(values) == "pass",
+                "feedback": values.get("feedback"),
+                "cached": cached,
+                "seconds": round(time.perf_counter() - t0, 3),
+            }
+            if "provisional" in record:
+                result["provisional"] = record["provisional"]
+            if values.get("near_duplicate"):
+                result["near_duplicate"] = values["near_duplicate"]
+        except Exception as error:
+            result = {"id": record["id"], "error": f"{type(error).__name__}: {error}"}
+        finally:
+            await asyncio.to_thread(self.graph_app.checkpointer.delete_thread, thread_id)
+        return result
+
+    def record(self, result):
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.output.flush()
+        if "error" in result:
+            self.failed += 1
+            print(f"[batch] {result['id']} failed: {result['error']}", file=sys.stderr)
+        else:
+            self.graded += 1
+            self.passed += result["passed"]
+            if "rejected" in result:
+                self.rejected += 1
+            else:
+                self.latencies.append(result["seconds"])
+        if (self.graded + self.failed) % self.checkpoint_every == 0:
+            self.write_progress()
+
+    def write_progress(self):
+        os.fsync(self.output.fileno())
+        progress = {"graded": self.graded, "failed": self.failed, "passed": self.passed, "rejected": self.rejected,
+                    "elapsed": round(time.perf_counter() - self.started, 3), "updated_at": time.time()}
+        tmp = self.progress_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp, self.progress_path)
+
+    def screen(self, records, batch_size: int = 256):
+        """Pre-scores records a batch at a time; gate rejections are recorded without running the graph."""
+        from prescore import REJECTION_FEEDBACK
+        records = iter(records)
+        while batch := list(itertools.islice(records, batch_size)):
+            results = self.prescorer.score([r.get("topic", "") for r in batch], [essay_of(r) for r in batch])
+            for record, result in zip(batch, results):
+                reason = result.pop("rejected")
+                if not reason:
+                    yield {**record, "provisional": result}
+                    continue
+                self.record({
+                    "id": record["id"], "topic": record.get("topic"),
+                    "clarity_score": 0, "depth_score": 0, "vocab_score": 0, "total_score": 0, "passed": False,
+                    "feedback": REJECTION_FEEDBACK[reason], "rejected": reason, "provisional": result,
+                    "cached": [], "seconds": 0.0,
+                })
+
+    async def run(self, records):
+        if self.prescorer is not None and self.prescorer.enabled:
+            records = self.screen(records)
+        pending = iter(records)
+
+        async def worker():
+            for record in pending:
+                self.record(await self.grade(record))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        self.write_progress()
+
+    def summary(self, skipped: int):
+        elapsed = time.perf_counter() - self.started
+        print(f"\nGraded {self.graded} essays ({self.failed} failed, {skipped} already done) in {elapsed:.1f}s")
+        if self.graded:
+            print(f"  throughput  {self.graded / elapsed:.2f} essays/s at concurrency {self.concurrency}")
+        if self.rejected:
+            print(f"  rejected    {self.rejected} by pre-scoring, without LLM calls")
+        if self.latencies:
+            print(f"  latency     p50 {percentile(self.latencies, 50):.2f}s  p95 {percentile(self.latencies, 95):.2f}s"
+                  f"  max {max(self.latencies):.2f}s")
+        if self.graded:
+            print(f"  pass rate   {self.passed / self.graded:.1%}")
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of {id, topic, essay} records")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file (appended to; also the resume log)")
+    parser.add_argument("--concurrency", type=int, default=16, help="records graded at the same time")
+    parser.add_argument("--no-feedback", action="store_true", help="score only; skip generate_feedback for failing essays")
+    parser.add_argument("--retry-failed", action="store_true", help="grade records that errored in an earlier run again")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="records between progress checkpoints")
+    parser.add_argument("--prescore", default=PRESCORE, choices=["off", "provisional", "gate"],
+                        help="batch pre-scoring before the graph (gate: reject unfit essays without LLM calls)")
+    parser.add_argument("--near-dup", default=NEAR_DUP, choices=["off", "seed", "reuse"],
+                        help="flag near-duplicates of essays graded before (reuse: take their scores without LLM calls)")
+    args = parser.parse_args(argv)
+
+    # Batch threads end after one grading pass: no loop back to collect_essay, no feedback if disabled
+    interrupt = ["collect_essay"] + (["generate_feedback"] if args.no_feedback else [])
+    # Pre-scoring runs here in batches, so the graph itself is built without its prescore node
+    graph_app = build_workflow(prescore="off", near_dup=args.near_dup).compile(checkpointer=MemorySaver(), interrupt_before=interrupt)
+    # prescore.py needs NumPy, so it is only imported when pre-scoring is on
+    prescorer = None
+    if args.prescore != "off":
+        from prescore import PreScorer
+        prescorer = PreScorer(args.prescore, PRESCORE_MIN_WORDS)
+
+    finished = load_finished(args.output, args.retry_failed)
+    records = (r for r in read_records(args.input) if str(r["id"]) not in finished)
+    skipped = len(finished)
+    if skipped:
+        print(f"Resuming: {skipped} records already in {args.output}")
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        grader = BatchGrader(graph_app, output, args.output + ".progress", args.concurrency, args.checkpoint_every,
+                             prescorer)
+        asyncio.run(grader.run(records))
+    grader.summary(skipped)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,528 @@
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from revisions import apply_delta, text_delta
+
+# Checkpointer backends for the compiled graph.
+# Every WebSocket / HTTP session is its own thread_id, so both backends bound retention:
+#   ttl          - threads idle longer than this many seconds are deleted
+#   max_threads  - beyond this many threads, the least recently used are deleted
+#   max_versions - checkpoints kept per thread (resuming only needs the latest one)
+# Eviction runs lazily from put(), at most once per sweep_interval seconds.
+#
+# The sqlite backend is also the multi-worker mode: checkpoints (including the pending
+# interrupt before collect_essay) live in the shared CHECKPOINT_DB file, so any worker or
+# replica on the host can resume a thread started by another one. "memory" is per-process.
+# Both backends also hold run leases (see RunLease): one graph run per thread at a time,
+# across every worker sharing the backend.
+#
+# With delta_min_chars set (CHECKPOINT_DELTA_MIN_CHARS), string channel values of at least
+# that many characters (the essay, its scored copy, the feedback) are stored once per thread
+# and referenced from checkpoints and pending writes. A new value of a channel is stored
+# as a word-level delta against the channel's previous value (a revision of the essay
+# costs about the size of the edit); identical values, across checkpoints or channels,
+# are stored once. Every MAX_DELTA_CHAIN-th version is stored whole to bound reads.
+
+# Marks a checkpoint value that is a reference into the thread's stored strings
+STRING_REF = "\x00checkpoint-string:"
+MAX_DELTA_CHAIN = 8
+# Entries a thread may accumulate before the ones no kept checkpoint needs are deleted
+PRUNE_STRINGS_AT = 24
+
+def string_key(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+class DeltaStringsMixin:
+    """
+    Stores large string channel values of a thread as references to deduplicated,
+    delta-encoded entries. Subclasses store entries (thread, key) -> (channel, base, depth, body),
+    where body is the text (base None) or the JSON delta against the entry `base`.
+    """
+
+    delta_min_chars = 0
+    # Decoded texts by key (content addressed, so shared by all threads)
+    _texts = OrderedDict()
+    _texts_lock = threading.Lock()
+
+    def _encode(self, thread_id: str, channel: str, value):
+        if not self.delta_min_chars or not isinstance(value, str) or len(value) < self.delta_min_chars:
+            return value
+        key = string_key(value)
+        if self._load_entry(thread_id, key) is None:
+            base, depth, body = None, 0, value
+            previous = self._latest_entry(thread_id, channel)
+            if previous is not None and previous[1] < MAX_DELTA_CHAIN:
+                delta = json.dumps(text_delta(self._text(thread_id, previous[0]), value), separators=(",", ":"))
+                if len(delta) < len(value) // 2:
+                    base, depth, body = previous[0], previous[1] + 1, delta
+            self._save_entry(thread_id, key, channel, base, depth, body)
+            self._remember(key, value)
+        return STRING_REF + key
+
+    def _decode(self, thread_id: str, value):
+        if isinstance(value, str) and value.startswith(STRING_REF):
+            return self._text(thread_id, value[len(STRING_REF):])
+        return value
+
+    def _remember(self, key: str, text: str):
+        with self._texts_lock:
+            self._texts[key] = text
+            self._texts.move_to_end(key)
+            while len(self._texts) > 512:
+                self._texts.popitem(last=False)
+
+    def _text(self, thread_id: str, key: str) -> str:
+        with self._texts_lock:
+            text = self._texts.get(key)
+        if text is None:
+            _, base, _, body = self._load_entry(thread_id, key)
+            text = body if base is None else apply_delta(self._text(thread_id, base), json.loads(body))
+            self._remember(key, text)
+        return text
+
+    def _encode_checkpoint(self, config, checkpoint):
+        thread_id = config["configurable"]["thread_id"]
+        values = {k: self._encode(thread_id, k, v) for k, v in checkpoint["channel_values"].items()}
+        return {**checkpoint, "channel_values": values}
+
+    def _decode_tuple(self, result):
+        if result is None:
+            return result
+        thread_id = result.config["configurable"]["thread_id"]
+        checkpoint = result.checkpoint
+        values = {k: self._decode(thread_id, v) for k, v in checkpoint["channel_values"].items()}
+        writes = [(task, channel, self._decode(thread_id, value)) for task, channel, value in result.pending_writes or []]
+        return result._replace(checkpoint={**checkpoint, "channel_values": values},
+                               pending_writes=writes if result.pending_writes is not None else None)
+
+    def _should_prune(self, thread_id: str, entries: int) -> bool:
+        # Again once the thread has twice as many entries as its last pruning kept
+        return bool(self.delta_min_chars) and entries >= self._prune_at.get(thread_id, PRUNE_STRINGS_AT)
+
+    def _unreferenced(self, thread_id: str, values, bases: dict) -> set:
+        """
+        Keys of a thread's entries (bases: key -> base key) that none of `values` (the
+        stored checkpoint values and pending writes) is decoded from.
+        """
+        keep, pending = set(), [v[len(STRING_REF):] for v in values if isinstance(v, str) and v.startswith(STRING_REF)]
+        while pending:
+            key = pending.pop()
+            if key not in keep and key in bases:
+                keep.add(key)
+                if bases[key] is not None:
+                    pending.append(bases[key])
+        self._prune_at[thread_id] = max(PRUNE_STRINGS_AT, 2 * len(keep))
+        return set(bases) - keep
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        return super().put(config, self._encode_checkpoint(config, checkpoint), metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        writes = [(channel, self._encode(thread_id, channel, value)) for channel, value in writes]
+        return super().put_writes(config, writes, task_id, task_path)
+
+    def get_tuple(self, config):
+        return self._decode_tuple(super().get_tuple(config))
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # Read everything first: SqliteSaver holds its connection lock while listing
+        for item in list(super().list(config, filter=filter, before=before, limit=limit)):
+            yield self._decode_tuple(item)
+
+class BoundedSqliteSaver(DeltaStringsMixin, SqliteSaver):
+    """
+    SQLite-file checkpointer with idle-thread eviction and per-thread version limits.
+    Unlike SqliteSaver it also implements the async API (on a worker thread), so the same
+    instance serves the sync CLI and the async FastAPI apps.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, ttl: float = 24 * 3600, max_threads: int = 10_000,
+                 max_versions: int = 5, sweep_interval: float = 60.0, delta_min_chars: int = 0, serde=None):
+        super().__init__(conn, serde=serde)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.max_versions = max_versions
+        self.sweep_interval = sweep_interval
+        self.delta_min_chars = delta_min_chars
+        self._last_sweep = 0.0
+        self._prune_at = {}
+
+    @classmethod
+    def from_path(cls, path: str, busy_timeout: float = 30.0, **kwargs):
+        # Several uvicorn workers may share the file: wait for their write locks instead of failing
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout)
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_activity_last_access ON thread_activity (last_access);
+            CREATE TABLE IF NOT EXISTS checkpoint_strings (
+                thread_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                base TEXT,
+                depth INTEGER NOT NULL,
+                body TEXT NOT NULL,
+                PRIMARY KEY (thread_id, key)
+            );
+            CREATE TABLE IF NOT EXISTS run_leases (
+                thread_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            """
+        )
+
+    def acquire_run(self, thread_id: str, owner: str, ttl: float) -> bool:
+        """Takes the thread's run lease unless another owner holds an unexpired one."""
+        now = time.time()
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO run_leases (thread_id, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE run_leases.expires_at < ? OR run_leases.owner = excluded.owner",
+                (str(thread_id), owner, now + ttl, now),
+            )
+            return cur.rowcount == 1
+
+    def renew_run(self, thread_id: str, owner: str, ttl: float) -> bool:
+        with self.cursor() as cur:
+            cur.execute("UPDATE run_leases SET expires_at = ? WHERE thread_id = ? AND owner = ?",
+                        (time.time() + ttl, str(thread_id), owner))
+            return cur.rowcount == 1
+
+    def release_run(self, thread_id: str, owner: str) -> None:
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM run_leases WHERE thread_id = ? AND owner = ?", (str(thread_id), owner))
+
+    def _load_entry(self, thread_id: str, key: str):
+        with self.cursor(transaction=False) as cur:
+            return cur.execute(
+                "SELECT channel, base, depth, body FROM checkpoint_strings WHERE thread_id = ? AND key = ?",
+                (str(thread_id), key),
+            ).fetchone()
+
+    def _latest_entry(self, thread_id: str, channel: str):
+        with self.cursor(transaction=False) as cur:
+            return cur.execute(
+                "SELECT key, depth FROM checkpoint_strings WHERE thread_id = ? AND channel = ? ORDER BY rowid DESC LIMIT 1",
+                (str(thread_id), channel),
+            ).fetchone()
+
+    def _save_entry(self, thread_id: str, key: str, channel: str, base, depth: int, body: str):
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR IGNORE INTO checkpoint_strings (thread_id, key, channel, base, depth, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(thread_id), key, channel, base, depth, body),
+            )
+
+    def _prune_strings(self, cur, thread_id: str):
+        bases = dict(cur.execute("SELECT key, base FROM checkpoint_strings WHERE thread_id = ?", (thread_id,)))
+        if not self._should_prune(thread_id, len(bases)):
+            return
+        values = []
+        for type_, checkpoint in cur.execute("SELECT type, checkpoint FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchall():
+            values += self.serde.loads_typed((type_, checkpoint))["channel_values"].values()
+        for type_, value in cur.execute("SELECT type, value FROM writes WHERE thread_id = ?", (thread_id,)).fetchall():
+            values.append(self.serde.loads_typed((type_, value)))
+        unreferenced = self._unreferenced(thread_id, values, bases)
+        cur.executemany("DELETE FROM checkpoint_strings WHERE thread_id = ? AND key = ?",
+                        [(thread_id, key) for key in unreferenced])
+
+    def _touch(self, cur, thread_id: str, now: float):
+        cur.execute(
+            "INSERT INTO thread_activity (thread_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET last_access = excluded.last_access",
+            (str(thread_id), now),
+        )
+
+    def get_tuple(self, config):
+        result = super().get_tuple(config)
+        if result is not None:
+            with self.cursor() as cur:
+                self._touch(cur, config["configurable"]["thread_id"], time.time())
+        return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = saved["configurable"]["thread_id"]
+        checkpoint_ns = saved["configurable"]["checkpoint_ns"]
+        now = time.time()
+        with self.cursor() as cur:
+            self._touch(cur, thread_id, now)
+            self._trim(cur, thread_id, checkpoint_ns)
+        if now - self._last_sweep >= self.sweep_interval:
+            self.evict(now)
+        return saved
+
+    def _trim(self, cur, thread_id: str, checkpoint_ns: str):
+        # Checkpoint ids are time-ordered, so the newest max_versions sort last
+        keep = (
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT ?"
+        )
+        args = (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_versions)
+        cur.execute(
+            f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ({keep})",
+            args,
+        )
+        cur.execute(
+            f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ({keep})",
+            args,
+        )
+        self._prune_strings(cur, thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+            cur.execute("DELETE FROM checkpoint_strings WHERE thread_id = ?", (str(thread_id),))
+            cur.execute("DELETE FROM run_leases WHERE thread_id = ?", (str(thread_id),))
+        self._prune_at.pop(thread_id, None)
+
+    def evict(self, now: float = None) -> int:
+        """Deletes idle threads and LRU overflow. Returns the number of threads removed."""
+        now = time.time() if now is None else now
+        self._last_sweep = now
+        with self.cursor() as cur:
+            stale = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_access < ?", (now - self.ttl,)
+            )]
+            total = cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0] - len(stale)
+            if total > self.max_threads:
+                stale += [row[0] for row in cur.execute(
+                    "SELECT thread_id FROM thread_activity WHERE last_access >= ? ORDER BY last_access LIMIT ?",
+                    (now - self.ttl, total - self.max_threads),
+                )]
+        for thread_id in stale:
+            self.delete_thread(thread_id)
+        return len(stale)
+
+    def thread_count(self) -> int:
+        with self.cursor(transaction=False) as cur:
+            return cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0]
+
+    # SQLite calls on a local file are short; run them off the event loop all the same.
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+class BoundedMemorySaver(DeltaStringsMixin, MemorySaver):
+    """In-process checkpointer with the same eviction rules as BoundedSqliteSaver (lost on restart)."""
+
+    def __init__(self, *, ttl: float = 24 * 3600, max_threads: int = 10_000, max_versions: int = 5,
+                 sweep_interval: float = 60.0, delta_min_chars: int = 0, serde=None):
+        super().__init__(serde=serde)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.max_versions = max_versions
+        self.sweep_interval = sweep_interval
+        self.delta_min_chars = delta_min_chars
+        self._last_sweep = 0.0
+        self._activity = OrderedDict()
+        self._lock = threading.RLock()
+        # thread_id -> {key: (channel, base, depth, body)}, in insertion order
+        self.strings = defaultdict(dict)
+        self._prune_at = {}
+        # thread_id -> (owner, expires_at)
+        self.leases = {}
+
+    def acquire_run(self, thread_id: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            holder = self.leases.get(thread_id)
+            if holder is not None and holder[0] != owner and holder[1] >= now:
+                return False
+            self.leases[thread_id] = (owner, now + ttl)
+            return True
+
+    def renew_run(self, thread_id: str, owner: str, ttl: float) -> bool:
+        with self._lock:
+            if self.leases.get(thread_id, (None,))[0] != owner:
+                return False
+            self.leases[thread_id] = (owner, time.time() + ttl)
+            return True
+
+    def release_run(self, thread_id: str, owner: str) -> None:
+        with self._lock:
+            if self.leases.get(thread_id, (None,))[0] == owner:
+                del self.leases[thread_id]
+
+    def _load_entry(self, thread_id: str, key: str):
+        with self._lock:
+            return self.strings.get(thread_id, {}).get(key)
+
+    def _latest_entry(self, thread_id: str, channel: str):
+        with self._lock:
+            for key, (entry_channel, _, depth, _) in reversed(self.strings.get(thread_id, {}).items()):
+                if entry_channel == channel:
+                    return key, depth
+        return None
+
+    def _save_entry(self, thread_id: str, key: str, channel: str, base, depth: int, body: str):
+        with self._lock:
+            self.strings[thread_id].setdefault(key, (channel, base, depth, body))
+
+    def _prune_strings(self, thread_id: str):
+        entries = self.strings.get(thread_id, {})
+        if not self._should_prune(thread_id, len(entries)):
+            return
+        values = [self.serde.loads_typed(blob) for key, blob in self.blobs.items()
+                  if key[0] == thread_id and blob[0] != "empty"]
+        for key, writes in self.writes.items():
+            if key[0] == thread_id:
+                values += [self.serde.loads_typed(value) for _, _, value, _ in writes.values()]
+        unreferenced = self._unreferenced(thread_id, values, {key: entry[1] for key, entry in entries.items()})
+        for key in unreferenced:
+            del entries[key]
+
+    def _touch(self, thread_id: str, now: float):
+        with self._lock:
+            self._activity[thread_id] = now
+            self._activity.move_to_end(thread_id)
+
+    def get_tuple(self, config):
+        with self._lock:
+            result = super().get_tuple(config)
+        if result is not None:
+            self._touch(config["configurable"]["thread_id"], time.time())
+        return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = saved["configurable"]["thread_id"]
+            now = time.time()
+            self._touch(thread_id, now)
+            self._trim(thread_id, saved["configurable"]["checkpoint_ns"])
+            if now - self._last_sweep >= self.sweep_interval or len(self._activity) > self.max_threads:
+                self.evict(now)
+        return saved
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def _trim(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_versions:
+            return
+        ordered = sorted(checkpoints)
+        for checkpoint_id in ordered[:-self.max_versions]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        # Drop channel blobs no surviving checkpoint points at
+        referenced = set()
+        for serialized, _, _ in checkpoints.values():
+            for channel, version in self.serde.loads_typed(serialized)["channel_versions"].items():
+                referenced.add((channel, version))
+        for key in [k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns]:
+            if (key[2], key[3]) not in referenced:
+                del self.blobs[key]
+        self._prune_strings(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._activity.pop(thread_id, None)
+            self.strings.pop(thread_id, None)
+            self._prune_at.pop(thread_id, None)
+            self.leases.pop(thread_id, None)
+
+    def evict(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._last_sweep = now
+            stale = [t for t, last_access in self._activity.items() if last_access < now - self.ttl]
+            overflow = len(self._activity) - len(stale) - self.max_threads
+            if overflow > 0:
+                expired = set(stale)
+                stale += [t for t in self._activity if t not in expired][:overflow]
+            for thread_id in stale:
+                self.delete_thread(thread_id)
+        return len(stale)
+
+    def thread_count(self) -> int:
+        return len(self._activity)
+
+def make_checkpointer():
+    """Builds the checkpointer selected by CHECKPOINTER ("sqlite" or "memory")."""
+    backend = os.getenv("CHECKPOINTER", "sqlite")
+    limits = {
+        "ttl": float(os.getenv("CHECKPOINT_TTL", 24 * 3600)),
+        "max_threads": int(os.getenv("CHECKPOINT_MAX_THREADS", 10_000)),
+        "max_versions": int(os.getenv("CHECKPOINT_MAX_VERSIONS", 5)),
+        "sweep_interval": float(os.getenv("CHECKPOINT_SWEEP_INTERVAL", 60)),
+        "delta_min_chars": int(os.getenv("CHECKPOINT_DELTA_MIN_CHARS", 0)),
+    }
+    if backend == "sqlite":
+        return BoundedSqliteSaver.from_path(os.getenv("CHECKPOINT_DB", "checkpoints.sqlite"), **limits)
+    if backend == "memory":
+        return BoundedMemorySaver(**limits)
+    raise ValueError(f"Unknown CHECKPOINTER: {backend!r} (expected 'sqlite' or 'memory')")
+
+class RunLease:
+    """
+    A thread's run lease in the checkpointer, so a thread runs one graph run at a time
+    across all the workers sharing it (an in-process check cannot see another worker's
+    run). The lease expires after RUN_LEASE_TTL seconds unless renewed, which the holder
+    does in the background, so a crashed worker's lease lapses. A checkpointer without
+    leases (e.g. a plain MemorySaver) always grants them.
+    """
+
+    def __init__(self, saver, thread_id: str, ttl: float = None):
+        self.saver = saver
+        self.thread_id = thread_id
+        self.ttl = ttl if ttl is not None else float(os.getenv("RUN_LEASE_TTL", "120"))
+        self.owner = secrets.token_hex(8)
+        self._renewal = None
+
+    async def acquire(self) -> bool:
+        if not hasattr(self.saver, "acquire_run"):
+            return True
+        if not await asyncio.to_thread(self.saver.acquire_run, self.thread_id, self.owner, self.ttl):
+            return False
+        self._renewal = asyncio.create_task(self._renew())
+        return True
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await asyncio.to_thread(self.saver.renew_run, self.thread_id, self.owner, self.ttl)
+
+    async def release(self):
+        if self._renewal is None:
+            return
+        self._renewal.cancel()
+        self._renewal = None
+        await asyncio.to_thread(self.saver.release_run, self.thread_id, self.owner)
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from llm_governor import estimate_tokens
+from revisions import paragraphs
+
+# Map-reduce evaluation of long essays. An essay above `threshold` tokens is split into
+# paragraph chunks of at most `budget` tokens (long paragraphs are split on sentences,
+# long sentences on words). Each chunk is scored by the usual evaluator prompt in
+# parallel, then the chunk scores are reduced locally, weighted by chunk size:
+#
+#   clarity, vocab   weighted mean
+#   depth            weighted mean of the better half of the chunks (analysis is
+#                    carried by an essay's strongest sections, not spread evenly)
+#
+# Essays at or below the threshold take the single-prompt path unchanged.
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Chunk calls made from sync nodes (which already run on LangGraph's executor threads)
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="essay-chunk")
+
+def pack(pieces, budget: int, separator: str):
+    """Greedily joins consecutive pieces into chunks of at most `budget` tokens."""
+    chunks, current = [], None
+    for piece in pieces:
+        candidate = piece if current is None else current + separator + piece
+        if current is not None and estimate_tokens(candidate) > budget:
+            chunks.append(current)
+            candidate = piece
+        current = candidate
+    if current is not None:
+        chunks.append(current)
+    return chunks
+
+class EssayChunker:
+    """Splits long essays into chunks and reduces per-chunk scores."""
+
+    def __init__(self, threshold: int = 0, budget: int = 500):
+        self.threshold = threshold
+        self.budget = budget
+
+    @classmethod
+    def from_env(cls):
+        return cls(int(os.getenv("EVAL_CHUNK_THRESHOLD", "0")), int(os.getenv("EVAL_CHUNK_TOKENS", "500")))
+
+    def is_long(self, essay: str) -> bool:
+        return self.threshold > 0 and estimate_tokens(essay or "") > self.threshold
+
+    def cache_dimension(self, dimension: str, essay: str) -> str:
+        """Evaluation cache dimension: map-reduce scores of a long essay depend on the chunk
+        budget and are not the whole-essay scores, so they are keyed apart from them."""
+        return f"{dimension}:chunks/{self.budget}" if self.is_long(essay) else dimension
+
+    def split_paragraph(self, paragraph: str):
+        if estimate_tokens(paragraph) <= self.budget:
+            return [paragraph]
+        pieces = []
+        for sentence in SENTENCE_END.split(paragraph):
+            if estimate_tokens(sentence) <= self.budget:
+                pieces.append(sentence)
+            else:
+                pieces.extend(pack(sentence.split(), self.budget, " "))
+        return pack(pieces, self.budget, " ")
+
+    def split(self, essay: str):
+        """Chunks of a long essay, or [essay] when it is below the threshold."""
+        if not self.is_long(essay):
+            return [essay]
+        pieces = [piece for paragraph in paragraphs(essay) for piece in self.split_paragraph(paragraph)]
+        chunks = pack(pieces, self.budget, "\n\n")
+        return chunks or [essay]
+
+    @staticmethod
+    def label(chunk: str, index: int, total: int) -> str:
+        if total == 1:
+            return chunk
+        return f"[Part {index + 1} of {total} of a longer essay. Score this part on its own.]\n{chunk}"
+
+    def map(self, essay: str, score):
+        """Calls score(text) for every chunk (in parallel threads); returns (results, weights)."""
+        chunks = self.split(essay)
+        if len(chunks) == 1:
+            return [score(essay)], [1]
+        futures = [_executor.submit(score, self.label(c, i, len(chunks))) for i, c in enumerate(chunks)]
+        return [f.result() for f in futures], [estimate_tokens(c) for c in chunks]
+
+    async def amap(self, essay: str, ascore):
+        """Awaits ascore(text) for every chunk concurrently; returns (results, weights)."""
+        chunks = self.split(essay)
+        if len(chunks) == 1:
+            return [await ascore(essay)], [1]
+        results = await asyncio.gather(*(ascore(self.label(c, i, len(chunks))) for i, c in enumerate(chunks)))
+        return list(results), [estimate_tokens(c) for c in chunks]
+
+    @staticmethod
+    def reduce(dimension: str, scores, weights) -> int:
+        pairs = list(zip(scores, weights))
+        if dimension == "depth":
+            pairs = sorted(pairs, key=lambda p: p[0], reverse=True)[:max(1, (len(pairs) + 1) // 2)]
+        total = sum(w for _, w in pairs)
+        return int(sum(s * w for s, w in pairs) / total + 0.5)
@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from metrics import EVAL_COALESCED
+from single_flight import SingleFlight
+
+# Bump when an evaluator prompt changes so stale scores are not served.
+PROMPT_VERSION = "1"
+
+def normalize_text(text: str) -> str:
+    """NFC-normalizes and collapses whitespace so re-pasted essays hash the same."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+def cache_key(topic: str, essay: str, dimension: str, model: str, prompt_version: str = PROMPT_VERSION) -> str:
+    """Content address of one evaluation: topic + essay + rubric dimension + prompt version + model."""
+    digest = hashlib.sha256()
+    for part in (normalize_text(topic), normalize_text(essay), dimension, prompt_version, model):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class DiskStore:
+    """
+    SQLite-backed cache store with TTL and total-size eviction.
+    Entries are pruned oldest-access-first once the stored values exceed max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS eval_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS eval_cache_accessed ON eval_cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM eval_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM eval_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE eval_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict):
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO eval_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM eval_cache WHERE created_at < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM eval_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM eval_cache ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM eval_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+class EvalCache:
+    """Two-level evaluation cache: an in-memory LRU in front of an optional DiskStore."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 7 * 24 * 3600, disk: DiskStore = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        ttl = float(os.getenv("EVAL_CACHE_TTL", 7 * 24 * 3600))
+        disk = None
+        if os.getenv("EVAL_CACHE_PATH"):
+            disk = DiskStore(
+                os.getenv("EVAL_CACHE_PATH"),
+                max_bytes=int(os.getenv("EVAL_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+                ttl=ttl,
+            )
+        return cls(max_entries=int(os.getenv("EVAL_CACHE_SIZE", 1024)), ttl=ttl, disk=disk)
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        value = self.disk.get(key) if self.disk else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put(key, value, now)
+        return value
+
+    def set(self, key: str, value: dict):
+        with self._lock:
+            self._put(key, value, time.time())
+        if self.disk:
+            self.disk.set(key, value)
+
+    def _put(self, key, value, now):
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+evaluation_cache = EvalCache.from_env()
+CACHE_ENABLED = os.getenv("EVAL_CACHE", "1") != "0"
+
+# Identical evaluations already running in this process are awaited, not repeated
+evaluation_flights = SingleFlight()
+COALESCE_ENABLED = os.getenv("EVAL_COALESCE", "1") != "0"
+
+def cached_node(node_name: str, dimension, model_name, cache: EvalCache = None):
+    """
+    Wraps a graph node (sync or async) so identical evaluations are served from the cache.
+
+    dimension is a string or a callable(state) -> string (e.g. to fold scores into the
+    feedback key); model_name is a callable returning the current model id. A hit adds
+    the node to the "cache_hits" state channel so streamed updates can flag it. On a
+    miss, a caller whose key is already being evaluated waits for that call
+    (see single_flight.py) instead of making its own.
+    """
+    def resolve(state):
+        dim = dimension(state) if callable(dimension) else dimension
+        return cache_key(state.get("topic", ""), state.get("essay_content", ""), dim, model_name())
+
+    def lookup(store, key):
+        hit = store.get(key) if CACHE_ENABLED else None
+        if hit is not None:
+            print(f"Node: {node_name} served from cache")
+            return {**hit, "cache_hits": [node_name]}
+        return None
+
+    async def off_loop(store, fn, *args):
+        # The SQLite tier blocks on disk I/O, so it runs in a thread; the in-memory LRU alone stays inline
+        if getattr(store, "disk", None) is not None:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def shared(result):
+        print(f"Node: {node_name} shared an in-flight evaluation")
+        EVAL_COALESCED.inc(node=node_name)
+        return dict(result)
+
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(state):
+                store = cache or evaluation_cache
+                if not (CACHE_ENABLED or COALESCE_ENABLED):
+                    return await fn(state)
+                key = resolve(state)
+                hit = await off_loop(store, lookup, store, key)
+                if hit is not None:
+                    return hit
+
+                async def evaluate():
+                    result = await fn(state)
+                    # Stored before the flight ends, so later callers hit the cache
+                    if CACHE_ENABLED:
+                        await off_loop(store, store.set, key, result)
+                    return result
+
+                if not COALESCE_ENABLED:
+                    return await evaluate()
+                result, waited = await evaluation_flights.ado(key, evaluate)
+                return shared(result) if waited else result
+        else:
+            @functools.wraps(fn)
+            def wrapper(state):
+                store = cache or evaluation_cache
+                if not (CACHE_ENABLED or COALESCE_ENABLED):
+                    return fn(state)
+                key = resolve(state)
+                hit = lookup(store, key)
+                if hit is not None:
+                    return hit
+
+                def evaluate():
+                    result = fn(state)
+                    if CACHE_ENABLED:
+                        store.set(key, result)
+                    return result
+
+                if not COALESCE_ENABLED:
+                    return evaluate()
+                result, waited = evaluation_flights.do(key, evaluate)
+                return shared(result) if waited else result
+        return wrapper
+    return decorator
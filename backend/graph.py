@@ -1,11 +1,19 @@
+import asyncio
 import os
-import operator
-import time
-from typing import TypedDict, List, Annotated
+import threading
+from typing import TypedDict, List, Annotated, Optional
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.channels.topic import Topic
+from eval_cache import cached_node
+from topic_pool import TopicPool
+from llm_calls import model_of
+from llm_routing import LLMRouter, watch_router
+from metrics import instrument_node
+from revisions import RevisionPlanner
+from speculation import Speculator
+from chunking import EssayChunker
 
 load_dotenv()
 
@@ -19,108 +27,160 @@ class EssayState(TypedDict):
     total_score: int
     feedback: str
     revision_count: int
+    # Nodes whose result in this step was served from the evaluation cache. A Topic channel
+    # without accumulation is emptied at every step, so it neither grows across revision
+    # passes nor carries an earlier pass's hits into the checkpoints.
+    cache_hits: Annotated[List[str], Topic(str)]
+    # Draft the current scores belong to, and dimensions whose score was carried over
+    # from it by incremental re-evaluation
+    scored_essay: str
+    reused_scores: List[str]
+    # Dimensions left unscored because the essay could no longer pass (SPECULATION)
+    skipped_scores: List[str]
+    # Local pre-scoring (PRESCORE): provisional scores, and why a draft was rejected without LLM calls
+    provisional_scores: dict
+    prescore_rejected: Optional[str]
+    # Near-duplicate index (NEAR_DUP): the graded essay this draft matched ({"similarity", "scores"}),
+    # and a random id shared by the session's drafts
+    near_duplicate: Optional[dict]
+    lineage: int
 
-# Initialize Gemini Model
-if not os.getenv("GOOGLE_API_KEY"):
-    print("Warning: GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
+# Gemini model. The client (and langchain_google_genai, the slowest import in the service)
+# is created on first use, so importing this module and starting a worker stay cheap.
+# Assigning graph.llm (e.g. a FakeLLM) before that replaces it.
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+llm = None
+_llm_lock = threading.Lock()
 
-llm = ChatGoogleGenerativeAI(model="gemini-flash-latest", temperature=0.5)
+def get_llm():
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                if not os.getenv("GOOGLE_API_KEY"):
+                    print("Warning: GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                llm = ChatGoogleGenerativeAI(model=GEMINI_MODEL, temperature=0.5)
+    return llm
 
-def generate_topic(state: EssayState):
-    """Generates a UPSC standard essay topic."""
-    print("Node: Generating Topic...")
-    prompt = "Generate a single, complex UPSC essay topic on social or economic issues. Output ONLY the topic text."
-    time.sleep(4)
-    response = llm.invoke(prompt)
-    content = response.content
-    if isinstance(content, list):
-        extracted_parts = []
-        for part in content:
-            if isinstance(part, dict) and "text" in part:
-                extracted_parts.append(part["text"])
-            elif isinstance(part, str):
-                extracted_parts.append(part)
-            else:
-                extracted_parts.append(str(part))
-        content = " ".join(extracted_parts)
-    return {"topic": content.strip(), "revision_count": 0}
+async def aget_llm():
+    # The first call imports and builds the client on a worker thread, not on the event loop
+    return llm if llm is not None else await asyncio.to_thread(get_llm)
 
-def collect_essay(state: EssayState):
-    """
-    Placeholder for human input. 
-    State is updated externally before this node resumes.
-    """
-    pass 
+def make_llm(model=None):
+    if model is None or model == GEMINI_MODEL:
+        return get_llm()
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, temperature=0.5)
 
-def eval_clarity(state: EssayState):
-    """Evaluates flow, coherence, and structure."""
-    print("Node: Evaluating Clarity...")
-    prompt = f"""
+# Per-node model, timeout and fallback (LLM_ROUTES) and hedged calls (LLM_HEDGE_*); see llm_routing.py
+router = LLMRouter.from_env(make_llm, aget_llm)
+watch_router(router)
+
+# "async" runs the LLM nodes as coroutines on the event loop (llm.ainvoke).
+# "sync" keeps the original blocking nodes, which astream runs on executor threads.
+# Either way, Gemini rate limits are handled by the shared governor in llm_calls.py.
+EXECUTION_MODE = os.getenv("GRAPH_EXECUTION_MODE", "async")
+
+# "fanout" scores each dimension with its own LLM call (eval_clarity / eval_depth / eval_vocab).
+# "fused" scores all three in a single structured-output call (eval_fused).
+EVAL_MODE = os.getenv("EVAL_MODE", "fanout")
+
+# With EVAL_INCREMENTAL=1 a revised essay is diffed against the last scored draft and only
+# the dimensions the edit could change are re-scored (see revisions.py).
+EVAL_INCREMENTAL = os.getenv("EVAL_INCREMENTAL", "0") == "1"
+REEVAL_THRESHOLD = float(os.getenv("REEVAL_THRESHOLD", "0.05"))
+
+# Fail-path speculation for async fan-out graphs (see speculation.py): "early_fail" stops the
+# remaining evaluators once 10/15 is out of reach, "eager" also starts feedback before the last score.
+SPECULATION = os.getenv("SPECULATION", "off")
+
+# Local NumPy pre-scoring between collect_essay and the evaluators (see prescore.py):
+# "provisional" streams instant provisional scores, "gate" also rejects obviously
+# unfit drafts (too short, gibberish, repetitive) without calling the LLM.
+PRESCORE = os.getenv("PRESCORE", "off")
+PRESCORE_MIN_WORDS = int(os.getenv("PRESCORE_MIN_WORDS", "50"))
+
+# Per-topic MinHash index of graded essays in front of the evaluators (see near_duplicates.py):
+# a draft at least NEAR_DUP_THRESHOLD similar to one graded before is flagged, and "seed"
+# streams that essay's scores as provisional scores, "reuse" takes them instead of the evaluators.
+NEAR_DUP = os.getenv("NEAR_DUP", "off")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+
+# Essays longer than EVAL_CHUNK_THRESHOLD tokens are scored in paragraph chunks of at most
+# EVAL_CHUNK_TOKENS, in parallel, and the chunk scores reduced locally (see chunking.py).
+chunker = EssayChunker.from_env()
+
+class EssayScores(BaseModel):
+    """Structured output of the fused evaluator."""
+    clarity_score: int = Field(description="CLARITY OF THOUGHT: flow, coherence and structure, out of 5")
+    depth_score: int = Field(description="DEPTH OF ANALYSIS: social, political and economic dimensions, out of 5")
+    vocab_score: int = Field(description="LANGUAGE & VOCABULARY: precision of language, out of 5")
+
+def model_name():
+    # Reads the configured name so cache lookups do not force the client into existence
+    return model_of(llm) if llm is not None else GEMINI_MODEL
+
+def node_model(node: str):
+    """Cache-key model of one node: its LLM_ROUTES model, else the default."""
+    return lambda: router.model_name(node, model_name())
+
+def scored_dimension(dimension: str):
+    """Cache-key dimension of an evaluator, which includes the chunking of a long essay."""
+    return lambda state: chunker.cache_dimension(dimension, state.get("essay_content", ""))
+
+def feedback_dimension(state: EssayState):
+    # The feedback prompt is built from the scores, so they are part of its cache key
+    return f"feedback:{state['clarity_score']}/{state['depth_score']}/{state['vocab_score']}"
+
+# --- Prompts & response parsing (shared by the sync and async nodes) ---
+
+TOPIC_PROMPT = "Generate a single, complex UPSC essay topic on social or economic issues. Output ONLY the topic text."
+
+def clarity_prompt(state: EssayState):
+    return f"""
     Evaluate the following essay on the topic '{state['topic']}' for CLARITY OF THOUGHT.
     Score it out of 5. Return ONLY the integer score.
-    
+
     Essay: {state['essay_content']}
     """
-    time.sleep(2)
-    response = llm.invoke(prompt)
-    content = response.content
-    if isinstance(content, list):
-        extracted_parts = []
-        for part in content:
-            if isinstance(part, dict) and "text" in part:
-                extracted_parts.append(part["text"])
-            elif isinstance(part, str):
-                extracted_parts.append(part)
-            else:
-                extracted_parts.append(str(part))
-        content = " ".join(extracted_parts)
-    try:
-        score = int(''.join(filter(str.isdigit, content)))
-    except:
-        score = 0
-    return {"clarity_score": score}
 
-def eval_depth(state: EssayState):
-    """Evaluates multidimensional analysis and evidence."""
-    print("Node: Evaluating Depth...")
-    prompt = f"""
+def depth_prompt(state: EssayState):
+    return f"""
     Evaluate the following essay on the topic '{state['topic']}' for DEPTH OF ANALYSIS.
     Did they cover social, political, economic dimensions?
     Score it out of 5. Return ONLY the integer score.
-    
+
     Essay: {state['essay_content']}
     """
-    time.sleep(2)
-    response = llm.invoke(prompt)
-    content = response.content
-    if isinstance(content, list):
-        extracted_parts = []
-        for part in content:
-            if isinstance(part, dict) and "text" in part:
-                extracted_parts.append(part["text"])
-            elif isinstance(part, str):
-                extracted_parts.append(part)
-            else:
-                extracted_parts.append(str(part))
-        content = " ".join(extracted_parts)
-    try:
-        score = int(''.join(filter(str.isdigit, content)))
-    except:
-        score = 0
-    return {"depth_score": score}
 
-def eval_vocab(state: EssayState):
-    """Evaluates language precision and vocabulary."""
-    print("Node: Evaluating Vocabulary...")
-    prompt = f"""
+def vocab_prompt(state: EssayState):
+    return f"""
     Evaluate the following essay on the topic '{state['topic']}' for LANGUAGE & VOCABULARY.
     Score it out of 5. Return ONLY the integer score.
-    
+
     Essay: {state['essay_content']}
     """
-    time.sleep(2)
-    response = llm.invoke(prompt)
-    content = response.content
+
+def fused_prompt(state: EssayState):
+    return f"""
+    Evaluate the following essay on the topic '{state['topic']}' on three dimensions:
+    CLARITY OF THOUGHT, DEPTH OF ANALYSIS (did they cover social, political, economic dimensions?)
+    and LANGUAGE & VOCABULARY.
+    Score each dimension out of 5.
+
+    Essay: {state['essay_content']}
+    """
+
+def feedback_prompt(state: EssayState):
+    return f"""
+    The student scored {state['total_score']}/15.
+    Clarity: {state['clarity_score']}, Depth: {state['depth_score']}, Language: {state['vocab_score']}.
+    Provide 3 bullet points on how to improve this specific essay for the next draft.
+    """
+
+def extract_text(content):
+    """Gemini may return a list of content parts instead of a plain string."""
     if isinstance(content, list):
         extracted_parts = []
         for part in content:
@@ -131,81 +191,279 @@ def eval_vocab(state: EssayState):
             else:
                 extracted_parts.append(str(part))
         content = " ".join(extracted_parts)
+    return content
+
+def parse_score(content):
     try:
-        score = int(''.join(filter(str.isdigit, content)))
+        score = int(''.join(filter(str.isdigit, extract_text(content))))
     except:
         score = 0
-    return {"vocab_score": score}
+    return score
+
+def fused_scores(result):
+    """Clamps the structured scores into the 0-5 range the rest of the graph expects."""
+    if result is None:
+        return {"clarity_score": 0, "depth_score": 0, "vocab_score": 0}
+    return {
+        key: max(0, min(5, int(getattr(result, key))))
+        for key in ("clarity_score", "depth_score", "vocab_score")
+    }
+
+# --- Scoring calls (whole essay, or map-reduce over chunks for long essays) ---
+
+def score_dimension(state: EssayState, dimension: str, prompt, node: str):
+    def score(essay):
+        return parse_score(router.invoke(node, prompt({**state, "essay_content": essay})).content)
+    return chunker.reduce(dimension, *chunker.map(state["essay_content"], score))
+
+async def ascore_dimension(state: EssayState, dimension: str, prompt, node: str):
+    async def score(essay):
+        return parse_score((await router.ainvoke(node, prompt({**state, "essay_content": essay}))).content)
+    return chunker.reduce(dimension, *await chunker.amap(state["essay_content"], score))
+
+def reduce_fused(results, weights):
+    return {key: chunker.reduce(key.removesuffix("_score"), [r[key] for r in results], weights)
+            for key in ("clarity_score", "depth_score", "vocab_score")}
+
+async def fetch_topic():
+    response = await router.ainvoke("topic_pool", TOPIC_PROMPT)
+    return extract_text(response.content).strip()
+
+# Pre-generated topics; generate_topic only calls the LLM when the pool is empty
+topic_pool = TopicPool.from_env(fetch_topic)
+
+# --- Sync nodes (original behaviour) ---
+
+def generate_topic(state: EssayState):
+    """Generates a UPSC standard essay topic."""
+    print("Node: Generating Topic...")
+    topic = topic_pool.take()
+    if topic is None:
+        response = router.invoke("generate_topic", TOPIC_PROMPT)
+        topic = extract_text(response.content).strip()
+    return {"topic": topic, "revision_count": 0}
+
+def collect_essay(state: EssayState):
+    """
+    Placeholder for human input.
+    State is updated externally before this node resumes.
+    """
+    pass
+
+@cached_node("eval_clarity", scored_dimension("clarity"), node_model("eval_clarity"))
+def eval_clarity(state: EssayState):
+    """Evaluates flow, coherence, and structure."""
+    print("Node: Evaluating Clarity...")
+    return {"clarity_score": score_dimension(state, "clarity", clarity_prompt, "eval_clarity")}
+
+@cached_node("eval_depth", scored_dimension("depth"), node_model("eval_depth"))
+def eval_depth(state: EssayState):
+    """Evaluates multidimensional analysis and evidence."""
+    print("Node: Evaluating Depth...")
+    return {"depth_score": score_dimension(state, "depth", depth_prompt, "eval_depth")}
+
+@cached_node("eval_vocab", scored_dimension("vocab"), node_model("eval_vocab"))
+def eval_vocab(state: EssayState):
+    """Evaluates language precision and vocabulary."""
+    print("Node: Evaluating Vocabulary...")
+    return {"vocab_score": score_dimension(state, "vocab", vocab_prompt, "eval_vocab")}
+
+@cached_node("eval_fused", scored_dimension("fused"), node_model("eval_fused"))
+def eval_fused(state: EssayState):
+    """Evaluates clarity, depth and vocabulary in one structured call."""
+    print("Node: Evaluating All Dimensions...")
+
+    def score(essay):
+        return fused_scores(router.invoke("eval_fused", fused_prompt({**state, "essay_content": essay}),
+                                          schema=EssayScores))
+    return reduce_fused(*chunker.map(state["essay_content"], score))
 
 def aggregate_score(state: EssayState):
     """Sync node: Waits for parallel evaluations and sums them."""
     print("Node: Aggregating Scores...")
-    total = state.get('clarity_score', 0) + state.get('depth_score', 0) + state.get('vocab_score', 0)
+    # A dimension skipped by speculative early fail is None and counts as 0
+    total = (state.get('clarity_score') or 0) + (state.get('depth_score') or 0) + (state.get('vocab_score') or 0)
     return {"total_score": total}
 
+@cached_node("generate_feedback", feedback_dimension, node_model("generate_feedback"))
 def generate_feedback(state: EssayState):
     """Generates feedback if the score is low."""
     print("Node: Generating Feedback...")
-    prompt = f"""
-    The student scored {state['total_score']}/15.
-    Clarity: {state['clarity_score']}, Depth: {state['depth_score']}, Language: {state['vocab_score']}.
-    Provide 3 bullet points on how to improve this specific essay for the next draft.
-    """
-    time.sleep(2)
-    response = llm.invoke(prompt)
-    content = response.content
-    if isinstance(content, list):
-        extracted_parts = []
-        for part in content:
-            if isinstance(part, dict) and "text" in part:
-                extracted_parts.append(part["text"])
-            elif isinstance(part, str):
-                extracted_parts.append(part)
-            else:
-                extracted_parts.append(str(part))
-        content = " ".join(extracted_parts)
-    return {"feedback": content}
+    response = router.invoke("generate_feedback", feedback_prompt(state))
+    return {"feedback": extract_text(response.content)}
+
+# --- Async nodes: same prompts, awaited on the event loop instead of blocking a thread ---
+
+async def agenerate_topic(state: EssayState):
+    """Generates a UPSC standard essay topic."""
+    print("Node: Generating Topic...")
+    topic = topic_pool.take()
+    if topic is None:
+        topic = await fetch_topic()
+    return {"topic": topic, "revision_count": 0}
+
+@cached_node("eval_clarity", scored_dimension("clarity"), node_model("eval_clarity"))
+async def aeval_clarity(state: EssayState):
+    """Evaluates flow, coherence, and structure."""
+    print("Node: Evaluating Clarity...")
+    return {"clarity_score": await ascore_dimension(state, "clarity", clarity_prompt, "eval_clarity")}
+
+@cached_node("eval_depth", scored_dimension("depth"), node_model("eval_depth"))
+async def aeval_depth(state: EssayState):
+    """Evaluates multidimensional analysis and evidence."""
+    print("Node: Evaluating Depth...")
+    return {"depth_score": await ascore_dimension(state, "depth", depth_prompt, "eval_depth")}
+
+@cached_node("eval_vocab", scored_dimension("vocab"), node_model("eval_vocab"))
+async def aeval_vocab(state: EssayState):
+    """Evaluates language precision and vocabulary."""
+    print("Node: Evaluating Vocabulary...")
+    return {"vocab_score": await ascore_dimension(state, "vocab", vocab_prompt, "eval_vocab")}
+
+@cached_node("eval_fused", scored_dimension("fused"), node_model("eval_fused"))
+async def aeval_fused(state: EssayState):
+    """Evaluates clarity, depth and vocabulary in one structured call."""
+    print("Node: Evaluating All Dimensions...")
+
+    async def score(essay):
+        return fused_scores(await router.ainvoke("eval_fused", fused_prompt({**state, "essay_content": essay}),
+                                                 schema=EssayScores))
+    return reduce_fused(*await chunker.amap(state["essay_content"], score))
+
+@cached_node("generate_feedback", feedback_dimension, node_model("generate_feedback"))
+async def agenerate_feedback(state: EssayState):
+    """Generates feedback if the score is low."""
+    print("Node: Generating Feedback...")
+    response = await router.ainvoke("generate_feedback", feedback_prompt(state))
+    return {"feedback": extract_text(response.content)}
 
 def check_pass_fail(state: EssayState):
     if state['total_score'] >= 10:
         return "pass"
     return "fail"
 
-# Initialize Graph
-workflow = StateGraph(EssayState)
-
-# Add Nodes
-workflow.add_node("generate_topic", generate_topic)
-workflow.add_node("collect_essay", collect_essay)
-workflow.add_node("eval_clarity", eval_clarity)
-workflow.add_node("eval_depth", eval_depth)
-workflow.add_node("eval_vocab", eval_vocab)
-workflow.add_node("aggregate_score", aggregate_score)
-workflow.add_node("generate_feedback", generate_feedback)
-
-# Add Edges
-workflow.set_entry_point("generate_topic")
-workflow.add_edge("generate_topic", "collect_essay")
-
-workflow.add_edge("collect_essay", "eval_clarity")
-workflow.add_edge("collect_essay", "eval_depth")
-workflow.add_edge("collect_essay", "eval_vocab")
-
-workflow.add_edge("eval_clarity", "aggregate_score")
-workflow.add_edge("eval_depth", "aggregate_score")
-workflow.add_edge("eval_vocab", "aggregate_score")
-
-workflow.add_conditional_edges(
-    "aggregate_score",
-    check_pass_fail,
-    {
-        "pass": END,
-        "fail": "generate_feedback"
-    }
-)
+def build_workflow(execution_mode: str = EXECUTION_MODE, eval_mode: str = EVAL_MODE,
+                   incremental: bool = EVAL_INCREMENTAL, threshold: float = REEVAL_THRESHOLD,
+                   speculation: str = SPECULATION, prescore: str = PRESCORE, near_dup: str = NEAR_DUP):
+    """Builds the essay graph with either the async or the sync LLM nodes."""
+    if execution_mode == "async":
+        nodes = {
+            "generate_topic": agenerate_topic,
+            "eval_clarity": aeval_clarity,
+            "eval_depth": aeval_depth,
+            "eval_vocab": aeval_vocab,
+            "eval_fused": aeval_fused,
+            "generate_feedback": agenerate_feedback,
+        }
+    elif execution_mode == "sync":
+        nodes = {
+            "generate_topic": generate_topic,
+            "eval_clarity": eval_clarity,
+            "eval_depth": eval_depth,
+            "eval_vocab": eval_vocab,
+            "eval_fused": eval_fused,
+            "generate_feedback": generate_feedback,
+        }
+    else:
+        raise ValueError(f"Unknown GRAPH_EXECUTION_MODE: {execution_mode!r} (expected 'async' or 'sync')")
+    if eval_mode == "fanout":
+        evaluators = ["eval_clarity", "eval_depth", "eval_vocab"]
+    elif eval_mode == "fused":
+        evaluators = ["eval_fused"]
+    else:
+        raise ValueError(f"Unknown EVAL_MODE: {eval_mode!r} (expected 'fanout' or 'fused')")
+
+    # Initialize Graph
+    workflow = StateGraph(EssayState)
+
+    planner = RevisionPlanner(evaluators, incremental, threshold)
+
+    # Optional near-duplicate stage (NumPy is only imported when it is on); the index is shared by every graph
+    deduper = None
+    if near_dup != "off":
+        from near_duplicates import NearDuplicateStage, shared_index
+        deduper = NearDuplicateStage(shared_index(), near_dup, NEAR_DUP_THRESHOLD)
+
+    def aggregate_revision(state: EssayState):
+        # Also records the scored draft and counts the revision
+        update = {**aggregate_score(state), **planner.bookkeeping(state)}
+        if deduper:
+            deduper.record(state, update)
+        return update
+
+    # Add Nodes (each wrapped to record wall time and errors for /metrics)
+    nodes["collect_essay"] = collect_essay
+    nodes["aggregate_score"] = aggregate_revision
+
+    # Speculation needs the per-dimension evaluators running concurrently on the event loop
+    speculator = Speculator(speculation, [e.removeprefix("eval_") for e in evaluators])
+    if speculator.enabled and execution_mode == "async" and eval_mode == "fanout":
+        for evaluator in evaluators:
+            nodes[evaluator] = speculator.evaluator(evaluator.removeprefix("eval_"), nodes[evaluator],
+                                                    nodes["generate_feedback"])
+        nodes["aggregate_score"] = speculator.aggregate(aggregate_revision, lambda s: check_pass_fail(s) == "pass")
+        nodes["generate_feedback"] = speculator.feedback(nodes["generate_feedback"])
+
+    # Optional local pre-scoring stage in front of the evaluators (NumPy is only imported when it is on)
+    prescorer = None
+    if prescore != "off":
+        from prescore import PreScorer
+        prescorer = PreScorer(prescore, PRESCORE_MIN_WORDS)
+        nodes["prescore"] = prescorer.node
+    gate = ["prescore"] if prescorer else []
+    if deduper:
+        nodes["near_duplicate"] = deduper.node
+        gate.append("near_duplicate")
+
+    for name in ["generate_topic", "collect_essay", *gate, *evaluators, "aggregate_score", "generate_feedback"]:
+        workflow.add_node(name, instrument_node(name, nodes[name]))
+
+    # Add Edges
+    workflow.set_entry_point("generate_topic")
+    workflow.add_edge("generate_topic", "collect_essay")
+
+    # Fan out to the evaluators a draft needs (all of them unless incremental), then join on aggregate_score.
+    # With pre-scoring, drafts the gate rejects go straight back to collect_essay; with the
+    # near-duplicate index in reuse mode, drafts that match a graded essay skip the evaluators.
+    route, targets = planner.route, [*evaluators, "aggregate_score"]
+    if deduper:
+        workflow.add_conditional_edges("near_duplicate", deduper.route(route), targets)
+        route, targets = (lambda state: ["near_duplicate"]), ["near_duplicate"]
+    if prescorer:
+        workflow.add_edge("collect_essay", "prescore")
+        workflow.add_conditional_edges("prescore", prescorer.route(route), [*targets, "collect_essay"])
+    elif deduper:
+        workflow.add_edge("collect_essay", "near_duplicate")
+    else:
+        workflow.add_conditional_edges("collect_essay", route, targets)
+    for evaluator in evaluators:
+        workflow.add_edge(evaluator, "aggregate_score")
+
+    workflow.add_conditional_edges(
+        "aggregate_score",
+        check_pass_fail,
+        {
+            "pass": END,
+            "fail": "generate_feedback"
+        }
+    )
+
+    workflow.add_edge("generate_feedback", "collect_essay")
+    return workflow
 
-workflow.add_edge("generate_feedback", "collect_essay")
+# One compiled graph per process, shared by the NDJSON (main.py) and WebSocket (server.py) apps.
+# Built on first use rather than at import, so importing the app modules does no graph work.
+graph_app = None
+_graph_app_lock = threading.Lock()
 
-# We do NOT compile here with a specific checkpointer if we want to pass it dynamically, 
-# but usually for the app we want a shared one or one per request. 
-# The implementation plan uses a global in-memory checkpointer for simplicity as per the user request.
+def get_graph_app():
+    """The service graph: build_workflow() with the settings above, compiled against the
+    shared checkpointer (see checkpointer.py) and paused before collect_essay."""
+    global graph_app
+    if graph_app is None:
+        with _graph_app_lock:
+            if graph_app is None:
+                from checkpointer import make_checkpointer
+                graph_app = build_workflow().compile(checkpointer=make_checkpointer(),
+                                                     interrupt_before=["collect_essay"])
+    return graph_app
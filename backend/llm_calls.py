@@ -0,0 +1,93 @@
+import asyncio
+import time
+from llm_governor import LLMGovernor, is_rate_limit_error
+from metrics import LLM_DURATION, LLM_ERRORS, LLM_QUEUE_WAIT, LLM_RETRIES, LLM_TOKENS, REGISTRY
+
+# Every LLM call made by a graph node goes through invoke_llm / ainvoke_llm,
+# so rate limiting and per-call instrumentation live in one place.
+
+governor = LLMGovernor.from_env()
+
+def _governor_gauges():
+    stats = governor.stats()
+    return {
+        "essay_llm_in_flight": ("LLM calls currently running.", stats["in_flight"]),
+        "essay_llm_in_flight_limit": ("Current adaptive cap on concurrent LLM calls.", stats["limit"]),
+        "essay_llm_paused_seconds": ("Remaining cooldown after a rate-limit error.", stats["paused_for"]),
+    }
+
+REGISTRY.add_collector(_governor_gauges)
+
+def model_of(llm) -> str:
+    return getattr(llm, "model", type(llm).__name__)
+
+def _record_usage(message, node: str, model: str) -> int:
+    """Records token usage and returns the total (0 when the model does not report it)."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        LLM_TOKENS.inc(usage["input_tokens"], node=node, model=model, direction="input")
+    if usage.get("output_tokens"):
+        LLM_TOKENS.inc(usage["output_tokens"], node=node, model=model, direction="output")
+    return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+def _runnable(llm, schema):
+    # include_raw keeps the AIMessage (and its token usage) next to the parsed object
+    return llm.with_structured_output(schema, include_raw=True) if schema else llm
+
+def _unwrap(result, schema, node: str, model: str):
+    """Returns (value for the node, total tokens used)."""
+    if schema is None:
+        return result, _record_usage(result, node, model)
+    return result.get("parsed"), _record_usage(result.get("raw"), node, model)
+
+def _should_retry(error, attempt: int, node: str, model: str) -> bool:
+    if is_rate_limit_error(error) and attempt < governor.max_retries:
+        LLM_RETRIES.inc(node=node, model=model)
+        return True
+    LLM_ERRORS.inc(node=node, model=model, error=type(error).__name__)
+    return False
+
+def invoke_llm(llm, prompt, node: str, schema=None):
+    """Calls llm.invoke (or its structured-output variant when schema is given) for `node`."""
+    model = model_of(llm)
+    attempt = 0
+    while True:
+        permit = governor.acquire(prompt)
+        LLM_QUEUE_WAIT.observe(permit.waited, node=node, model=model)
+        t0 = time.perf_counter()
+        try:
+            result = _runnable(llm, schema).invoke(prompt)
+        except Exception as error:
+            LLM_DURATION.observe(time.perf_counter() - t0, node=node, model=model)
+            governor.release(permit, error=error)
+            if not _should_retry(error, attempt, node, model):
+                raise
+            attempt += 1
+            continue
+        LLM_DURATION.observe(time.perf_counter() - t0, node=node, model=model)
+        value, used = _unwrap(result, schema, node, model)
+        governor.release(permit, used_tokens=used)
+        return value
+
+async def ainvoke_llm(llm, prompt, node: str, schema=None):
+    """Async counterpart of invoke_llm."""
+    model = model_of(llm)
+    attempt = 0
+    while True:
+        permit = await governor.aacquire(prompt)
+        LLM_QUEUE_WAIT.observe(permit.waited, node=node, model=model)
+        t0 = time.perf_counter()
+        try:
+            result = await _runnable(llm, schema).ainvoke(prompt)
+        except BaseException as error:
+            LLM_DURATION.observe(time.perf_counter() - t0, node=node, model=model)
+            governor.release(permit, error=error)
+            # Cancellation (client gone) frees the slot but is neither retried nor counted as an error
+            if isinstance(error, asyncio.CancelledError) or not _should_retry(error, attempt, node, model):
+                raise
+            attempt += 1
+            continue
+        LLM_DURATION.observe(time.perf_counter() - t0, node=node, model=model)
+        value, used = _unwrap(result, schema, node, model)
+        governor.release(permit, used_tokens=used)
+        return value
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+# One governor per process gates every LLM call (graph nodes and the topic pool):
+#   - token buckets for requests/minute and tokens/minute (0 = unlimited)
+#   - a cap on concurrent in-flight calls, halved on every 429 / quota error and
+#     grown back by one slot per window of successful calls (AIMD)
+#   - a global cooldown with exponential backoff after a 429 / quota error
+# When the service is idle nothing waits; when traffic spikes, calls queue here
+# instead of hitting Gemini's rate limiter.
+
+RATE_LIMIT_MARKERS = ("429", "resource_exhausted", "resource exhausted", "quota", "rate limit", "too many requests")
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    name = type(error).__name__
+    if name in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+        return True
+    text = str(error).lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+def estimate_tokens(prompt) -> int:
+    """Rough token count of a prompt (~4 characters per token)."""
+    text = prompt if isinstance(prompt, str) else str(prompt)
+    return max(1, len(text) // 4)
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to `capacity`; the level may go negative on settle."""
+
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, cost: float) -> float:
+        """Seconds until `cost` can be taken (a full bucket always admits, so oversized costs never starve)."""
+        need = min(cost, self.capacity)
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) / self.rate
+
+class Permit:
+    __slots__ = ("reserved", "waited", "started")
+
+    def __init__(self, reserved: int, waited: float):
+        self.reserved = reserved
+        self.waited = waited
+        self.started = time.monotonic()
+
+class LLMGovernor:
+    # Output tokens reserved against the TPM bucket before the real usage is known
+    OUTPUT_TOKENS_ESTIMATE = 256
+
+    def __init__(self, max_in_flight: int = 32, rpm: float = 0, tpm: float = 0, burst_seconds: float = 10.0,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 60.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = float(self.max_in_flight)
+        self.requests = TokenBucket(rpm, max(1.0, rpm * burst_seconds / 60)) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, max(1.0, tpm * burst_seconds / 60)) if tpm > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.backed_off_at = 0.0
+        self.strikes = 0
+        self.rate_limited = 0
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "32")),
+            rpm=float(os.getenv("LLM_RPM", "0")),
+            tpm=float(os.getenv("LLM_TPM", "0")),
+            burst_seconds=float(os.getenv("LLM_BURST_SECONDS", "10")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "1")),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "60")),
+        )
+
+    def _try_acquire(self, cost: int):
+        """Takes a slot if possible. Returns (granted, seconds to wait or None to wait for a release)."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False, self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return False, None
+        wait = 0.0
+        for bucket, amount in ((self.requests, 1), (self.tokens, cost)):
+            if bucket is not None:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_for(amount))
+        if wait > 0:
+            return False, wait
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= cost
+        self.in_flight += 1
+        return True, 0.0
+
+    def acquire(self, prompt) -> Permit:
+        """Blocks the calling thread until the call may start."""
+        cost = estimate_tokens(prompt) + self.OUTPUT_TOKENS_ESTIMATE
+        t0 = time.perf_counter()
+        with self._cond:
+            while True:
+                granted, wait = self._try_acquire(cost)
+                if granted:
+                    return Permit(cost, time.perf_counter() - t0)
+                self._cond.wait(timeout=wait)
+
+    async def aacquire(self, prompt) -> Permit:
+        """Waits on the event loop until the call may start."""
+        cost = estimate_tokens(prompt) + self.OUTPUT_TOKENS_ESTIMATE
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                granted, wait = self._try_acquire(cost)
+                if granted:
+                    return Permit(cost, time.perf_counter() - t0)
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _wake(self):
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+
+    def release(self, permit: Permit, used_tokens: int = 0, error: BaseException = None):
+        """Frees the slot, settles the TPM reservation and adapts to rate-limit errors."""
+        with self._cond:
+            self.in_flight -= 1
+            if self.tokens is not None and used_tokens:
+                self.tokens.level -= used_tokens - permit.reserved
+            if error is not None and is_rate_limit_error(error):
+                self.rate_limited += 1
+                # Calls that started before the last backoff belong to the same overload
+                # episode; only the first of them shrinks the cap and extends the cooldown.
+                if permit.started < self.backed_off_at:
+                    self._wake()
+                    return
+                self.backed_off_at = time.monotonic()
+                self.strikes += 1
+                self.limit = max(1.0, self.limit / 2)
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self.strikes - 1))
+                self.paused_until = max(self.paused_until, time.monotonic() + delay * random.uniform(0.5, 1.0))
+            elif error is None:
+                self.strikes = 0
+                self.limit = min(float(self.max_in_flight), self.limit + 1 / self.limit)
+            self._wake()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "limit": int(self.limit),
+            "max_in_flight": self.max_in_flight,
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+from llm_calls import ainvoke_llm, invoke_llm
+from metrics import LLM_FALLBACKS, LLM_HEDGE_SAVED, LLM_HEDGES, REGISTRY
+
+# Per-node model routing and hedged requests, for both graphs (backend/graph.py, main.py).
+#
+# LLM_ROUTES maps graph nodes (or "*" for all of them) to a model, a timeout and a
+# fallback model, e.g.
+#   {"eval_vocab": {"model": "gemini-2.5-flash-lite", "timeout": 20, "fallback": "gemini-2.5-flash"}}
+# A node without a route uses the graph's default client with no timeout, as before.
+# A call that times out or fails (after the governor's rate-limit retries) is made once
+# more on the fallback model, without a timeout: it is the last chance of an answer.
+#
+# With LLM_HEDGE_PERCENTILE set (e.g. 95), a call still running after that percentile of
+# the node's recent latencies gets a duplicate; the first answer wins and the loser is
+# cancelled, so a slow call is not paid for twice. The latency a winning hedge saved is
+# then estimated from the node's recent calls that took longer. Blocking calls (sync
+# nodes) cannot be cancelled: a losing primary runs on to completion on the routing pool,
+# and what the hedge saved is measured. LLM_HEDGE_BUDGET caps the share of calls that
+# are hedged, so an overloaded model is not sent twice the traffic.
+
+class Route:
+    __slots__ = ("model", "timeout", "fallback")
+
+    def __init__(self, model: Optional[str] = None, timeout: Optional[float] = None, fallback: Optional[str] = None):
+        # model None = the graph's default client
+        self.model = model
+        self.timeout = timeout
+        self.fallback = fallback
+
+def parse_routes(text: str) -> dict:
+    routes = {}
+    for node, spec in (json.loads(text) if text else {}).items():
+        if isinstance(spec, str):
+            spec = {"model": spec}
+        routes[node] = Route(spec.get("model"), spec.get("timeout"), spec.get("fallback"))
+    return routes
+
+class LatencyWindow:
+    """Recent call latencies of one node and model."""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class LLMRouter:
+    """
+    Picks the client for each node's LLM calls and makes them with the node's timeout,
+    fallback and hedging. make_client(model) returns the client for a model name
+    (None = the default client, so assigning graph.llm still replaces it); the optional
+    coroutine adefault_client() returns the default client without blocking the event loop.
+    """
+
+    def __init__(self, make_client, routes: dict = None, hedge_percentile: float = 0,
+                 hedge_min_samples: int = 20, hedge_budget: float = 0.1, adefault_client=None):
+        self.make_client = make_client
+        self.adefault_client = adefault_client
+        self.routes = routes or {}
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_budget = hedge_budget
+        self.windows = {}
+        self.calls = 0
+        self.hedged = 0
+        self.fallbacks = 0
+        self.saved = 0.0
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @classmethod
+    def from_env(cls, make_client, adefault_client=None):
+        return cls(
+            make_client,
+            routes=parse_routes(os.getenv("LLM_ROUTES", "")),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            hedge_budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.1")),
+            adefault_client=adefault_client,
+        )
+
+    def route(self, node: str) -> Route:
+        return self.routes.get(node) or self.routes.get("*") or Route()
+
+    def model_name(self, node: str, default: str) -> str:
+        """The model a node's calls go to (part of its evaluation cache key)."""
+        return self.route(node).model or default
+
+    def client(self, model: Optional[str]):
+        if model is None:
+            return self.make_client(None)
+        with self._lock:
+            if model not in self._clients:
+                self._clients[model] = self.make_client(model)
+            return self._clients[model]
+
+    def _window(self, node: str, model) -> LatencyWindow:
+        window = self.windows.get((node, model))
+        if window is None:
+            window = self.windows.setdefault((node, model), LatencyWindow())
+        return window
+
+    def hedge_delay(self, node: str, model) -> Optional[float]:
+        """Seconds after which a call gets a duplicate, or None if it should not be hedged."""
+        if not self.hedge_percentile:
+            return None
+        window = self._window(node, model)
+        if len(window.samples) < self.hedge_min_samples or self.hedged >= self.hedge_budget * self.calls:
+            return None
+        return window.percentile(self.hedge_percentile)
+
+    def _record_saved(self, node: str, seconds: float):
+        LLM_HEDGE_SAVED.observe(seconds, node=node)
+        self.saved += seconds
+
+    def _hedge_won(self, node: str, model, started: float, won_at: float):
+        def primary_done(seconds):
+            # The primary's own latency: both the measurement of what the hedge saved and a sample
+            self._window(node, model).add(seconds)
+            self._record_saved(node, max(0.0, started + seconds - won_at))
+        return primary_done
+
+    def _primary_cancelled(self, node: str, model, elapsed: float):
+        """Records a primary cancelled after `elapsed` seconds because its hedge won."""
+        window = self._window(node, model)
+        longer = [seconds for seconds in window.samples if seconds > elapsed]
+        if longer:
+            # What the hedge saved, had the primary taken as long as recent calls slower than `elapsed`
+            self._record_saved(node, sum(longer) / len(longer) - elapsed)
+        # A lower bound of its latency, so the slow calls hedging cuts short stay in the window
+        window.add(elapsed)
+
+    # --- async ---
+
+    async def ainvoke(self, node: str, prompt, schema=None):
+        """ainvoke_llm for `node` on its routed model, with timeout, hedging and fallback."""
+        route = self.route(node)
+        try:
+            return await asyncio.wait_for(self._ahedged(node, route.model, prompt, schema), route.timeout)
+        except asyncio.TimeoutError:
+            if route.fallback is None:
+                raise
+            reason = "timeout"
+        except Exception:
+            if route.fallback is None:
+                raise
+            reason = "error"
+        LLM_FALLBACKS.inc(node=node, reason=reason)
+        self.fallbacks += 1
+        return await self._ahedged(node, route.fallback, prompt, schema)
+
+    async def _ahedged(self, node: str, model, prompt, schema):
+        self.calls += 1
+        if model is None and self.adefault_client is not None:
+            client = await self.adefault_client()
+        else:
+            # Building a client may import its SDK: off the event loop
+            client = self._clients.get(model) or await asyncio.to_thread(self.client, model)
+        started = time.monotonic()
+        primary = asyncio.ensure_future(ainvoke_llm(client, prompt, node, schema=schema))
+        delay = self.hedge_delay(node, model)
+        if delay is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(primary), delay)
+            except asyncio.TimeoutError:
+                return await self._arace(node, model, client, prompt, schema, primary, started)
+            except asyncio.CancelledError:
+                primary.cancel()
+                raise
+        try:
+            value = await primary
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        self._window(node, model).add(time.monotonic() - started)
+        return value
+
+    async def _arace(self, node, model, client, prompt, schema, primary, started):
+        self.hedged += 1
+        hedge = asyncio.ensure_future(ainvoke_llm(client, prompt, node, schema=schema))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if not task.cancelled() and not task.exception()), None)
+                if winner is None:
+                    continue
+                if winner is hedge:
+                    LLM_HEDGES.inc(node=node, outcome="won")
+                    if primary in pending:
+                        self._primary_cancelled(node, model, time.monotonic() - started)
+                        primary.cancel()
+                        await asyncio.gather(primary, return_exceptions=True)
+                else:
+                    LLM_HEDGES.inc(node=node, outcome="lost")
+                    self._window(node, model).add(time.monotonic() - started)
+                    hedge.cancel()
+                return winner.result()
+            # Both failed: raise the primary's error
+            return primary.result()
+        except asyncio.CancelledError:
+            primary.cancel()
+            hedge.cancel()
+            raise
+
+    # --- sync (GRAPH_EXECUTION_MODE=sync nodes, on executor threads) ---
+
+    def invoke(self, node: str, prompt, schema=None):
+        """invoke_llm for `node` on its routed model, with timeout, hedging and fallback."""
+        route = self.route(node)
+        try:
+            return self._hedged(node, route.model, prompt, schema, route.timeout)
+        except TimeoutError:
+            if route.fallback is None:
+                raise
+            reason = "timeout"
+        except Exception:
+            if route.fallback is None:
+                raise
+            reason = "error"
+        LLM_FALLBACKS.inc(node=node, reason=reason)
+        self.fallbacks += 1
+        return self._hedged(node, route.fallback, prompt, schema, None)
+
+    def _hedged(self, node: str, model, prompt, schema, timeout):
+        self.calls += 1
+        client = self.client(model)
+        started = time.monotonic()
+        delay = self.hedge_delay(node, model)
+        if delay is None and timeout is None:
+            value = invoke_llm(client, prompt, node, schema=schema)
+            self._window(node, model).add(time.monotonic() - started)
+            return value
+        # Blocking calls cannot be interrupted: a call past its timeout (or a losing one)
+        # finishes on the routing pool and its result is dropped
+        executor = self._pool()
+        primary = executor.submit(invoke_llm, client, prompt, node, schema=schema)
+        deadline = None if timeout is None else started + timeout
+        done, _ = wait({primary}, timeout=delay if delay is not None else timeout)
+        if not done and delay is not None and (deadline is None or time.monotonic() < deadline):
+            self.hedged += 1
+            hedge = executor.submit(invoke_llm, client, prompt, node, schema=schema)
+            pending = {primary, hedge}
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{node}: no answer from {model or 'default model'} within {timeout}s")
+                winner = next((f for f in done if f.exception() is None), None)
+                if winner is None:
+                    continue
+                if winner is hedge:
+                    LLM_HEDGES.inc(node=node, outcome="won")
+                    if primary in pending:
+                        record = self._hedge_won(node, model, started, time.monotonic())
+                        primary.add_done_callback(
+                            lambda f: f.exception() or record(time.monotonic() - started))
+                else:
+                    LLM_HEDGES.inc(node=node, outcome="lost")
+                    self._window(node, model).add(time.monotonic() - started)
+                return winner.result()
+            return primary.result()
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, _ = wait({primary}, timeout=remaining)
+        if not done:
+            raise TimeoutError(f"{node}: no answer from {model or 'default model'} within {timeout}s")
+        value = primary.result()
+        self._window(node, model).add(time.monotonic() - started)
+        return value
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-route")
+            return self._executor
+
+    def stats(self):
+        return {"calls": self.calls, "hedged": self.hedged, "fallbacks": self.fallbacks,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0.0, "saved_seconds": self.saved}
+
+def watch_router(router: LLMRouter):
+    """Exposes the router's hedge rate as a gauge."""
+    def collect():
+        return {"essay_llm_hedge_rate": ("Share of routed LLM calls that were hedged.", router.stats()["hedge_rate"])}
+    REGISTRY.add_collector(collect)
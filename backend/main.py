@@ -1,12 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from langgraph.checkpoint.memory import MemorySaver
-from graph import workflow, EssayState  
+import graph
+from graph import topic_pool
+from streaming import stream_graph, thread_snapshot
+from replay import resume_hub
+from admission import NEW_SESSION, RESUBMISSION, Busy, admission, client_key
+from eval_cache import evaluation_cache
+from metrics import REGISTRY, RESUMES, track_stream, watch_service
 import uuid
 import json
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start filling the topic pool so /start does not wait on Gemini
+    topic_pool.start()
+    # Compile the shared graph before the first request rather than during it
+    graph.get_graph_app()
+    yield
+    await topic_pool.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,52 +32,143 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory database for graph state
-checkpointer = MemorySaver()
-graph_app = workflow.compile(checkpointer=checkpointer, interrupt_before=["collect_essay"])
+watch_service(topic_pool, evaluation_cache)
+
+@app.get("/topic-pool")
+async def topic_pool_stats():
+    return topic_pool.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text format: per-node and per-LLM-call latency, tokens, errors, open streams
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 class EssayInput(BaseModel):
     thread_id: str
     essay_content: str
+    # Opt-in: also forward LLM tokens as {"type": "token", ...} lines while nodes run
+    stream_tokens: bool = False
+
+def busy_error(busy: Busy) -> HTTPException:
+    # Refused by admission control (admission.py): retry later rather than queue behind the overload
+    return HTTPException(status_code=503, detail=busy.frame(), headers={"Retry-After": str(busy.retry_after)})
 
 @app.post("/start")
-async def start_workflow():
+async def start_workflow(request: Request):
     thread_id = str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
+    graph_app = graph.get_graph_app()
     
     # Run ONLY until the first interruption (collect_essay)
     # We use stream to capture the output of "generate_topic"
     topic = ""
-    async for event in graph_app.astream({}, config=config):
-        if "generate_topic" in event:
-            topic = event["generate_topic"]["topic"]
+    try:
+        async with admission.admitted(client_key(request), NEW_SESSION):
+            async for event in graph_app.astream({}, config=config):
+                if "generate_topic" in event:
+                    topic = event["generate_topic"]["topic"]
+    except Busy as busy:
+        raise busy_error(busy)
             
-    return {"thread_id": thread_id, "topic": topic}
+    return {"thread_id": thread_id, "topic": topic, "resume_token": resume_hub.token(thread_id)}
+
+def ndjson_line(kind: str, payload: dict, seq: int) -> str:
+    """One line of the /submit-essay stream for an entry of the thread's event buffer (replay.py)."""
+    if kind == "event" and payload["type"] == "update":
+        node_name, data = payload["node"], payload["data"]
+        cached = isinstance(data, dict) and node_name in data.get("cache_hits", [])
+        payload = {"type": "update", "node": node_name, "data": data, "cached": cached}
+    return f'{json.dumps({**payload, "seq": seq})}\n'
+
+async def follow_lines(log, after: int, first_line: str = None):
+    # Copies the thread's buffered and live events after `after`; the client disconnecting
+    # only stops this generator, not the run
+    with track_stream("ndjson"):
+        if first_line is not None:
+            yield first_line
+        async for entries in log.follow(after):
+            for seq, kind, payload in entries:
+                yield ndjson_line(kind, payload, seq)
 
 @app.post("/submit-essay")
-async def submit_essay(input: EssayInput):
+async def submit_essay(input: EssayInput, request: Request):
     config = {"configurable": {"thread_id": input.thread_id}}
-    
-    # Update state with user essay
-    # Resume graph execution
-    # We use a generator to STREAM updates to the frontend
-    async def event_generator():
+    graph_app = graph.get_graph_app()
+
+    # The session may have been started by another worker; it only exists if the
+    # shared checkpointer has it (or it was evicted as idle).
+    current_state = await graph_app.aget_state(config)
+    if not current_state.values:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired thread_id: {input.thread_id}")
+    existing = resume_hub.log(input.thread_id, create=False)
+    if existing is not None and existing.running:
+        raise HTTPException(status_code=409, detail="This essay is still being evaluated; resume its stream instead")
+    # The run may also be going on another worker: the lease in the shared checkpointer says
+    from checkpointer import RunLease
+    lease = RunLease(graph_app.checkpointer, input.thread_id)
+    if not await lease.acquire():
+        raise HTTPException(status_code=409, detail="This essay is still being evaluated; resume its stream instead")
+    # Drafts that already got feedback are ahead of new sessions in the admission queue
+    priority = RESUBMISSION if current_state.values.get("feedback") else NEW_SESSION
+    try:
+        ticket = await admission.acquire(client_key(request), priority)
+    except Busy as busy:
+        await lease.release()
+        raise busy_error(busy)
+
+    async def run():
         # Resume by updating state
         # We need to make sure we are updating the correct key. 
         # The 'collect_essay' node in the graph is a pass-through, so we update the state 
         # which will be used by subsequent nodes. 
         # Using as_node="collect_essay" ensures we update as if we are at that node.
-        await graph_app.aupdate_state(config, {"essay_content": input.essay_content}, as_node="collect_essay")
-        
-        # Stream subsequent nodes
-        # passing None triggers resumption from the interrupted state
-        async for event in graph_app.astream(None, config=config):
-            for node_name, data in event.items():
-                # Yield JSON string for SSE
-                # We format it as a data: json_string\n\n for standard SSE or just lines if using StreamingResponse with media_type="application/x-ndjson"
-                # The user requested specific json format logs
-                # Format: {"event": "start/finish", ...} - though the example showed {"node": ...}
-                yield f'{json.dumps({"node": node_name, "data": data})}\n'
-    
+        try:
+            await graph_app.aupdate_state(config, {"essay_content": input.essay_content}, as_node="collect_essay")
+            # Stream subsequent nodes
+            # passing None triggers resumption from the interrupted state
+            async for event in stream_graph(graph_app, None, config, stream_tokens=input.stream_tokens):
+                log.append("event", event)
+        except Exception as e:
+            print(f"Error evaluating {input.thread_id}: {e}")
+            log.append("frame", {"type": "error", "message": str(e)})
+        finally:
+            admission.release(ticket)
+            await lease.release()
+
+    # The run belongs to the thread, not to this response: if the client drops, it can
+    # reconnect to GET /resume with the X-Resume-Token header and the last "seq" it read
+    log = resume_hub.log(input.thread_id)
+    after = log.seq
+    try:
+        resume_hub.start(input.thread_id, run())
+    except RuntimeError:
+        # Another submission for the thread was admitted while this one waited
+        admission.release(ticket)
+        await lease.release()
+        raise HTTPException(status_code=409, detail="This essay is still being evaluated; resume its stream instead")
+
+    from fastapi.responses import StreamingResponse
+    return StreamingResponse(follow_lines(log, after), media_type="application/x-ndjson",
+                             headers={"X-Resume-Token": resume_hub.token(input.thread_id)})
+
+@app.get("/resume")
+async def resume_stream(token: str, after: int = 0):
+    """Reattaches a dropped /submit-essay stream: a "resumed" line, the missed lines, then the live ones."""
+    thread_id = resume_hub.thread_of(token)
+    log = resume_hub.log(thread_id, create=False) if thread_id else None
+    snapshot = await thread_snapshot(graph.get_graph_app(), thread_id) if thread_id else None
+    if log is None and snapshot is None:
+        RESUMES.inc(transport="ndjson", outcome="unknown")
+        raise HTTPException(status_code=404, detail="Unknown or expired resume token")
+
+    log = log or resume_hub.log(thread_id)
+    entries, gap = log.since(after)
+    resumed = {"type": "resumed", "running": log.running, "gap": gap, "replayed": 0 if gap else len(entries)}
+    if gap:
+        # Part of what the client missed is no longer buffered: send the current state instead
+        resumed.update(snapshot or {})
+        after = log.seq
+    RESUMES.inc(transport="ndjson", outcome="gap" if gap else "replayed")
+
     from fastapi.responses import StreamingResponse
-    return StreamingResponse(event_generator(), media_type="application/x-ndjson")
+    return StreamingResponse(follow_lines(log, after, f"{json.dumps(resumed)}\n"), media_type="application/x-ndjson")
@@ -0,0 +1,226 @@
+import asyncio
+import functools
+import threading
+import time
+
+# Minimal Prometheus-style metrics (text exposition format 0.0.4), process-global.
+# Both FastAPI apps serve REGISTRY.render() at GET /metrics.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return entry[0][-1] if entry else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def add_collector(self, collect):
+        """collect() -> {metric_name: (help, value)}, sampled as gauges at render time."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, (help, value) in collect().items():
+                if value is None:
+                    continue
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+NODE_DURATION = REGISTRY.histogram(
+    "essay_node_duration_seconds", "Wall time of a graph node, including cache lookups and LLM calls.", ["node"])
+NODE_ERRORS = REGISTRY.counter(
+    "essay_node_errors_total", "Graph node executions that raised.", ["node"])
+LLM_DURATION = REGISTRY.histogram(
+    "essay_llm_call_duration_seconds", "Wall time of one LLM call, excluding time queued for a slot.", ["node", "model"])
+LLM_QUEUE_WAIT = REGISTRY.histogram(
+    "essay_llm_queue_wait_seconds", "Time an LLM call waited in the rate limiter for a slot.", ["node", "model"])
+LLM_TOKENS = REGISTRY.counter(
+    "essay_llm_tokens_total", "LLM tokens by direction (input/output).", ["node", "model", "direction"])
+LLM_RETRIES = REGISTRY.counter(
+    "essay_llm_retries_total", "LLM calls retried after a transient error.", ["node", "model"])
+LLM_ERRORS = REGISTRY.counter(
+    "essay_llm_errors_total", "LLM calls that failed.", ["node", "model", "error"])
+LLM_HEDGES = REGISTRY.counter(
+    "essay_llm_hedges_total", "Hedged LLM calls, by whether the duplicate answered first (won) or not (lost).", ["node", "outcome"])
+LLM_HEDGE_SAVED = REGISTRY.histogram(
+    "essay_llm_hedge_saved_seconds", "How much sooner a winning hedge answered than the call it duplicated.", ["node"])
+LLM_FALLBACKS = REGISTRY.counter(
+    "essay_llm_fallbacks_total", "LLM calls retried on the node's fallback model after a timeout or error.", ["node", "reason"])
+EVAL_COALESCED = REGISTRY.counter(
+    "essay_eval_coalesced_total", "Evaluations that waited for an identical in-flight call instead of calling the LLM.", ["node"])
+WS_BACKPRESSURE = REGISTRY.counter(
+    "essay_ws_backpressure_tokens_total", "Token events a slow WebSocket client did not get one by one.", ["outcome"])
+WS_CANCELLED = REGISTRY.counter(
+    "essay_ws_runs_cancelled_total", "WebSocket session runs cancelled by the client.")
+RESUMES = REGISTRY.counter(
+    "essay_resumes_total", "Stream resumes after a reconnect, by outcome (replayed, gap, unknown).", ["transport", "outcome"])
+ADMISSIONS = REGISTRY.counter(
+    "essay_admissions_total", "Graph runs admitted or refused (client_limit, queue_full, displaced, timeout).", ["outcome", "priority"])
+ADMISSION_WAIT = REGISTRY.histogram(
+    "essay_admission_wait_seconds", "Time an admitted graph run waited in the admission queue.", ["priority"])
+NEAR_DUPLICATES = REGISTRY.counter(
+    "essay_near_duplicates_total", "Drafts matched to a graded near-duplicate, by whether its scores were reused or seeded.", ["action"])
+ACTIVE_STREAMS = REGISTRY.gauge(
+    "essay_active_streams", "Open client streams.", ["transport"])
+STREAMS_TOTAL = REGISTRY.counter(
+    "essay_streams_total", "Client streams opened.", ["transport"])
+
+def instrument_node(name: str, fn):
+    """Wraps a graph node (sync or async) to record its wall time and errors."""
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(state):
+            t0 = time.perf_counter()
+            try:
+                return await fn(state)
+            except Exception:
+                NODE_ERRORS.inc(node=name)
+                raise
+            finally:
+                NODE_DURATION.observe(time.perf_counter() - t0, node=name)
+    else:
+        @functools.wraps(fn)
+        def wrapper(state):
+            t0 = time.perf_counter()
+            try:
+                return fn(state)
+            except Exception:
+                NODE_ERRORS.inc(node=name)
+                raise
+            finally:
+                NODE_DURATION.observe(time.perf_counter() - t0, node=name)
+    return wrapper
+
+class track_stream:
+    """Context manager counting an open NDJSON / WebSocket stream."""
+
+    def __init__(self, transport: str):
+        self.transport = transport
+
+    def __enter__(self):
+        STREAMS_TOTAL.inc(transport=self.transport)
+        ACTIVE_STREAMS.inc(transport=self.transport)
+        return self
+
+    def __exit__(self, *exc):
+        ACTIVE_STREAMS.dec(transport=self.transport)
+        return False
+
+def watch_service(topic_pool, cache):
+    """Exposes the topic pool and evaluation cache counters as gauges."""
+    def collect():
+        pool = topic_pool.stats()
+        cache_stats = cache.stats()
+        return {
+            "essay_topic_pool_depth": ("Topics ready in the pool.", pool["depth"]),
+            "essay_topic_pool_hits": ("Topics served from the pool.", pool["hits"]),
+            "essay_topic_pool_misses": ("Topic requests that fell back to a direct LLM call.", pool["misses"]),
+            "essay_eval_cache_hits": ("Evaluation cache hits.", cache_stats["hits"]),
+            "essay_eval_cache_misses": ("Evaluation cache misses.", cache_stats["misses"]),
+        }
+    REGISTRY.add_collector(collect)
@@ -0,0 +1,307 @@
+import atexit
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from eval_cache import normalize_text
+from metrics import NEAR_DUPLICATES, REGISTRY
+from prescore import Tokens
+
+# Near-duplicate detection over previously graded essays, per topic (NEAR_DUP).
+#
+# Each essay is reduced to a MinHash signature: its word 3-shingles are hashed by
+# PERMUTATIONS random multiply-shift functions and the minimum of each is kept (its top
+# 16 bits; chance agreements of 1 in 65536 barely move the estimate). The share of
+# positions where two signatures agree estimates the Jaccard similarity of the shingle
+# sets, so a whole topic is compared with one vectorized == over a (PERMUTATIONS, rows)
+# uint16 array, stored column per essay so the count runs across rows. The essay's words
+# are hashed by prescore.Tokens (case and punctuation do not count).
+#
+# A submission whose best match is at least NEAR_DUP_THRESHOLD similar is flagged in the
+# `near_duplicate` state channel. "seed" streams the match's scores as provisional scores
+# and still runs the evaluators; "reuse" takes the scores and skips the evaluators.
+# Freshly scored drafts are added to the index; a session's own earlier drafts never
+# count as its duplicates.
+#
+# Memory is bounded: NEAR_DUP_PER_TOPIC signatures per topic (the oldest are overwritten)
+# and NEAR_DUP_MAX_TOPICS topics (the least recently used are dropped). With NEAR_DUP_PATH
+# the index is saved as one .npz file at most every NEAR_DUP_SAVE_INTERVAL seconds and at
+# exit, and loaded at start. Each process keeps its own index; with several workers the
+# file holds the last one saved.
+
+SHINGLE = 3
+PERMUTATIONS = 128
+# The hash functions must not change between saving an index and loading it
+SEED = 0x5EED_D0C5
+_rng = np.random.default_rng(SEED)
+MULTIPLIERS = _rng.integers(0, 2 ** 63, PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+OFFSETS = _rng.integers(0, 2 ** 63, PERMUTATIONS, dtype=np.uint64)
+SHINGLE_BASE = np.uint64(0x9E3779B97F4A7C15)
+# Permutations hashed at once: bounds the (block, shingles) working array of a large batch
+BLOCK = 16
+EMPTY = np.iinfo(np.uint16).max
+DIMENSIONS = ("clarity", "depth", "vocab")
+
+def signatures(essays) -> np.ndarray:
+    """MinHash signatures, one (PERMUTATIONS,) uint16 row per essay. An essay without words gets all EMPTY."""
+    n = len(essays)
+    tokens = Tokens(essays)
+    is_word = ~tokens.is_mark
+    words = tokens.hashes[is_word].view(np.uint64)
+    doc = tokens.doc[is_word]
+    counts = np.bincount(doc, minlength=n)
+    # Shingle i covers words i .. i+SHINGLE-1 of one essay; essays shorter than that are one shingle
+    width = np.minimum(counts, SHINGLE)
+    starts = np.cumsum(counts) - counts
+    per_doc = np.maximum(counts - SHINGLE + 1, (counts > 0).astype(np.int64))
+    first = np.repeat(starts, per_doc) + (np.arange(per_doc.sum()) - np.repeat(np.cumsum(per_doc) - per_doc, per_doc))
+    shingle_width = np.repeat(width, per_doc)
+    shingles = np.zeros(len(first), dtype=np.uint64)
+    for k in range(SHINGLE):
+        take = k < shingle_width
+        shingles[take] = shingles[take] * SHINGLE_BASE + words[first[take] + k]
+
+    result = np.full((n, PERMUTATIONS), EMPTY, dtype=np.uint16)
+    present = per_doc > 0
+    if not present.any():
+        return result
+    bounds = (np.cumsum(per_doc) - per_doc)[present]
+    for block in range(0, PERMUTATIONS, BLOCK):
+        hashed = (MULTIPLIERS[block:block + BLOCK, None] * shingles + OFFSETS[block:block + BLOCK, None]) >> np.uint64(48)
+        result[present, block:block + BLOCK] = np.minimum.reduceat(hashed, bounds, axis=1).T.astype(np.uint16)
+    return result
+
+def topic_key(topic: str) -> str:
+    return normalize_text(topic).lower()
+
+class TopicRows:
+    """Signatures, scores and owning sessions of one topic's graded essays, as a ring of at most `capacity` rows."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0
+        self.signatures = np.zeros((PERMUTATIONS, 0), dtype=np.uint16)
+        self.scores = np.zeros((0, len(DIMENSIONS)), dtype=np.int8)
+        self.owners = np.zeros(0, dtype=np.int64)
+
+    def _grow(self):
+        # Allocated by doubling, so a topic with few essays stays small
+        rows = min(self.capacity, max(16, 2 * len(self.owners)))
+        signatures = np.zeros((PERMUTATIONS, rows), dtype=np.uint16)
+        signatures[:, :self.size] = self.signatures
+        scores = np.zeros((rows, len(DIMENSIONS)), dtype=np.int8)
+        scores[:self.size] = self.scores
+        owners = np.zeros(rows, dtype=np.int64)
+        owners[:self.size] = self.owners
+        self.signatures, self.scores, self.owners = signatures, scores, owners
+
+    def add(self, signature, scores, owner: int):
+        if self.size == len(self.owners) and self.size < self.capacity:
+            self._grow()
+        row = self.head
+        self.signatures[:, row] = signature
+        self.scores[row] = scores
+        self.owners[row] = owner
+        self.head = (row + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def best(self, signature, exclude_owner: int):
+        """(row, similarity) of the most similar essay of another session, or None."""
+        if not self.size:
+            return None
+        agree = np.add.reduce(self.signatures[:, :self.size] == signature[:, None], axis=0, dtype=np.uint8)
+        similarity = agree / PERMUTATIONS
+        similarity[self.owners[:self.size] == exclude_owner] = -1
+        row = int(similarity.argmax())
+        return (row, float(similarity[row])) if similarity[row] >= 0 else None
+
+    def ordered(self):
+        """Rows oldest first (the order they are saved and loaded in)."""
+        order = np.roll(np.arange(self.size), -self.head) if self.size == self.capacity else np.arange(self.size)
+        return self.signatures[:, order].T, self.scores[order], self.owners[order]
+
+    def nbytes(self) -> int:
+        return self.signatures.nbytes + self.scores.nbytes + self.owners.nbytes
+
+class NearDuplicateIndex:
+    def __init__(self, max_topics: int = 128, per_topic: int = 512, path: str = None, save_interval: float = 30.0):
+        self.max_topics = max_topics
+        self.per_topic = per_topic
+        self.path = path
+        self.save_interval = save_interval
+        self.topics = OrderedDict()
+        self.hits = 0
+        self.lookups = 0
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_topics=int(os.getenv("NEAR_DUP_MAX_TOPICS", "128")),
+            per_topic=int(os.getenv("NEAR_DUP_PER_TOPIC", "512")),
+            path=os.getenv("NEAR_DUP_PATH") or None,
+            save_interval=float(os.getenv("NEAR_DUP_SAVE_INTERVAL", "30")),
+        )
+
+    def _rows(self, topic: str, create: bool):
+        key = topic_key(topic)
+        rows = self.topics.get(key)
+        if rows is None and create:
+            rows = self.topics[key] = TopicRows(self.per_topic)
+            while len(self.topics) > self.max_topics:
+                self.topics.popitem(last=False)
+        if rows is not None:
+            self.topics.move_to_end(key)
+        return rows
+
+    def lookup(self, topic: str, signature, exclude_owner: int = 0):
+        """The graded essay of `topic` most similar to `signature` (from another session):
+        {"similarity", "scores"}, or None if the topic has none."""
+        with self._lock:
+            self.lookups += 1
+            rows = self._rows(topic, create=False)
+            found = rows.best(signature, exclude_owner) if rows is not None else None
+            if found is None:
+                return None
+            row, similarity = found
+            scores = {d: int(s) for d, s in zip(DIMENSIONS, rows.scores[row])}
+        return {"similarity": round(similarity, 3), "scores": scores}
+
+    def add(self, topic: str, signature, scores: dict, owner: int = 0):
+        if (signature == EMPTY).all():
+            return
+        with self._lock:
+            self._rows(topic, create=True).add(signature, [scores[d] for d in DIMENSIONS], owner)
+            self._dirty = True
+            due = self.path and time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def save(self, path: str = None):
+        """Writes the index to `path` (default NEAR_DUP_PATH) atomically."""
+        path = path or self.path
+        with self._lock:
+            self._dirty = False
+            self._last_save = time.monotonic()
+            keys = list(self.topics)
+            parts = [rows.ordered() for rows in self.topics.values()]
+        if not path:
+            return
+        arrays = {
+            "topics": np.array(keys, dtype=str),
+            "sizes": np.array([len(owners) for _, _, owners in parts], dtype=np.int64),
+            "signatures": np.concatenate([p[0] for p in parts]) if parts else np.zeros((0, PERMUTATIONS), np.uint16),
+            "scores": np.concatenate([p[1] for p in parts]) if parts else np.zeros((0, len(DIMENSIONS)), np.int8),
+            "owners": np.concatenate([p[2] for p in parts]) if parts else np.zeros(0, np.int64),
+            "seed": np.array([SEED, SHINGLE, PERMUTATIONS], dtype=np.int64),
+        }
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            if data["seed"].tolist() != [SEED, SHINGLE, PERMUTATIONS]:
+                # Signatures of other hash functions cannot be compared; start empty
+                return
+            offsets = np.concatenate(([0], np.cumsum(data["sizes"])))
+            signatures, scores, owners = data["signatures"], data["scores"], data["owners"]
+            with self._lock:
+                for i, key in enumerate(data["topics"].tolist()):
+                    rows = self._rows(key, create=True)
+                    # The newest rows are the last ones, so a smaller NEAR_DUP_PER_TOPIC keeps those
+                    for row in range(max(offsets[i], offsets[i + 1] - self.per_topic), offsets[i + 1]):
+                        rows.add(signatures[row], scores[row], int(owners[row]))
+
+    def save_if_dirty(self):
+        if self._dirty:
+            self.save()
+
+    def stats(self):
+        with self._lock:
+            return {"topics": len(self.topics), "essays": sum(rows.size for rows in self.topics.values()),
+                    "bytes": sum(rows.nbytes() for rows in self.topics.values()),
+                    "lookups": self.lookups, "hits": self.hits}
+
+class NearDuplicateStage:
+    """Graph node in front of the evaluators, and the bookkeeping that adds graded drafts to the index."""
+
+    def __init__(self, index: NearDuplicateIndex, mode: str = "off", threshold: float = 0.8):
+        if mode not in ("off", "seed", "reuse"):
+            raise ValueError(f"Unknown NEAR_DUP mode: {mode!r} (expected 'off', 'seed' or 'reuse')")
+        self.index = index
+        self.mode = mode
+        self.threshold = threshold
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def node(self, state):
+        """Flags a near-duplicate draft; seeds or reuses its scores."""
+        print("Node: Checking for near-duplicates...")
+        # Shared by the drafts of one session, so they are not flagged as each other's duplicates
+        lineage = state.get("lineage") or secrets.randbits(63)
+        signature = signatures([state.get("essay_content", "")])[0]
+        match = None
+        if not (signature == EMPTY).all():
+            match = self.index.lookup(state.get("topic", ""), signature, lineage)
+        if match is None or match["similarity"] < self.threshold:
+            return {"near_duplicate": None, "lineage": lineage}
+        self.index.hits += 1
+        scores = match["scores"]
+        update = {"near_duplicate": match, "lineage": lineage}
+        if self.mode == "reuse":
+            NEAR_DUPLICATES.inc(action="reused")
+            update.update({f"{d}_score": scores[d] for d in DIMENSIONS})
+        else:
+            NEAR_DUPLICATES.inc(action="seeded")
+            update["provisional_scores"] = {**scores, "total": sum(scores.values())}
+        return update
+
+    def route(self, then):
+        """Drafts whose scores were reused go straight to aggregate_score; the rest follow `then`."""
+        def route(state):
+            return ["aggregate_score"] if self.mode == "reuse" and state.get("near_duplicate") else then(state)
+        return route
+
+    def record(self, state, update):
+        """Adds a draft the evaluators scored in full (not reused, not skipped, not a duplicate) to the index."""
+        if state.get("near_duplicate") or update.get("reused_scores"):
+            return
+        scores = {d: state.get(f"{d}_score") for d in DIMENSIONS}
+        if any(score is None for score in scores.values()):
+            return
+        signature = signatures([state.get("essay_content", "")])[0]
+        self.index.add(state.get("topic", ""), signature, scores, state.get("lineage") or 0)
+
+# The process's index, shared by every graph built with the stage on
+index = None
+_index_lock = threading.Lock()
+
+def _index_gauges():
+    stats = index.stats()
+    return {
+        "essay_near_dup_index_essays": ("Graded essays in the near-duplicate index.", stats["essays"]),
+        "essay_near_dup_index_bytes": ("Memory held by the near-duplicate index arrays.", stats["bytes"]),
+    }
+
+def shared_index() -> NearDuplicateIndex:
+    """The process's index (NEAR_DUP_* settings), loaded on first use and saved at exit."""
+    global index
+    if index is None:
+        with _index_lock:
+            if index is None:
+                index = NearDuplicateIndex.from_env()
+                atexit.register(lambda: index.save_if_dirty())
+                REGISTRY.add_collector(_index_gauges)
+    return index
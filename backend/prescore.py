@@ -0,0 +1,246 @@
+import os
+import re
+import numpy as np
+
+# Local pre-scoring: lexical and readability features computed with NumPy over a whole
+# batch of essays at once, turned into provisional 0-5 scores for each rubric dimension.
+# With PRESCORE=gate, essays that are obviously below the bar are rejected here, before
+# any LLM call. The features:
+#
+#   words, unique_words    word tokens and distinct word types (type-token ratio, Guiraud index)
+#   sentence_mean/_std     words per sentence
+#   topic_overlap          fraction of the topic's content words used in the essay
+#   vowel_ratio            vowels among ASCII letters (keyboard mashing is far from ~0.38)
+#   latin_ratio            ASCII letters among visible characters
+#   symbol_ratio           ASCII punctuation and symbols among visible characters
+#
+# Provisional scores are a cheap guide streamed before the LLM scores arrive; only
+# rejections replace the LLM.
+
+STOPWORDS = frozenset(
+    "the and for with that this from are was were will its their there which what into about has have "
+    "how can not but than then does should would could more most such them they been being over".split()
+)
+
+# Byte classes. Words are runs of ASCII letters and digits or non-ASCII (UTF-8) bytes;
+# each . ! ? is a sentence mark. Lookup tables are cheaper than np.isin over every byte.
+def byte_class(chars):
+    table = np.zeros(256, dtype=bool)
+    table[list(chars)] = True
+    return table
+
+UPPER = byte_class(range(ord("A"), ord("Z") + 1))
+LETTERS = byte_class(range(ord("a"), ord("z") + 1)) | UPPER
+DIGITS = byte_class(range(ord("0"), ord("9") + 1))
+WORD = LETTERS | DIGITS | byte_class(range(0x80, 0x100))
+MARKS = byte_class(b".!?")
+VOWELS = byte_class(b"aeiouAEIOU")
+WHITESPACE = byte_class(b" \t\r\n\f\v")
+
+# Words are hashed with a polynomial hash computed from prefix sums (uint64 arithmetic wraps)
+BASE = np.uint64(0x100000001B3)
+BASE_INVERSE = np.uint64(pow(int(BASE), -1, 2 ** 64))
+_powers = np.ones(0, dtype=np.uint64)
+_inverses = np.ones(0, dtype=np.uint64)
+
+def hash_powers(n: int):
+    """BASE**i and BASE**-i for i < n, cached and grown by doubling."""
+    global _powers, _inverses
+    if len(_powers) < n:
+        size = max(n, 2 * len(_powers), 1 << 16)
+        _powers = np.cumprod(np.full(size, BASE, dtype=np.uint64)) * BASE_INVERSE
+        _inverses = np.cumprod(np.full(size, BASE_INVERSE, dtype=np.uint64)) * BASE
+    return _powers[:n], _inverses[:n]
+
+REJECTION_FEEDBACK = {
+    "too_short": "- The essay is too short to be evaluated. Develop the argument over several paragraphs.",
+    "gibberish": "- The submission does not read as English prose. Write the essay in full sentences.",
+    "repetitive": "- The essay repeats the same few words. Write an original argument that addresses the topic.",
+}
+
+def topic_words(topic: str):
+    return " ".join(sorted(w for w in re.findall(r"\w+", (topic or "").lower()) if len(w) > 3 and w not in STOPWORDS))
+
+def sorted_unique(values):
+    """np.unique for int keys via one sort (np.unique's hash path is slower on large batches)."""
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+def contains(sorted_values, keys):
+    """Membership of keys in a sorted unique array."""
+    if not len(sorted_values):
+        return np.zeros(len(keys), dtype=bool)
+    found = np.minimum(np.searchsorted(sorted_values, keys), len(sorted_values) - 1)
+    return sorted_values[found] == keys
+
+class Tokens:
+    """All tokens of a batch of texts, in order: owning text, word hash, sentence mark."""
+
+    def __init__(self, texts):
+        encoded = [(text or "").encode() for text in texts]
+        # Each text ends with a newline so no word runs across two of them
+        self.raw = np.frombuffer(b"".join(e + b"\n" for e in encoded), dtype=np.uint8)
+        self.offsets = np.cumsum([0] + [len(e) + 1 for e in encoded])[:-1].astype(np.int64)
+        word = WORD[self.raw]
+        first = word.copy()
+        first[1:] &= ~word[:-1]
+        last = word.copy()
+        last[:-1] &= ~word[1:]
+        starts, stops = np.flatnonzero(first), np.flatnonzero(last) + 1
+
+        codes = np.where(UPPER[self.raw], self.raw | 0x20, self.raw).astype(np.uint64)
+        powers, inverses = hash_powers(len(codes))
+        prefix = np.concatenate((np.zeros(1, dtype=np.uint64), np.cumsum(codes * powers, dtype=np.uint64)))
+        word_hashes = ((prefix[stops] - prefix[starts]) * inverses[starts]).view(np.int64)
+
+        token = first | MARKS[self.raw]
+        self.is_mark = MARKS[self.raw[token]]
+        self.hashes = np.zeros(len(self.is_mark), dtype=np.int64)
+        self.hashes[~self.is_mark] = word_hashes
+        self.doc = np.repeat(np.arange(len(encoded)), self.per_text(token))
+
+    def per_text(self, mask):
+        """Count of set bytes in each text (every text has at least its newline byte)."""
+        if not len(self.offsets):
+            return np.zeros(0, dtype=np.int64)
+        return np.add.reduceat(mask.view(np.uint8), self.offsets, dtype=np.int64)
+
+class PreScorer:
+    """Vectorized essay features, provisional scores and the rejection gate."""
+
+    def __init__(self, mode: str = "off", min_words: int = 50):
+        if mode not in ("off", "provisional", "gate"):
+            raise ValueError(f"Unknown PRESCORE mode: {mode!r} (expected 'off', 'provisional' or 'gate')")
+        self.mode = mode
+        self.min_words = min_words
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("PRESCORE", "off"), int(os.getenv("PRESCORE_MIN_WORDS", "50")))
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def features(self, topics, essays):
+        """Feature arrays (one entry per essay) for parallel lists of topics and essays."""
+        n = len(essays)
+        tokens = Tokens(essays)
+        is_word = ~tokens.is_mark
+        doc = tokens.doc
+        words = np.bincount(doc[is_word], minlength=n)
+        # Word hashes -> dense ids, so an (essay, word) pair packs into one int64 key
+        types = sorted_unique(tokens.hashes[is_word])
+        size = max(1, len(types))
+        pairs = sorted_unique(doc[is_word] * size + np.searchsorted(types, tokens.hashes[is_word]))
+        unique_words = np.bincount(pairs // size, minlength=n)
+
+        # A sentence starts at each essay's first token and after every . ! ?
+        starts = np.ones(len(doc), dtype=bool)
+        starts[1:] = tokens.is_mark[:-1] | (doc[1:] != doc[:-1])
+        sentence = np.cumsum(starts) - 1
+        lengths = np.bincount(sentence[is_word], minlength=int(starts.sum())).astype(float)
+        sentence_doc = doc[starts]
+        real = lengths > 0
+        sentences = np.bincount(sentence_doc[real], minlength=n)
+        total = np.bincount(sentence_doc[real], weights=lengths[real], minlength=n)
+        squares = np.bincount(sentence_doc[real], weights=lengths[real] ** 2, minlength=n)
+        sentence_mean = total / np.maximum(sentences, 1)
+        sentence_std = np.sqrt(np.maximum(squares / np.maximum(sentences, 1) - sentence_mean ** 2, 0))
+
+        # Topic keywords are tokenized once per distinct topic, then expanded to every essay
+        distinct = {}
+        topic_index = np.array([distinct.setdefault(topic, len(distinct)) for topic in topics], dtype=np.int64)
+        keywords = Tokens([topic_words(topic) for topic in distinct])
+        keyword_counts = np.bincount(keywords.doc, minlength=len(distinct))
+        keyword_starts = np.cumsum(keyword_counts) - keyword_counts
+        topic_counts = keyword_counts[topic_index] if n else np.zeros(0, dtype=np.int64)
+        topic_doc = np.repeat(np.arange(n), topic_counts)
+        within = np.arange(len(topic_doc)) - np.repeat(np.cumsum(topic_counts) - topic_counts, topic_counts)
+        topic_hashes = keywords.hashes[keyword_starts[topic_index[topic_doc]] + within]
+        known = contains(types, topic_hashes)
+        topic_keys = topic_doc * size + np.minimum(np.searchsorted(types, topic_hashes), size - 1)
+        hits = known & contains(pairs, topic_keys)
+        topic_overlap = np.where(topic_counts > 0,
+                                 np.bincount(topic_doc[hits], minlength=n) / np.maximum(topic_counts, 1), 1.0)
+
+        raw = tokens.raw
+        letters = LETTERS[raw]
+        visible = ~WHITESPACE[raw]
+        symbols = visible & ~letters & ~DIGITS[raw] & (raw < 0x80)
+        letter_count = tokens.per_text(letters)
+        vowel_ratio = tokens.per_text(VOWELS[raw]) / np.maximum(letter_count, 1)
+        visible_count = tokens.per_text(visible)
+        symbol_ratio = tokens.per_text(symbols) / np.maximum(visible_count, 1)
+
+        return {
+            "words": words,
+            "unique_words": unique_words,
+            "sentences": sentences,
+            "sentence_mean": sentence_mean,
+            "sentence_std": sentence_std,
+            "topic_overlap": topic_overlap,
+            "vowel_ratio": vowel_ratio,
+            "latin_ratio": letter_count / np.maximum(visible_count, 1),
+            "symbol_ratio": symbol_ratio,
+        }
+
+    def provisional(self, f):
+        """Provisional 0-5 scores per dimension, as integer arrays."""
+        words = f["words"]
+        # Short essays cannot score well on clarity or vocabulary however they read
+        body = np.minimum(1.0, words / 150)
+        spread = f["sentence_std"] / np.maximum(f["sentence_mean"], 1)
+        clarity = (5 - np.abs(f["sentence_mean"] - 20) / 5 - 2 * np.maximum(spread - 0.8, 0)) * body
+        depth = 0.6 * np.minimum(5, words / 120) + 2 * np.minimum(1, f["topic_overlap"] / 0.6)
+        guiraud = f["unique_words"] / np.sqrt(np.maximum(words, 1))
+        vocab = (guiraud - 3) / 1.2 * body
+        return {name: np.clip(np.rint(values), 0, 5).astype(int)
+                for name, values in (("clarity", clarity), ("depth", depth), ("vocab", vocab))}
+
+    def rejections(self, f):
+        """Rejection reason per essay (None when the essay goes on to the LLM evaluators)."""
+        words = f["words"]
+        guiraud = f["unique_words"] / np.sqrt(np.maximum(words, 1))
+        # Vowel balance only means something for essays written mostly in Latin script
+        mashed = (f["latin_ratio"] > 0.5) & ((f["vowel_ratio"] < 0.2) | (f["vowel_ratio"] > 0.6))
+        reasons = np.full(len(words), None, dtype=object)
+        reasons[guiraud < 2.5] = "repetitive"
+        reasons[mashed | (f["symbol_ratio"] > 0.3)] = "gibberish"
+        reasons[words < self.min_words] = "too_short"
+        return reasons
+
+    def score(self, topics, essays, batch_size: int = 256):
+        """One result per essay: provisional scores, and the rejection reason in gate mode.
+        Large inputs are processed `batch_size` essays at a time, which keeps the working
+        arrays cache-sized (fastest around 64-256 essays)."""
+        results = []
+        for i in range(0, len(essays), batch_size):
+            f = self.features(topics[i:i + batch_size], essays[i:i + batch_size])
+            scores = self.provisional(f)
+            reasons = self.rejections(f) if self.mode == "gate" else [None] * len(f["words"])
+            totals = sum(scores.values())
+            results.extend(
+                {**{d: int(scores[d][j]) for d in scores}, "total": int(totals[j]), "rejected": reasons[j]}
+                for j in range(len(f["words"]))
+            )
+        return results
+
+    def node(self, state):
+        """Graph node between collect_essay and the evaluators."""
+        print("Node: Pre-scoring...")
+        result = self.score([state.get("topic", "")], [state.get("essay_content", "")])[0]
+        reason = result.pop("rejected")
+        update = {"provisional_scores": result, "prescore_rejected": reason}
+        if reason:
+            update.update(clarity_score=0, depth_score=0, vocab_score=0, total_score=0,
+                          feedback=REJECTION_FEEDBACK[reason])
+        return update
+
+    def route(self, then):
+        """Rejected drafts go straight back to collect_essay; the rest follow `then`."""
+        def route(state):
+            return ["collect_essay"] if state.get("prescore_rejected") else then(state)
+        return route
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+from collections import OrderedDict, deque
+from typing import Optional
+
+# Resumable streams for both apps. Graph runs are not tied to the connection that started
+# them: a run writes its events into the ring buffer of its thread, numbered by a
+# per-thread sequence that clients see as "seq" on every frame / line, and connections
+# follow the buffer. When a client drops, the run carries on (the LLM calls it already
+# paid for are not thrown away). The client reconnects with the thread's resume token and
+# the last seq it received; the buffered events after it are replayed, then the live
+# stream is attached.
+#
+# Buffers are per process and hold the last RESUME_BUFFER events of a thread. If the
+# events asked for were evicted (or the client reached another worker), the resume
+# reports a gap and sends the thread's current state from the shared checkpointer.
+
+class ThreadLog:
+    """Ring buffer of one thread's events: entries are (seq, kind, payload)."""
+
+    def __init__(self, size: int):
+        self.entries = deque(maxlen=size)
+        self.seq = 0
+        self.run = None
+        # WebSocket sessions currently copying this log (see ws_sessions.py)
+        self.followers = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.run is not None and not self.run.done()
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """Set on the next append or when the current run ends (take it before reading)."""
+        return self._changed
+
+    def notify(self, *_):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, kind: str, payload) -> int:
+        self.seq += 1
+        self.entries.append((self.seq, kind, payload))
+        self.notify()
+        return self.seq
+
+    def since(self, seq: int):
+        """Entries after seq, and whether any of them are missing (evicted, or from another process)."""
+        first = self.entries[0][0] if self.entries else self.seq + 1
+        return [e for e in self.entries if e[0] > seq], seq + 1 < first or seq > self.seq
+
+    async def follow(self, after: int):
+        """Yields lists of entries after `after`: the buffered ones, then live ones until the run ends."""
+        while True:
+            changed = self.changed
+            entries, _ = self.since(after)
+            if entries:
+                after = entries[-1][0]
+                yield entries
+            elif not self.running:
+                return
+            else:
+                await changed.wait()
+
+class ResumeHub:
+    """Resume tokens and the event buffers of recently active threads."""
+
+    def __init__(self, buffer_size: int = 256, max_threads: int = 1000, secret: Optional[bytes] = None):
+        self.buffer_size = buffer_size
+        self.max_threads = max_threads
+        # Tokens sign the thread id; workers sharing RESUME_SECRET accept each other's tokens
+        self.secret = secret or secrets.token_bytes(32)
+        self.logs = OrderedDict()
+
+    @classmethod
+    def from_env(cls):
+        secret = os.getenv("RESUME_SECRET")
+        return cls(
+            buffer_size=int(os.getenv("RESUME_BUFFER", "256")),
+            max_threads=int(os.getenv("RESUME_MAX_THREADS", "1000")),
+            secret=secret.encode() if secret else None,
+        )
+
+    def _signature(self, thread_id: str) -> str:
+        return hmac.new(self.secret, thread_id.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def token(self, thread_id: str) -> str:
+        return f"{thread_id}.{self._signature(thread_id)}"
+
+    def thread_of(self, token: str) -> Optional[str]:
+        """The thread a resume token was issued for, or None if it is not valid."""
+        thread_id, _, signature = (token or "").rpartition(".")
+        if thread_id and hmac.compare_digest(signature, self._signature(thread_id)):
+            return thread_id
+        return None
+
+    def log(self, thread_id: str, create: bool = True) -> Optional[ThreadLog]:
+        log = self.logs.get(thread_id)
+        if log is not None:
+            self.logs.move_to_end(thread_id)
+        elif create:
+            log = self.logs[thread_id] = ThreadLog(self.buffer_size)
+            self._evict()
+        return log
+
+    def _evict(self):
+        # Least recently used first, never a thread whose run is going or that a session follows
+        for thread_id in list(self.logs):
+            if len(self.logs) <= self.max_threads:
+                break
+            log = self.logs[thread_id]
+            if not log.running and not log.followers:
+                del self.logs[thread_id]
+
+    def start(self, thread_id: str, coro) -> ThreadLog:
+        """Runs coro as the thread's current run, detached from any connection."""
+        log = self.log(thread_id)
+        if log.running:
+            coro.close()
+            raise RuntimeError(f"thread {thread_id} already has a run in progress")
+        log.run = asyncio.create_task(coro)
+        log.run.add_done_callback(log.notify)
+        return log
+
+    async def wait_idle(self, thread_id: str):
+        log = self.log(thread_id, create=False)
+        if log is not None and log.running:
+            # asyncio.wait does not cancel the run if the waiter is cancelled
+            await asyncio.wait({log.run})
+
+resume_hub = ResumeHub.from_env()
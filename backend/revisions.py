@@ -0,0 +1,122 @@
+import difflib
+import re
+
+# Incremental re-evaluation: diff a revised essay against the draft the current
+# scores belong to, and decide which rubric dimensions the edit could move.
+#
+#   - below `threshold` (fraction of the previous draft's words touched) every
+#     previous score is reused
+#   - vocabulary is re-scored when words were replaced or added
+#   - depth is re-scored when material was added or removed
+#   - clarity is re-scored when paragraphs were added or removed, or the edit is
+#     large (twice the threshold)
+# If an edit passes the threshold but matches none of these rules, everything is re-scored.
+
+TOKEN = re.compile(r"\w+|[^\w\s]")
+DIMENSIONS = {"eval_clarity": "clarity", "eval_depth": "depth", "eval_vocab": "vocab"}
+
+def paragraphs(text: str):
+    return [p for p in re.split(r"\n\s*\n", text or "") if p.strip()]
+
+class RevisionDiff:
+    """Word-level edit summary between two drafts."""
+
+    def __init__(self, previous: str, current: str):
+        before = TOKEN.findall(previous or "")
+        after = TOKEN.findall(current or "")
+        self.words = max(1, len(before))
+        self.inserted = self.deleted = self.replaced = 0
+        matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == "insert":
+                self.inserted += j2 - j1
+            elif op == "delete":
+                self.deleted += i2 - i1
+            elif op == "replace":
+                common = min(i2 - i1, j2 - j1)
+                self.replaced += common
+                self.inserted += (j2 - j1) - common
+                self.deleted += (i2 - i1) - common
+        self.structure_changed = len(paragraphs(previous)) != len(paragraphs(current))
+
+    def fraction(self, *counts) -> float:
+        return sum(counts) / self.words
+
+    @property
+    def changed(self) -> float:
+        return self.fraction(self.inserted, self.deleted, self.replaced)
+
+    def dimensions(self, threshold: float):
+        """Rubric dimensions this edit could plausibly change."""
+        if self.changed < threshold:
+            return set()
+        dims = set()
+        if self.fraction(self.replaced, self.inserted) >= threshold:
+            dims.add("vocab")
+        if self.fraction(self.inserted, self.deleted) >= threshold:
+            dims.add("depth")
+        if self.structure_changed or self.changed >= 2 * threshold:
+            dims.add("clarity")
+        return dims or set(DIMENSIONS.values())
+
+class RevisionPlanner:
+    """Routes collect_essay to the evaluators a revision needs (all of them when disabled)."""
+
+    def __init__(self, evaluators, enabled: bool, threshold: float):
+        self.evaluators = list(evaluators)
+        self.enabled = enabled
+        self.threshold = threshold
+
+    def dimensions(self, state):
+        previous = state.get("scored_essay")
+        if not self.enabled or not previous:
+            return set(DIMENSIONS.values())
+        dims = RevisionDiff(previous, state.get("essay_content", "")).dimensions(self.threshold)
+        # A dimension skipped by speculative early fail has no score to reuse
+        return dims | {d for d in DIMENSIONS.values() if state.get(f"{d}_score", 0) is None}
+
+    def rerun(self, state):
+        dims = self.dimensions(state)
+        # A fused evaluator scores every dimension, so it runs if any of them changed
+        return [e for e in self.evaluators if (DIMENSIONS[e] in dims if e in DIMENSIONS else dims)]
+
+    def route(self, state):
+        return self.rerun(state) or ["aggregate_score"]
+
+    def bookkeeping(self, state):
+        """State written by aggregate_score: the scored draft, revision count and reused dimensions."""
+        rescored = set()
+        for evaluator in self.rerun(state):
+            rescored |= {DIMENSIONS[evaluator]} if evaluator in DIMENSIONS else set(DIMENSIONS.values())
+        reused = sorted(set(DIMENSIONS.values()) - rescored)
+        previous = state.get("scored_essay")
+        return {
+            # Reused scores still belong to the older draft, so later edits are diffed
+            # against it and small changes cannot accumulate unnoticed
+            "scored_essay": previous if reused and previous else state.get("essay_content", ""),
+            "revision_count": state.get("revision_count", 0) + (1 if previous else 0),
+            "reused_scores": reused,
+        }
+
+# --- Revision deltas for checkpoint storage (see checkpointer.py) ---
+
+# Whitespace stays attached to the preceding word, so joining the pieces restores the text exactly
+PIECE = re.compile(r"\S+\s*|\s+")
+
+def text_delta(base: str, text: str) -> list:
+    """Edit script turning base into text: [start, end] copies base[start:end], a string is inserted."""
+    before, after = PIECE.findall(base), PIECE.findall(text)
+    offsets = [0]
+    for piece in before:
+        offsets.append(offsets[-1] + len(piece))
+    delta = []
+    matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            delta.append([offsets[i1], offsets[i2]])
+        elif j2 > j1:
+            delta.append("".join(after[j1:j2]))
+    return delta
+
+def apply_delta(base: str, delta: list) -> str:
+    return "".join(base[op[0]:op[1]] if isinstance(op, list) else op for op in delta)
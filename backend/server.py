@@ -2,15 +2,33 @@ import sys
 import os
 import json
 import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-# Add parent directory to sys.path to allow importing main.py
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Allow importing the backend modules when started from the repository root
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from main import app as essay_app
+# The same compiled graph factory as main.py (graph.get_graph_app), not the root main.py CLI
+import graph
+from graph import topic_pool
+from streaming import stream_graph, thread_snapshot
+from ws_protocol import send_frame
+from ws_sessions import Session, SessionMux
+from admission import NEW_SESSION, RESUBMISSION, Busy, admission, client_key
+from eval_cache import evaluation_cache
+from metrics import REGISTRY, track_stream, watch_service
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start filling the topic pool so generate_topic does not wait on Gemini
+    topic_pool.start()
+    graph.get_graph_app()
+    yield
+    await topic_pool.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,82 +38,124 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+watch_service(topic_pool, evaluation_cache)
+
+@app.get("/topic-pool")
+async def topic_pool_stats():
+    return topic_pool.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+async def run_action(session: Session, message: dict, client=None):
+    """Runs one generate_topic / submit_essay action of a session, queueing its frames."""
+    try:
+        await admitted_action(session, message, client)
+    except Busy as busy:
+        # Refused by admission control (admission.py); the client retries after the hint
+        session.send(busy.frame())
+
+async def admitted_action(session: Session, message: dict, client):
+    essay_app = graph.get_graph_app()
+    config = session.config
+    action = message.get("action")
+    stream_tokens = message.get("stream_tokens", False)
+
+    if action == "generate_topic":
+        print("Generating topic...")
+        # Run the graph until the first interruption (collect_essay)
+        async with admission.admitted(client, NEW_SESSION):
+            await session.stream(stream_graph(essay_app, {}, config, stream_tokens=stream_tokens))
+
+        # Get current state to send the topic
+        current_state = await essay_app.aget_state(config)
+        topic = current_state.values.get("topic")
+        session.send({
+            "type": "topic_generated",
+            "topic": topic
+        })
+
+    elif action == "submit_essay":
+        essay_text = message.get("essay")
+        print(f"Received essay: {essay_text[:50]}...")
+
+        # One run per thread across workers (a resumed thread may still be running elsewhere)
+        from checkpointer import RunLease
+        lease = RunLease(essay_app.checkpointer, session.thread_id)
+        if not await lease.acquire():
+            session.send({"type": "error", "message": "This essay is still being evaluated; resume its stream instead"})
+            return
+
+        # Update state with the user's essay. A cancelled run leaves the thread part-way
+        # through an evaluation; the new draft then restarts it from collect_essay.
+        try:
+            current_state = await essay_app.aget_state(config)
+            as_node = None if current_state.next in ((), ("collect_essay",)) else "collect_essay"
+            # Drafts that already got feedback are ahead of new sessions in the admission queue
+            priority = RESUBMISSION if current_state.values.get("feedback") else NEW_SESSION
+            async with admission.admitted(client, priority):
+                await essay_app.aupdate_state(config, {"essay_content": essay_text}, as_node=as_node)
+
+                # Resume execution
+                await session.stream(stream_graph(essay_app, None, config, stream_tokens=stream_tokens))
+        finally:
+            await lease.release()
+
+        # Check final state
+        final_state = await essay_app.aget_state(config)
+
+        if not final_state.next:
+            # Workflow finished (Conditional edge went to END)
+            session.send({
+                "type": "complete",
+                "score": final_state.values.get("total_score"),
+                "feedback": final_state.values.get("feedback", "No feedback")
+            })
+        else:
+            # Workflow paused again (Conditional edge went to generate_feedback -> collect_essay)
+            # The feedback should be in the state from the 'generate_feedback' node
+            feedback = final_state.values.get("feedback")
+            session.send({
+                "type": "feedback",
+                "feedback": feedback
+            })
+
+    else:
+        session.send({"type": "error", "message": f"Unknown action: {action!r}"})
+
+async def snapshot(thread_id: str):
+    return await thread_snapshot(graph.get_graph_app(), thread_id)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    # Unique thread_id for this connection could be generated or passed by client
-    # For simplicity, we use a single fixed session for now, or generate one 
-    import uuid
-    thread_id = str(uuid.uuid4())
-    config = {"configurable": {"thread_id": thread_id}}
-    
-    print(f"Client connected: {thread_id}")
+    print("Client connected")
+    # One graph thread per session id (see ws_sessions.py); plain JSON frames until the
+    # client negotiates another protocol with a "hello" action
+    client = client_key(websocket)
+    mux = SessionMux.from_env(websocket, lambda session, message: run_action(session, message, client), snapshot)
+    mux.start()
 
-    try:
-        while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            action = message.get("action")
-            
-            if action == "generate_topic":
-                print("Generating topic...")
-                # Run the graph until the first interruption (collect_essay)
-                async for event in essay_app.astream({}, config=config):
-                    for node, state_update in event.items():
-                        await websocket.send_json({
-                            "type": "update",
-                            "node": node,
-                            "state": state_update
-                        })
-                
-                # Get current state to send the topic
-                current_state = await essay_app.aget_state(config)
-                topic = current_state.values.get("topic")
-                await websocket.send_json({
-                    "type": "topic_generated",
-                    "topic": topic
-                })
-
-            elif action == "submit_essay":
-                essay_text = message.get("essay")
-                print(f"Received essay: {essay_text[:50]}...")
-                
-                # Update state with the user's essay
-                await essay_app.aupdate_state(config, {"essay_content": essay_text})
-                
-                # Resume execution
-                async for event in essay_app.astream(None, config=config):
-                    for node, state_update in event.items():
-                        await websocket.send_json({
-                            "type": "update",
-                            "node": node,
-                            "state": state_update
-                        })
-                
-                # Check final state
-                final_state = await essay_app.aget_state(config)
-                
-                if not final_state.next:
-                    # Workflow finished (Conditional edge went to END)
-                    await websocket.send_json({
-                        "type": "complete",
-                        "score": final_state.values.get("total_score"),
-                        "feedback": final_state.values.get("feedback", "No feedback")
-                    })
-                else:
-                    # Workflow paused again (Conditional edge went to generate_feedback -> collect_essay)
-                    # The feedback should be in the state from the 'generate_feedback' node
-                    feedback = final_state.values.get("feedback")
-                    await websocket.send_json({
-                        "type": "feedback",
-                        "feedback": feedback
-                    })
-
-    except WebSocketDisconnect:
-        print(f"Client disconnected: {thread_id}")
-    except Exception as e:
-        print(f"Error: {e}")
+    with track_stream("websocket"):
         try:
-            await websocket.send_json({"type": "error", "message": str(e)})
-        except:
-            pass
+            while True:
+                data = await websocket.receive_text()
+                message = json.loads(data)
+
+                if message.get("action") == "hello":
+                    encoder = mux.negotiate(message)
+                    await send_frame(websocket, encoder, encoder.hello())
+                else:
+                    await mux.dispatch(message)
+
+        except WebSocketDisconnect:
+            print("Client disconnected")
+        except Exception as e:
+            print(f"Error: {e}")
+            try:
+                await mux.send_now({"type": "error", "message": str(e)})
+            except:
+                pass
+        finally:
+            await mux.stop()
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+# Single-flight: while a call for a key is running, later callers with the same key
+# wait for its result instead of starting their own. Works across threads (sync
+# nodes run on executor threads) and event loops, so identical evaluations from
+# different sessions of one process share a single LLM call.
+
+class _LeaderCancelled(Exception):
+    """The call being waited on was cancelled; a waiter retries as the new leader."""
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        """Returns (future, is_leader)."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Runs fn() once per concurrent key. Returns (result, shared) -- shared is True for waiters."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = fn()
+                except Exception as error:
+                    self._finish(key, future, error=error)
+                    raise
+                except BaseException:
+                    self._finish(key, future, error=_LeaderCancelled())
+                    raise
+                self._finish(key, future, result)
+                return result, False
+            try:
+                return future.result(), True
+            except _LeaderCancelled:
+                continue
+
+    async def ado(self, key, coro_fn):
+        """Async counterpart of do(); coro_fn() returns the awaitable to run."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                try:
+                    result = await coro_fn()
+                except Exception as error:
+                    self._finish(key, future, error=error)
+                    raise
+                except BaseException:
+                    # Cancelled (e.g. the leader's client went away): waiters take over
+                    self._finish(key, future, error=_LeaderCancelled())
+                    raise
+                self._finish(key, future, result)
+                return result, False
+            try:
+                # shield: a cancelled waiter must not cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except _LeaderCancelled:
+                continue
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"in_flight": in_flight, "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from langgraph.config import get_config
+
+# Speculative scheduling of the fail path (async fan-out graphs only).
+#
+# "early_fail": once the scores that have arrived make the pass mark unreachable
+#   (known + MAX_SCORE * pending < PASS_MARK), the evaluators still running are
+#   cancelled and the graph moves straight on to aggregate_score -> generate_feedback.
+#   Cancelled dimensions are left unscored (None, counted as 0) and aggregate_score
+#   lists them in skipped_scores.
+# "eager": early_fail, plus generate_feedback starts while the last score is still
+#   pending, on a guess of it (the mean of the known scores) when the guess fails the
+#   essay, or as soon as failing is certain (the cancelled dimensions read "not scored",
+#   as without speculation). When the last score arrives and differs from the guess, the
+#   speculative call is restarted on the real scores; if the essay passes it is cancelled
+#   and thrown away. generate_feedback only uses it if it was built on the final scores.
+#
+# Scoreboards belong to one evaluation pass: they are keyed by thread, essay and the
+# superstep the evaluators ran in, so a pass that was cancelled or failed part-way
+# leaves nothing behind that a later submission of the same draft could pick up.
+
+MAX_SCORE = 5
+PASS_MARK = 10
+MODES = ("off", "early_fail", "eager")
+
+class Scoreboard:
+    """Scores of one evaluation run as they arrive."""
+
+    def __init__(self, dimensions):
+        self.dimensions = list(dimensions)
+        self.scores = {}
+        self.fail_certain = asyncio.Event()
+        self.feedback = None
+        # Scores the speculative feedback was built on
+        self.feedback_scores = None
+
+    @property
+    def pending(self):
+        return [d for d in self.dimensions if d not in self.scores]
+
+    def post(self, dimension: str, score):
+        self.scores[dimension] = score or 0
+        if sum(self.scores.values()) + MAX_SCORE * len(self.pending) < PASS_MARK:
+            self.fail_certain.set()
+
+class Speculator:
+    def __init__(self, mode: str, dimensions, max_runs: int = 1024):
+        if mode not in MODES:
+            raise ValueError(f"Unknown SPECULATION mode: {mode!r} (expected one of {MODES})")
+        self.mode = mode
+        self.dimensions = list(dimensions)
+        self.max_runs = max_runs
+        self._boards = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _key(self, state, steps_after: int = 0):
+        """Board key of the pass whose evaluators ran `steps_after` supersteps before the calling node."""
+        config = get_config()
+        thread_id = config.get("configurable", {}).get("thread_id", "")
+        step = config.get("metadata", {}).get("langgraph_step", 0) - steps_after
+        essay = hashlib.sha256((state.get("essay_content") or "").encode()).hexdigest()
+        return thread_id, essay, step
+
+    def board(self, state) -> Scoreboard:
+        key = self._key(state)
+        board = self._boards.get(key)
+        if board is None:
+            board = self._boards[key] = Scoreboard(self.dimensions)
+            while len(self._boards) > self.max_runs:
+                _, dropped = self._boards.popitem(last=False)
+                if dropped.feedback is not None:
+                    dropped.feedback.cancel()
+        return board
+
+    def evaluator(self, dimension: str, fn, feedback_fn):
+        """Wraps an async evaluator node so it gives up once failing is certain."""
+        async def node(state):
+            board = self.board(state)
+            if not board.fail_certain.is_set():
+                task = asyncio.ensure_future(fn(state))
+                stop = asyncio.ensure_future(board.fail_certain.wait())
+                await asyncio.wait({task, stop}, return_when=asyncio.FIRST_COMPLETED)
+                stop.cancel()
+                if task.done():
+                    result = task.result()
+                    board.post(dimension, result.get(f"{dimension}_score"))
+                    self._maybe_start_feedback(board, state, feedback_fn)
+                    return result
+                task.cancel()
+            print(f"Node: {dimension} skipped, the essay cannot pass")
+            return {f"{dimension}_score": None}
+        return node
+
+    def _maybe_start_feedback(self, board: Scoreboard, state, feedback_fn):
+        if self.mode != "eager":
+            return
+        scores = dict(board.scores)
+        if board.pending and not board.fail_certain.is_set():
+            if len(board.pending) > 1 or not scores:
+                return
+            # One score pending: guess it, so the feedback call overlaps the last evaluator
+            scores[board.pending[0]] = round(sum(scores.values()) / len(scores))
+        if sum(scores.values()) >= PASS_MARK:
+            # The essay (probably) passes: no feedback, and a call built on a guess is dropped
+            if board.feedback is not None:
+                board.feedback.cancel()
+                board.feedback = None
+            return
+        expected = self._feedback_scores({f"{d}_score": scores.get(d) for d in self.dimensions},
+                                         sum(scores.values()))
+        if board.feedback is not None:
+            if board.feedback_scores == expected:
+                return
+            # The guess was wrong: rebuild on the real scores
+            board.feedback.cancel()
+        board.feedback_scores = expected
+        board.feedback = asyncio.ensure_future(feedback_fn({**state, **expected}))
+
+    def _feedback_scores(self, scores, total):
+        """The scores generate_feedback is prompted with; an unscored dimension reads "not scored"."""
+        shown = {}
+        for d in self.dimensions:
+            score = scores.get(f"{d}_score", 0)
+            shown[f"{d}_score"] = "not scored" if score is None else score
+        return {**shown, "total_score": total}
+
+    def aggregate(self, fn, passed):
+        """Wraps aggregate_score: reports skipped dimensions, and a passing essay
+        discards any speculative feedback."""
+        async def node(state):
+            skipped = [d for d in self.dimensions if f"{d}_score" in state and state[f"{d}_score"] is None]
+            result = {**fn(state), "skipped_scores": skipped}
+            if passed({**state, **result}):
+                board = self._boards.pop(self._key(state, 1), None)
+                if board is not None and board.feedback is not None:
+                    board.feedback.cancel()
+            return result
+        return node
+
+    def feedback(self, fn):
+        """Wraps generate_feedback: reuses the speculative call when it was built on the final scores."""
+        async def node(state):
+            scores = self._feedback_scores(state, state.get("total_score"))
+            board = self._boards.pop(self._key(state, 2), None)
+            if board is not None and board.feedback is not None:
+                if board.feedback_scores == scores:
+                    print("Node: Using speculative feedback")
+                    return await board.feedback
+                board.feedback.cancel()
+            return await fn({**state, **scores})
+        return node
@@ -0,0 +1,53 @@
+# State kept for the graph's own use; never sent to clients
+INTERNAL_KEYS = ("scored_essay",)
+# Not repeated in a resumed stream's state snapshot: the client wrote the essay itself
+SNAPSHOT_OMITTED = ("essay_content", "cache_hits")
+
+def client_view(data):
+    """Node update without internal keys (the scored draft would echo the whole essay)."""
+    if isinstance(data, dict) and any(key in data for key in INTERNAL_KEYS):
+        return {key: value for key, value in data.items() if key not in INTERNAL_KEYS}
+    return data
+
+def chunk_text(content):
+    """Text of a streamed message chunk (Gemini may send a list of content parts)."""
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if isinstance(part, dict) and part.get("type", "text") == "text":
+            parts.append(part.get("text", ""))
+        elif isinstance(part, str):
+            parts.append(part)
+    return "".join(parts)
+
+async def stream_graph(graph_app, graph_input, config, stream_tokens: bool = False):
+    """
+    Runs the graph and yields transport-neutral events:
+        {"type": "update", "node": ..., "data": ...}   after each node finishes
+        {"type": "token", "node": ..., "content": ...} for each LLM token (stream_tokens only)
+    Used by both the NDJSON endpoint (backend/main.py) and the WebSocket (backend/server.py).
+    """
+    if not stream_tokens:
+        async for event in graph_app.astream(graph_input, config=config):
+            for node, data in event.items():
+                yield {"type": "update", "node": node, "data": client_view(data)}
+        return
+
+    async for mode, payload in graph_app.astream(graph_input, config=config, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            chunk, metadata = payload
+            text = chunk_text(chunk.content)
+            if text:
+                yield {"type": "token", "node": metadata.get("langgraph_node"), "content": text}
+        else:
+            for node, data in payload.items():
+                yield {"type": "update", "node": node, "data": client_view(data)}
+
+async def thread_snapshot(graph_app, thread_id: str):
+    """A thread's current state and next nodes, sent when a resumed stream cannot be replayed (None if unknown)."""
+    state = await graph_app.aget_state({"configurable": {"thread_id": thread_id}})
+    if not state.values:
+        return None
+    values = {key: value for key, value in client_view(state.values).items() if key not in SNAPSHOT_OMITTED}
+    return {"state": values, "next": list(state.next)}
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+class TopicPool:
+    """
+    Keeps a buffer of pre-generated essay topics so generate_topic can return instantly.
+
+    fetch is a coroutine function returning one fresh topic. The pool refills in the
+    background (on the loop passed to start()) whenever its depth drops below low_water,
+    and drops topics it has already handed out or buffered recently. A refill round in
+    which every fetch fails ends the refill and starts a cooldown (retry_base seconds,
+    doubling per consecutive failed refill up to retry_max) during which no refill is
+    scheduled, so an unreachable or rate-limited LLM is not called on every take().
+    take() is thread-safe, so the sync graph nodes can use it from executor threads.
+    """
+
+    def __init__(self, fetch, size: int = 8, low_water: int = 3, history: int = 256,
+                 retry_base: float = 5.0, retry_max: float = 300.0):
+        self.fetch = fetch
+        self.size = size
+        self.low_water = low_water
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._failures = 0
+        self._retry_at = 0.0
+        self._topics = deque()
+        self._seen = deque(maxlen=history)
+        self._seen_keys = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._refill_task = None
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.fetch_errors = 0
+        self.refills = 0
+        self._fetch_latencies = deque(maxlen=100)
+
+    @classmethod
+    def from_env(cls, fetch):
+        return cls(
+            fetch,
+            size=int(os.getenv("TOPIC_POOL_SIZE", 8)),
+            low_water=int(os.getenv("TOPIC_POOL_LOW_WATER", 3)),
+        )
+
+    def start(self):
+        """Binds the pool to the running event loop and fills it. Call from an app lifespan."""
+        self._loop = asyncio.get_running_loop()
+        self._schedule_refill()
+
+    async def stop(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+        self._loop = None
+
+    def take(self):
+        """Returns a pooled topic, or None if the pool is empty (caller falls back to a live call)."""
+        with self._lock:
+            topic = self._topics.popleft() if self._topics else None
+            if topic is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            depth = len(self._topics)
+        if depth < self.low_water:
+            self._schedule_refill()
+        return topic
+
+    def _schedule_refill(self):
+        if self._loop is None or self.size <= 0 or self._loop.is_closed():
+            return
+        if time.monotonic() < self._retry_at:
+            return
+        self._loop.call_soon_threadsafe(self._ensure_refill)
+
+    def _ensure_refill(self):
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = self._loop.create_task(self._refill())
+
+    async def _timed_fetch(self):
+        t0 = time.perf_counter()
+        topic = await self.fetch()
+        self._fetch_latencies.append(time.perf_counter() - t0)
+        return topic
+
+    async def _refill(self):
+        self.refills += 1
+        # Bound the attempts so an unreachable LLM or a run of duplicates cannot spin forever
+        budget = 3 * self.size
+        while budget > 0:
+            deficit = self.size - len(self._topics)
+            if deficit <= 0:
+                break
+            budget -= deficit
+            results = await asyncio.gather(*(self._timed_fetch() for _ in range(deficit)), return_exceptions=True)
+            errors = [result for result in results if isinstance(result, Exception)]
+            self.fetch_errors += len(errors)
+            for result in results:
+                if not isinstance(result, Exception):
+                    self._add(result)
+            if len(errors) == len(results):
+                # Nothing got through: the LLM is down or rate limiting, back off before the next refill
+                self._failures += 1
+                cooldown = min(self.retry_max, self.retry_base * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + cooldown
+                print(f"Topic pool: refill failed ({len(errors)} errors, last: {errors[-1]}); "
+                      f"next refill in {cooldown:.1f}s")
+                return
+            self._failures = 0
+            if errors:
+                print(f"Topic pool: {len(errors)} of {len(results)} fetches failed, last: {errors[-1]}")
+
+    def _add(self, topic: str):
+        key = " ".join(topic.lower().split())
+        if not key:
+            return
+        with self._lock:
+            if key in self._seen_keys:
+                self.duplicates += 1
+                return
+            if len(self._topics) >= self.size:
+                return
+            if len(self._seen) == self._seen.maxlen:
+                self._seen_keys.discard(self._seen[0])
+            self._seen.append(key)
+            self._seen_keys.add(key)
+            self._topics.append(topic)
+
+    def stats(self):
+        served = self.hits + self.misses
+        latencies = list(self._fetch_latencies)
+        return {
+            "depth": len(self._topics),
+            "size": self.size,
+            "low_water": self.low_water,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / served if served else None,
+            "refills": self.refills,
+            "duplicates_dropped": self.duplicates,
+            "fetch_errors": self.fetch_errors,
+            "retry_in": max(0.0, self._retry_at - time.monotonic()),
+            "refill_latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "refill_latency_last": latencies[-1] if latencies else None,
+        }
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import time
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for the binary encoding
+    msgpack = None
+
+# WebSocket frame protocols for backend/server.py.
+#
+# "json" (default): one {"type": "update", "node", "state", "cached"} text frame per
+#   node update and one {"type": "token", ...} frame per LLM token, as before.
+#
+# "compact" (negotiated with {"action": "hello", "protocol": "compact", ...}):
+#   - updates that arrive within coalesce_ms of each other go out as one frame:
+#       {"type": "batch", "updates": [{"node": "eval_clarity", "delta": {"clarity_score": 3}}, ...],
+#        "tokens": [["generate_feedback", "text streamed since the last frame"]]}
+#   - a delta only carries keys whose value changed since the last frame sent on the
+#     connection; the essay and the internal cache_hits channel are never sent back
+#   - "cached": true is only present when set; __interrupt__ updates are dropped
+#   - feedback / complete frames leave out text the client already received
+#   - encoding "msgpack" sends every frame as a binary MessagePack message
+
+PROTOCOLS = ("json", "compact")
+ENCODINGS = ("json", "msgpack")
+NEVER_SENT = ("essay_content", "cache_hits")
+DEFAULT_COALESCE_MS = 10
+
+class FrameEncoder:
+    """Per-connection frame state: negotiated protocol, encoding and the values the client already has."""
+
+    def __init__(self, protocol: str = "json", encoding: str = "json", coalesce_ms: float = DEFAULT_COALESCE_MS):
+        self.protocol = protocol
+        self.encoding = encoding
+        self.coalesce = max(0.0, coalesce_ms) / 1000
+        self.sent = {}
+
+    @classmethod
+    def negotiate(cls, message: dict):
+        """Builds an encoder from a hello message, falling back to what the server supports."""
+        protocol = message.get("protocol", "json")
+        encoding = message.get("encoding", "json")
+        if protocol not in PROTOCOLS:
+            protocol = "json"
+        if encoding not in ENCODINGS or (encoding == "msgpack" and msgpack is None):
+            encoding = "json"
+        return cls(protocol, encoding, float(message.get("coalesce_ms", DEFAULT_COALESCE_MS)))
+
+    @property
+    def compact(self) -> bool:
+        return self.protocol == "compact"
+
+    def hello(self) -> dict:
+        return {"type": "hello", "protocol": self.protocol, "encoding": self.encoding,
+                "coalesce_ms": self.coalesce * 1000}
+
+    def encode(self, frame: dict):
+        """Returns str (text frame) or bytes (binary frame)."""
+        if self.encoding == "msgpack":
+            return msgpack.packb(frame, use_bin_type=True)
+        # Same text encoding as Starlette's send_json
+        return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+    def delta(self, data) -> dict:
+        """Keys of a node update that the client does not already have."""
+        if not isinstance(data, dict):
+            return {}
+        changed = {}
+        for key, value in data.items():
+            if key in NEVER_SENT or self.sent.get(key, object()) == value:
+                continue
+            changed[key] = value
+            self.sent[key] = value
+        return changed
+
+    def batch(self, events) -> dict:
+        """Folds stream_graph events into one compact frame (None if nothing is left to send)."""
+        updates, tokens = [], []
+        for event in events:
+            if event["type"] == "token":
+                if tokens and tokens[-1][0] == event["node"]:
+                    tokens[-1][1] += event["content"]
+                else:
+                    tokens.append([event["node"], event["content"]])
+                continue
+            node, data = event["node"], event["data"]
+            if node == "__interrupt__":
+                continue
+            update = {"node": node}
+            delta = self.delta(data)
+            if delta:
+                update["delta"] = delta
+            if isinstance(data, dict) and node in data.get("cache_hits", []):
+                update["cached"] = True
+            updates.append(update)
+        if not updates and not tokens:
+            return None
+        frame = {"type": "batch"}
+        if updates:
+            frame["updates"] = updates
+        if tokens:
+            frame["tokens"] = tokens
+        return frame
+
+    def result(self, frame: dict) -> dict:
+        """Drops fields of a topic_generated / feedback / complete frame the client already received."""
+        if not self.compact:
+            return frame
+        kept = {"type": frame["type"]}
+        for key, value in frame.items():
+            if key != "type" and self.sent.get(key, object()) != value:
+                kept[key] = value
+        return kept
+
+    def legacy(self, event) -> dict:
+        if event["type"] == "token":
+            return event
+        node, data = event["node"], event["data"]
+        return {
+            "type": "update",
+            "node": node,
+            "state": data,
+            "cached": isinstance(data, dict) and node in data.get("cache_hits", []),
+        }
+
+async def send_frame(websocket, encoder: FrameEncoder, frame: dict):
+    payload = encoder.encode(frame)
+    if isinstance(payload, bytes):
+        await websocket.send_bytes(payload)
+    else:
+        await websocket.send_text(payload)
+
+async def coalesced(events, window: float):
+    """Groups an async event stream: each group holds the events that arrived within `window` of its first."""
+    queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        finally:
+            await queue.put(done)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            first = await queue.get()
+            if first is done:
+                break
+            group = [first]
+            deadline = time.monotonic() + window
+            finished = False
+            while True:
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(queue.get(), remaining)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is done:
+                    finished = True
+                    break
+                group.append(item)
+            yield group
+            if finished:
+                break
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
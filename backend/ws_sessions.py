@@ -0,0 +1,370 @@
+import asyncio
+import os
+import uuid
+from collections import deque
+from metrics import RESUMES, WS_BACKPRESSURE, WS_CANCELLED
+from replay import resume_hub
+from ws_protocol import FrameEncoder, send_frame
+
+# Multiplexed sessions over one /ws connection (see backend/server.py).
+#
+# Every client message may carry a "session" id. Each session is its own graph thread:
+# its actions run one at a time, in order, while different sessions run concurrently on
+# the same socket, and every frame for a session carries its id. Messages without an id
+# share a default session whose frames carry none, i.e. the original protocol.
+#
+# Graph runs never write to the socket themselves: they write to their thread's event
+# buffer (see replay.py), which each attached session copies into a bounded outbox,
+# drained by one writer task per connection, round robin across sessions, so a slow
+# client cannot stall a run. When an outbox is full, LLM tokens are
+#   "coalesce" (default)  folded into the queued text of the same node
+#   "drop"                dropped (the node's final update still carries the full text)
+# Node updates and result frames are never dropped: when the outbox is full they join its
+# last queued item (sent as one burst), so the outbox never holds more than its limit.
+#
+#   {"action": "cancel", "session": id}  cancels the running and queued actions; the run's
+#                                        task is cancelled, which aborts its async LLM calls
+#   {"action": "close", "session": id}   cancels and forgets the session
+#   {"action": "resume", "session": id, "token": ..., "after": seq}
+#                                        reattaches a thread after a reconnect (see replay.py)
+#
+# A new session first gets {"type": "session", "resume_token": ...}. Frames produced by runs
+# carry "seq": every event of the thread up to it has been delivered. When the connection
+# drops, the session's running action carries on and its queued actions are dropped.
+
+POLICIES = ("coalesce", "drop")
+
+def fold_tokens(events):
+    """Merges each node's token events into one, keeping node updates (and token order per node) in place."""
+    folded, open_tokens = [], {}
+    for event in events:
+        node = event.get("node")
+        if event["type"] == "token":
+            index = open_tokens.get(node)
+            if index is not None:
+                folded[index] = {**folded[index], "content": folded[index]["content"] + event["content"]}
+                continue
+            open_tokens[node] = len(folded)
+        else:
+            open_tokens.pop(node, None)
+        folded.append(event)
+    return folded
+
+class Outbox:
+    """
+    Bounded queue of one session's outgoing items. An item is a list of parts sent together:
+    ("events", [stream events], first, last) and ("frame", dict, seq, seq), where first..last
+    are the thread seqs the part covers (None for frames that are not part of the thread's
+    stream). Once `limit` items are queued, a new part joins the last item instead of
+    queueing behind it, so the queue never holds more than `limit` items.
+    """
+
+    def __init__(self, limit: int = 64, policy: str = "coalesce"):
+        self.limit = limit
+        self.policy = policy
+        self.items = deque()
+
+    def __len__(self):
+        return len(self.items)
+
+    def put_events(self, events, first: int, last: int):
+        events = list(events)
+        if len(self.items) >= self.limit:
+            tokens = sum(1 for e in events if e["type"] == "token")
+            if self.policy == "drop":
+                events = [e for e in events if e["type"] != "token"]
+                if tokens:
+                    WS_BACKPRESSURE.inc(tokens, outcome="dropped")
+            elif tokens:
+                WS_BACKPRESSURE.inc(tokens, outcome="coalesced")
+        if events:
+            self._put(("events", events, first, last))
+
+    def put_frame(self, frame: dict, seq: int = None):
+        self._put(("frame", frame, seq, seq))
+
+    def _put(self, part):
+        if len(self.items) < self.limit:
+            self.items.append([part])
+            return
+        # Full: join the last queued item. Consecutive events fold their tokens per node, so
+        # the item only grows by node updates and result frames, a few per run.
+        item = self.items[-1]
+        if part[0] == "events" and item[-1][0] == "events":
+            _, queued, first, _ = item.pop()
+            part = ("events", fold_tokens(queued + part[1]), first, part[3])
+        elif part[0] == "events":
+            part = ("events", fold_tokens(part[1]), part[2], part[3])
+        item.append(part)
+
+    def pop(self):
+        return self.items.popleft()
+
+class Session:
+    """One multiplexed session: a graph thread, its frame encoder, outbox and pending actions."""
+
+    def __init__(self, session_id, thread_id: str, encoder: FrameEncoder, outbox: Outbox, wake):
+        self.id = session_id
+        self.thread_id = thread_id
+        self.config = {"configurable": {"thread_id": thread_id}}
+        self.log = resume_hub.log(thread_id)
+        self.encoder = encoder
+        self.outbox = outbox
+        self.pending = deque()
+        # Worker draining `pending`, and the task copying the thread's events into the outbox
+        self.task = None
+        self.follower = None
+        self._wake = wake
+
+    def send(self, frame: dict):
+        """Records a result frame in the thread's stream."""
+        self.log.append("frame", frame)
+
+    async def stream(self, events):
+        """Records a stream_graph run in the thread's stream."""
+        async for event in events:
+            self.log.append("event", event)
+
+    def attach(self, after: int):
+        self.log.followers += 1
+        self.follower = asyncio.create_task(self._follow(after))
+
+    def detach(self):
+        if self.follower is not None:
+            self.follower.cancel()
+            self.follower = None
+            self.log.followers -= 1
+
+    async def _follow(self, after: int):
+        """Copies the thread's events after `after` into the outbox: one group per event,
+        or per coalesce window in compact mode."""
+        while True:
+            changed = self.log.changed
+            entries, _ = self.log.since(after)
+            if not entries:
+                await changed.wait()
+                continue
+            if self.encoder.compact and self.encoder.coalesce:
+                await asyncio.sleep(self.encoder.coalesce)
+                entries, _ = self.log.since(after)
+            after = entries[-1][0]
+            group = []
+            for seq, kind, payload in entries + [(None, "end", None)]:
+                if group and (kind != "event" or not self.encoder.compact):
+                    self.outbox.put_events([e for _, e in group], group[0][0], group[-1][0])
+                    group = []
+                if kind == "event":
+                    group.append((seq, payload))
+                elif kind == "frame":
+                    self.outbox.put_frame(payload, seq)
+            self._wake()
+
+    def next_frames(self):
+        """Frames for the next queued item, stamped with the session id and seq ([] if nothing is left to send)."""
+        frames = []
+        for kind, payload, first, last in self.outbox.pop():
+            if kind == "frame":
+                part = [self.encoder.result(payload)]
+            elif self.encoder.compact:
+                part = [f for f in [self.encoder.batch(payload)] if f is not None]
+            else:
+                part = [self.encoder.legacy(event) for event in payload]
+            if last is not None:
+                # Only the part's last frame completes it; resuming from an earlier one repeats the part
+                part = [{**frame, "seq": last if i == len(part) - 1 else first - 1} for i, frame in enumerate(part)]
+            frames.extend(part)
+        if self.id is not None:
+            frames = [{**frame, "session": self.id} for frame in frames]
+        return frames
+
+class SessionMux:
+    """
+    The sessions of one WebSocket connection. handler(session, message) runs an action;
+    snapshot(thread_id) returns the thread's current state for a resume (None if unknown);
+    dispatch() routes each client message to its session.
+    """
+
+    def __init__(self, websocket, handler, snapshot, max_sessions: int = 8, queue_limit: int = 64,
+                 policy: str = "coalesce"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown WS_SLOW_CONSUMER policy: {policy!r} (expected one of {POLICIES})")
+        self.websocket = websocket
+        self.handler = handler
+        self.snapshot = snapshot
+        self.max_sessions = max_sessions
+        self.queue_limit = queue_limit
+        self.policy = policy
+        self.encoder_settings = {}
+        self.sessions = {}
+        self._ready = asyncio.Event()
+        self._writer = None
+
+    @classmethod
+    def from_env(cls, websocket, handler, snapshot):
+        return cls(
+            websocket,
+            handler,
+            snapshot,
+            max_sessions=int(os.getenv("WS_MAX_SESSIONS", "8")),
+            queue_limit=int(os.getenv("WS_SESSION_QUEUE", "64")),
+            policy=os.getenv("WS_SLOW_CONSUMER", "coalesce"),
+        )
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write())
+
+    async def stop(self):
+        """Detaches the connection's sessions. Running actions carry on; queued ones are dropped."""
+        tasks = []
+        for session in self.sessions.values():
+            session.pending.clear()
+            if session.task is not None and not session.task.done():
+                tasks.append(session.task)
+            if session.follower is not None:
+                tasks.append(session.follower)
+                session.detach()
+        if self._writer is not None:
+            tasks.append(self._writer)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def wake(self):
+        self._ready.set()
+
+    def negotiate(self, message: dict) -> FrameEncoder:
+        """Applies a hello message to the connection's sessions; returns the accepted encoder."""
+        encoder = FrameEncoder.negotiate(message)
+        self.encoder_settings = {"protocol": encoder.protocol, "encoding": encoder.encoding,
+                                 "coalesce_ms": encoder.coalesce * 1000}
+        for session in self.sessions.values():
+            session.encoder = FrameEncoder(**self.encoder_settings)
+        return encoder
+
+    def open(self, session_id, thread_id: str, after: int = 0):
+        """Opens a session on a thread (a new one unless resuming), or None when the connection is full."""
+        if len(self.sessions) >= self.max_sessions:
+            return None
+        session = Session(session_id, thread_id, FrameEncoder(**self.encoder_settings),
+                          Outbox(self.queue_limit, self.policy), self.wake)
+        self.sessions[session_id] = session
+        print(f"Session opened: {session_id} (thread {thread_id})")
+        return session
+
+    def cancel(self, session: Session) -> bool:
+        """Cancels the session's running and queued actions; False if it was idle."""
+        session.pending.clear()
+        run = session.log.run
+        if run is None or run.done():
+            return False
+        run.cancel()
+        WS_CANCELLED.inc()
+        return True
+
+    async def dispatch(self, message: dict):
+        session_id = message.get("session")
+        action = message.get("action")
+        if action == "resume":
+            await self.resume(message)
+            return
+        if action in ("cancel", "close"):
+            session = self.sessions.get(session_id)
+            active = session is not None and self.cancel(session)
+            if action == "close" and session is not None:
+                # The thread is abandoned; frames still queued for it are discarded
+                self.sessions.pop(session_id)
+                session.detach()
+                if session.task is not None:
+                    session.task.cancel()
+                await self.send_now({"type": "closed", "active": active}, session_id)
+            elif not active:
+                await self.send_now({"type": "cancelled", "active": False}, session_id)
+            # else: the run records "cancelled" in the thread's stream once it has stopped
+            return
+        session = self.sessions.get(session_id)
+        if session is None:
+            thread_id = str(uuid.uuid4())
+            session = self.open(session_id, thread_id)
+            if session is None:
+                await self.send_now({"type": "error", "message": f"Too many sessions (max {self.max_sessions})"},
+                                    session_id)
+                return
+            session.outbox.put_frame({"type": "session", "resume_token": resume_hub.token(thread_id)})
+            session.attach(session.log.seq)
+            self.wake()
+        session.pending.append(message)
+        if session.task is None or session.task.done():
+            session.task = asyncio.create_task(self._work(session))
+
+    async def resume(self, message: dict):
+        """Reattaches a thread: a "resumed" frame, then the buffered events after `after`, then live ones."""
+        session_id = message.get("session")
+        thread_id = resume_hub.thread_of(message.get("token"))
+        buffered = thread_id is not None and resume_hub.log(thread_id, create=False) is not None
+        snapshot = await self.snapshot(thread_id) if thread_id else None
+        if snapshot is None and not buffered:
+            RESUMES.inc(transport="websocket", outcome="unknown")
+            await self.send_now({"type": "error", "message": "Unknown or expired resume token"}, session_id)
+            return
+        if session_id in self.sessions:
+            await self.send_now({"type": "error", "message": f"Session {session_id!r} is already open"}, session_id)
+            return
+        session = self.open(session_id, thread_id)
+        if session is None:
+            await self.send_now({"type": "error", "message": f"Too many sessions (max {self.max_sessions})"},
+                                session_id)
+            return
+        after = int(message.get("after", 0))
+        entries, gap = session.log.since(after)
+        frame = {"type": "resumed", "running": session.log.running, "gap": gap,
+                 "replayed": 0 if gap else len(entries)}
+        if gap:
+            # Part of what the client missed is no longer buffered: send the current state instead
+            frame.update(snapshot or {})
+            after = session.log.seq
+        RESUMES.inc(transport="websocket", outcome="gap" if gap else "replayed")
+        session.outbox.put_frame(frame)
+        session.attach(after)
+        self.wake()
+
+    async def send_now(self, frame: dict, session_id=None):
+        """Sends a connection-level frame directly (not through a session outbox)."""
+        if session_id is not None:
+            frame = {**frame, "session": session_id}
+        await send_frame(self.websocket, FrameEncoder(**self.encoder_settings), frame)
+
+    async def _run(self, session: Session, message: dict):
+        try:
+            await self.handler(session, message)
+        except asyncio.CancelledError:
+            session.send({"type": "cancelled", "active": True})
+            raise
+        except Exception as e:
+            print(f"Error in session {session.id}: {e}")
+            session.send({"type": "error", "message": str(e)})
+
+    async def _work(self, session: Session):
+        # Each action is its thread's current run (replay.py), detached from this worker: a
+        # cancel stops the run, not the worker, and a closed connection stops the worker,
+        # not the run. Actions wait for a run still going on the thread (e.g. after a resume).
+        while session.pending:
+            message = session.pending.popleft()
+            await resume_hub.wait_idle(session.thread_id)
+            run = resume_hub.start(session.thread_id, self._run(session, message)).run
+            try:
+                await asyncio.shield(run)
+            except asyncio.CancelledError:
+                if not run.cancelled():
+                    raise
+
+    async def _write(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            # Round robin: one queued item per session per pass
+            while any(len(s.outbox) for s in list(self.sessions.values())):
+                for session in list(self.sessions.values()):
+                    if not len(session.outbox):
+                        continue
+                    for frame in session.next_frames():
+                        await send_frame(self.websocket, session.encoder, frame)
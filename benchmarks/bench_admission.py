@@ -0,0 +1,145 @@
+"""
+Overload test for admission control: request latency with and without ADMISSION_* limits.
+
+Starts backend/main.py with FakeLLM behind a small LLM budget (LLM_MAX_IN_FLIGHT) and
+opens --rate new sessions per second for --duration seconds, more than the budget can
+serve. Each session is POST /start, a failing POST /submit-essay and a passing
+resubmission. Sessions are open loop: they keep arriving however slow the server gets.
+
+Runs twice: without admission control, and with ADMISSION_MAX_ACTIVE=--max-active,
+ADMISSION_QUEUE=--queue and ADMISSION_QUEUE_TIMEOUT=--queue-timeout. Reports p50/p99
+latency of served requests by kind, the share refused with 503 (and the Retry-After
+they carried), and sessions completed per second.
+
+    python benchmarks/bench_admission.py --rate 12 --duration 20 --llm-slots 8
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BODY = "Inclusive growth needs investment in health, education and accountable institutions. " * 25
+KINDS = ("start", "submit", "resubmit")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Server:
+    def __init__(self, port, **settings):
+        self.port = port
+        self.settings = settings
+
+    def __enter__(self):
+        env = {**os.environ, "CHECKPOINTER": "memory", "TOPIC_POOL_SIZE": "0", "EVAL_CACHE": "0",
+               "EVAL_COALESCE": "0", **self.settings}
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fake_server:app", "--app-dir", BENCH_DIR,
+             "--port", str(self.port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{self.port}"
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                if httpx.get(f"{url}/topic-pool").status_code == 200:
+                    return url
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"server at {url} did not start")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.refused = defaultdict(int)
+        self.retry_after = []
+        self.completed = 0
+
+async def timed(results, kind, request):
+    """Runs one request; returns its response, or None if it was refused."""
+    t0 = time.perf_counter()
+    response = await request()
+    if response.status_code == 503:
+        results.refused[kind] += 1
+        results.retry_after.append(int(response.headers.get("Retry-After", 0)))
+        return None
+    response.raise_for_status()
+    results.latencies[kind].append(time.perf_counter() - t0)
+    return response
+
+async def session(client, url, results, number):
+    started = await timed(results, "start", lambda: client.post(f"{url}/start"))
+    if started is None:
+        return
+    thread_id = started.json()["thread_id"]
+    for kind, score in (("submit", 2), ("resubmit", 4)):
+        body = {"thread_id": thread_id, "essay_content": f"Draft {number} [[score:{score}]] {BODY}"}
+        # The NDJSON body streams until the run ends; reading it all is part of the latency
+        if await timed(results, kind, lambda: client.post(f"{url}/submit-essay", json=body)) is None:
+            return
+    results.completed += 1
+
+async def overload(url, rate, duration):
+    results = Results()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        tasks = []
+        t0 = time.perf_counter()
+        for number in range(int(rate * duration)):
+            await asyncio.sleep(max(0.0, t0 + number / rate - time.perf_counter()))
+            tasks.append(asyncio.create_task(session(client, url, results, number)))
+        await asyncio.gather(*tasks)
+        return results, time.perf_counter() - t0
+
+def report(label, results, elapsed):
+    print(f"\n{label}: {results.completed} sessions completed in {elapsed:.1f}s "
+          f"({results.completed / elapsed:.2f}/s)")
+    print(f"  {'request':<10} {'served':>7} {'refused':>8} {'p50':>8} {'p99':>8}")
+    for kind in KINDS:
+        served = results.latencies[kind]
+        p50 = f"{percentile(served, 50):.2f}s" if served else "-"
+        p99 = f"{percentile(served, 99):.2f}s" if served else "-"
+        print(f"  {kind:<10} {len(served):>7} {results.refused[kind]:>8} {p50:>8} {p99:>8}")
+    if results.retry_after:
+        print(f"  Retry-After on refusals: {min(results.retry_after)}-{max(results.retry_after)}s")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=12, help="new sessions per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of arrivals")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--llm-slots", type=int, default=8, help="LLM_MAX_IN_FLIGHT: the server's LLM budget")
+    parser.add_argument("--max-active", type=int, default=8, help="ADMISSION_MAX_ACTIVE")
+    parser.add_argument("--queue", type=int, default=16, help="ADMISSION_QUEUE")
+    parser.add_argument("--queue-timeout", type=float, default=2.0, help="ADMISSION_QUEUE_TIMEOUT")
+    parser.add_argument("--port", type=int, default=8181)
+    args = parser.parse_args()
+    settings = {"FAKE_LLM_LATENCY": str(args.latency), "LLM_MAX_IN_FLIGHT": str(args.llm_slots)}
+
+    print(f"{args.rate:g} new sessions/s for {args.duration:g}s, {args.llm_slots} LLM slots "
+          f"of {args.latency}s calls")
+    for label, admission in (
+        ("No admission control", {}),
+        (f"ADMISSION_MAX_ACTIVE={args.max_active}, ADMISSION_QUEUE={args.queue}, "
+         f"ADMISSION_QUEUE_TIMEOUT={args.queue_timeout:g}",
+         {"ADMISSION_MAX_ACTIVE": str(args.max_active), "ADMISSION_QUEUE": str(args.queue),
+          "ADMISSION_QUEUE_TIMEOUT": str(args.queue_timeout)}),
+    ):
+        with Server(args.port, **settings, **admission) as url:
+            results, elapsed = asyncio.run(overload(url, args.rate, args.duration))
+        report(label, results, elapsed)
+
+if __name__ == "__main__":
+    main_cli()
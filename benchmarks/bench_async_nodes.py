@@ -0,0 +1,96 @@
+"""
+Concurrent /submit-essay streams on a single worker: sync nodes vs async nodes.
+
+Runs backend/main.py in-process (one event loop, default executor -- the same
+setup as one uvicorn worker) with the Gemini client replaced by FakeLLM, then
+ramps the number of simultaneous sessions. A level counts as "sustained" while
+its p95 latency stays within --slo-factor of the single-stream p95.
+
+    python benchmarks/bench_async_nodes.py --latency 0.5 --levels 1 4 16 64
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("CHECKPOINTER", "memory")
+# Every session submits the same essay; measure the LLM path, not the evaluation cache
+# or the coalescing of identical in-flight evaluations
+os.environ.setdefault("EVAL_CACHE", "0")
+os.environ.setdefault("EVAL_COALESCE", "0")
+# Measure how many streams the event loop sustains, not the LLM rate limiter
+os.environ.setdefault("LLM_MAX_IN_FLIGHT", "100000")
+
+import httpx
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph
+import main
+from fake_llm import FakeLLM
+
+ESSAY = "Growth and equity reinforce each other. " * 40
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def one_session(client):
+    start = await client.post("/start")
+    thread_id = start.json()["thread_id"]
+    t0 = time.perf_counter()
+    response = await client.post("/submit-essay", json={"thread_id": thread_id, "essay_content": ESSAY})
+    assert response.status_code == 200, response.text
+    return time.perf_counter() - t0
+
+async def run_level(concurrency):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        t0 = time.perf_counter()
+        latencies = await asyncio.gather(*(one_session(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "throughput": concurrency / elapsed,
+    }
+
+async def bench_mode(mode, levels, slo_factor):
+    graph.graph_app = graph.build_workflow(mode).compile(checkpointer=MemorySaver(), interrupt_before=["collect_essay"])
+    results = []
+    sustained = 0
+    for level in levels:
+        result = await run_level(level)
+        results.append(result)
+        if result["p95"] <= slo_factor * results[0]["p95"]:
+            sustained = level
+        print(f"  [{mode:5}] streams={level:4d}  p50={result['p50']:.2f}s  p95={result['p95']:.2f}s  "
+              f"sessions/s={result['throughput']:.2f}")
+    return sustained
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--slo-factor", type=float, default=2.0)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"])
+    args = parser.parse_args()
+
+    graph.llm = FakeLLM(latency=args.latency)
+
+    summary = {}
+    for mode in args.modes:
+        print(f"mode={mode}")
+        summary[mode] = asyncio.run(bench_mode(mode, args.levels, args.slo_factor))
+
+    print("\nSustained concurrent streams (p95 <= %.1fx single-stream p95):" % args.slo_factor)
+    for mode, level in summary.items():
+        print(f"  {mode:5} {level}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,54 @@
+"""
+Batch grading throughput with FakeLLM: grades a generated JSONL corpus with backend/batch_grade.py.
+
+    python benchmarks/bench_batch_grade.py --records 2000 --concurrency 64 --latency 0.3
+
+Half of the generated essays fail (and get feedback). Run it twice with the same
+--workdir to see a resumed run skip the records that are already graded.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+# Every record is a distinct essay; keep the cache out of the measurement
+os.environ.setdefault("EVAL_CACHE", "0")
+os.environ.setdefault("LLM_MAX_IN_FLIGHT", "100000")
+
+import json
+
+import graph
+import batch_grade
+from fake_llm import FakeLLM
+
+TOPIC = "Is economic growth without social equity sustainable?"
+BODY = "Inclusive growth needs investment in health, education and accountable institutions. " * 40
+
+def write_corpus(path, records):
+    with open(path, "w") as f:
+        for n in range(records):
+            score = 4 if n % 2 else 2
+            f.write(json.dumps({"id": f"essay-{n}", "topic": TOPIC,
+                                "essay": f"Essay {n} [[score:{score}]] {BODY}"}) + "\n")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--workdir", help="keep the corpus and results here (default: a temporary directory)")
+    args = parser.parse_args()
+
+    graph.llm = FakeLLM(latency=args.latency)
+    workdir = args.workdir or tempfile.mkdtemp()
+    os.makedirs(workdir, exist_ok=True)
+    corpus = os.path.join(workdir, "corpus.jsonl")
+    if not os.path.exists(corpus):
+        write_corpus(corpus, args.records)
+    batch_grade.main_cli([corpus, "-o", os.path.join(workdir, "graded.jsonl"),
+                          "--concurrency", str(args.concurrency)])
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,101 @@
+"""
+Checkpoint bytes per thread with and without delta-encoded strings (CHECKPOINT_DELTA_MIN_CHARS).
+
+Runs backend/graph.py in-process with FakeLLM on both bounded checkpointers. Each session
+submits a multi-paragraph draft and revises it until it has been submitted --revisions
+times (a changed word, an added sentence or a reworded paragraph per revision, as in
+bench_incremental.py); every draft fails, so each one gets feedback. Reports the bytes a
+thread keeps in the checkpointer after its last revision: with the default
+CHECKPOINT_MAX_VERSIONS and with every checkpoint kept (--keep-all versions), and the
+share saved by storing essay revisions as deltas and unchanged strings once.
+
+    python benchmarks/bench_checkpoint_deltas.py --revisions 1 5 20 --min-chars 256
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.update({"EVAL_CACHE": "0", "EVAL_COALESCE": "0"})
+
+import graph
+from bench_incremental import essay, first_draft, revise
+from checkpointer import BoundedMemorySaver, BoundedSqliteSaver
+from fake_llm import FakeLLM
+
+EDITS = ("typo", "sentence", "reword")
+
+async def session(graph_app, revisions):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph_app.ainvoke({}, config=config)
+    paras = first_draft()
+    for number in range(revisions):
+        if number:
+            paras = revise(paras, EDITS[number % len(EDITS)], number)
+        await graph_app.aupdate_state(config, {"essay_content": essay(paras)}, as_node="collect_essay")
+        await graph_app.ainvoke(None, config=config)
+    state = (await graph_app.aget_state(config)).values
+    assert state["essay_content"] == essay(paras), "checkpoint did not round-trip the essay"
+
+def sqlite_bytes(saver) -> int:
+    with saver.cursor(transaction=False) as cur:
+        return sum(cur.execute(query).fetchone()[0] or 0 for query in (
+            "SELECT SUM(LENGTH(checkpoint) + LENGTH(metadata)) FROM checkpoints",
+            "SELECT SUM(LENGTH(value)) FROM writes",
+            "SELECT SUM(LENGTH(key) + LENGTH(base) + LENGTH(body)) FROM checkpoint_strings",
+        ))
+
+def memory_bytes(saver) -> int:
+    total = sum(len(checkpoint[1]) + len(metadata[1])
+                for namespaces in saver.storage.values() for versions in namespaces.values()
+                for checkpoint, metadata, _ in versions.values())
+    total += sum(len(blob[1]) for blob in saver.blobs.values())
+    total += sum(len(write[2][1]) for writes in saver.writes.values() for write in writes.values())
+    total += sum(len(key) + len(base or "") + len(body)
+                 for entries in saver.strings.values() for key, (_, base, _, body) in entries.items())
+    return total
+
+def measure(backend, revisions, sessions, max_versions, min_chars):
+    if backend == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite")
+        saver = BoundedSqliteSaver.from_path(path, max_versions=max_versions, delta_min_chars=min_chars)
+        saver.setup()
+        size = sqlite_bytes
+    else:
+        saver = BoundedMemorySaver(max_versions=max_versions, delta_min_chars=min_chars)
+        size = memory_bytes
+    graph_app = graph.build_workflow("async").compile(checkpointer=saver, interrupt_before=["collect_essay"])
+
+    async def run():
+        await asyncio.gather(*(session(graph_app, revisions) for _ in range(sessions)))
+
+    asyncio.run(run())
+    return size(saver) / sessions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, nargs="+", default=[1, 5, 20], help="drafts submitted per session")
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--min-chars", type=int, default=256, help="CHECKPOINT_DELTA_MIN_CHARS when on")
+    parser.add_argument("--max-versions", type=int, default=5, help="CHECKPOINT_MAX_VERSIONS")
+    parser.add_argument("--keep-all", type=int, default=100_000, help="CHECKPOINT_MAX_VERSIONS keeping every checkpoint")
+    args = parser.parse_args()
+    graph.llm = FakeLLM(latency=0.0)
+
+    print(f"Checkpoint bytes per thread ({args.sessions} sessions per row, essay of "
+          f"{len(essay(first_draft()))} characters)")
+    print(f"  {'backend':<8} {'versions':>8} {'revisions':>9} {'plain':>10} {'deltas':>10} {'saved':>7}")
+    for backend in ("sqlite", "memory"):
+        for max_versions, label in ((args.max_versions, str(args.max_versions)), (args.keep_all, "all")):
+            for revisions in args.revisions:
+                plain = measure(backend, revisions, args.sessions, max_versions, 0)
+                deltas = measure(backend, revisions, args.sessions, max_versions, args.min_chars)
+                print(f"  {backend:<8} {label:>8} {revisions:>9} {plain:>10,.0f} {deltas:>10,.0f} "
+                      f"{(1 - deltas / plain) * 100:>6.0f}%")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,114 @@
+"""
+Identical submissions at the same moment: LLM calls with and without single-flight coalescing.
+
+Launches backend/server.py (WebSocket, GRAPH_EXECUTION_MODE=sync: sync nodes on executor threads) and
+backend/main.py (NDJSON, async nodes) with FakeLLM and the evaluation cache
+off. --clients sessions get the same topic and then submit the same essay
+together, as a classroom pasting a model answer would. The evaluator LLM
+calls and the saved calls are then read from each server's /metrics.
+
+    python benchmarks/bench_coalescing.py --clients 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ESSAY = "A classroom model answer on growth and equity [[score:4]]. " * 30
+EVALUATORS = ("eval_clarity", "eval_depth", "eval_vocab", "eval_fused")
+
+def launch(module, port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--app-dir", BENCH_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+def wait_ready(url, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/topic-pool").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+def scrape(url):
+    """Returns (evaluator LLM calls, coalesced evaluations) from /metrics."""
+    text = httpx.get(f"{url}/metrics").text
+    calls = coalesced = 0
+    for line in text.splitlines():
+        match = re.match(r'(\w+)\{node="(\w+)"[^}]*\} (\S+)', line)
+        if not match or match.group(2) not in EVALUATORS:
+            continue
+        if match.group(1) == "essay_llm_call_duration_seconds_count":
+            calls += int(float(match.group(3)))
+        elif match.group(1) == "essay_eval_coalesced_total":
+            coalesced += int(float(match.group(3)))
+    return calls, coalesced
+
+async def ws_clients(url, clients):
+    connections = [await websockets.connect(f"{url.replace('http', 'ws')}/ws", max_size=None) for _ in range(clients)]
+
+    async def run(ws, message, until):
+        await ws.send(json.dumps(message))
+        while json.loads(await ws.recv())["type"] not in until:
+            pass
+
+    await asyncio.gather(*(run(ws, {"action": "generate_topic"}, {"topic_generated"}) for ws in connections))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run(ws, {"action": "submit_essay", "essay": ESSAY}, {"complete", "feedback"})
+                           for ws in connections))
+    elapsed = time.perf_counter() - t0
+    for ws in connections:
+        await ws.close()
+    return elapsed
+
+async def http_clients(url, clients):
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        threads = [(await client.post("/start")).json()["thread_id"] for _ in range(clients)]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client.post("/submit-essay", json={"thread_id": t, "essay_content": ESSAY})
+                               for t in threads))
+        return time.perf_counter() - t0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--port", type=int, default=8131)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients submitting the same essay at once")
+    print(f"  {'transport':<10} {'coalescing':<10} {'eval LLM calls':>14} {'saved':>6} {'submit time':>12}")
+    for transport, module, drive in (("ws", "fake_ws_server", ws_clients), ("http", "fake_server", http_clients)):
+        for coalesce in ("0", "1"):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {**os.environ, "CHECKPOINT_DB": os.path.join(tmp, "bench.sqlite"), "EVAL_CACHE": "0",
+                       "EVAL_COALESCE": coalesce, "FAKE_LLM_LATENCY": str(args.latency),
+                       "LLM_MAX_IN_FLIGHT": "100000", "GRAPH_EXECUTION_MODE": "sync" if transport == "ws" else "async"}
+                url = f"http://127.0.0.1:{args.port}"
+                server = launch(module, args.port, env)
+                try:
+                    wait_ready(url)
+                    elapsed = asyncio.run(drive(url, args.clients))
+                    calls, saved = scrape(url)
+                finally:
+                    server.terminate()
+                    server.wait()
+            label = "on" if coalesce == "1" else "off"
+            print(f"  {transport:<10} {label:<10} {calls:>14} {saved:>6} {elapsed:>11.2f}s")
+
+if __name__ == "__main__":
+    main_cli()
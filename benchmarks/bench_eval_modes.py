@@ -0,0 +1,83 @@
+"""
+Tokens, LLM calls and latency per submission: "fanout" vs "fused" evaluation.
+
+Each mode grades the same essays through the async graph with FakeLLM. Input
+tokens are estimated from the prompts actually sent, so the fan-out's three
+copies of the essay show up directly in the numbers.
+
+    python benchmarks/bench_eval_modes.py --latency 0.5 --per-1k-tokens 0.4 --words 300 1200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("CHECKPOINTER", "memory")
+# Every session submits the same essay; measure the LLM path, not the evaluation cache
+# or the coalescing of identical in-flight evaluations
+os.environ.setdefault("EVAL_CACHE", "0")
+os.environ.setdefault("EVAL_COALESCE", "0")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph
+from fake_llm import FakeLLM
+
+def make_essay(words: int) -> str:
+    base = "Inclusive growth requires investment in health education and institutions ".split()
+    return " ".join(base[i % len(base)] for i in range(words))
+
+async def grade(app, essay):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    async for _ in app.astream({}, config=config):
+        pass
+    await app.aupdate_state(config, {"essay_content": essay}, as_node="collect_essay")
+    t0 = time.perf_counter()
+    async for _ in app.astream(None, config=config):
+        pass
+    return time.perf_counter() - t0
+
+async def bench_mode(eval_mode, words, runs, latency, per_1k_tokens):
+    fake = FakeLLM(latency=latency, latency_per_1k_tokens=per_1k_tokens)
+    graph.llm = fake
+    app = graph.build_workflow("async", eval_mode).compile(checkpointer=MemorySaver(), interrupt_before=["collect_essay"])
+    essay = make_essay(words)
+    latencies = []
+    calls = input_tokens = output_tokens = 0
+    for _ in range(runs):
+        # Topic generation is not part of the evaluation cost, so only count the submit phase
+        before = (fake.calls, fake.input_tokens, fake.output_tokens)
+        latencies.append(await grade(app, essay))
+        calls += fake.calls - before[0] - 1
+        input_tokens += fake.input_tokens - before[1]
+        output_tokens += fake.output_tokens - before[2]
+    return {
+        "calls": calls / runs,
+        "input_tokens": input_tokens / runs,
+        "output_tokens": output_tokens / runs,
+        "latency": statistics.median(latencies),
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--per-1k-tokens", type=float, default=0.4,
+                        help="extra fake latency per 1k prompt tokens (seconds)")
+    parser.add_argument("--words", type=int, nargs="+", default=[300, 1200], help="essay lengths to compare")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'words':>6} {'mode':>7} {'calls':>6} {'in_tok':>8} {'out_tok':>8} {'latency':>8}")
+    for words in args.words:
+        for eval_mode in ("fanout", "fused"):
+            result = asyncio.run(bench_mode(eval_mode, words, args.runs, args.latency, args.per_1k_tokens))
+            print(f"{words:>6} {eval_mode:>7} {result['calls']:>6.1f} {result['input_tokens']:>8.0f} "
+                  f"{result['output_tokens']:>8.0f} {result['latency']:>7.2f}s")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,110 @@
+"""
+Tail latency of an evaluation with hedged LLM calls and per-node routing (backend/llm_routing.py).
+
+Runs --essays submissions (three parallel evaluators, then aggregate; the essays pass so
+no feedback call) through the async graph in-process, --concurrency at a time, with
+FakeLLM latencies drawn from --latency-dist. One slow evaluator call delays the whole
+submission, so the tail of a submission is worse than the tail of a call. Compares:
+
+    no hedging
+    LLM_HEDGE_PERCENTILE = each of --percentiles (LLM_HEDGE_BUDGET --budget)
+    eval_depth routed to a model with a heavier tail, with and without a --timeout
+    and fallback to the default model
+
+and reports p50 / p95 / p99 submission latency, evaluator calls answered per submission,
+the share of calls hedged, the latency the winning hedges saved and the fallbacks made.
+
+    python benchmarks/bench_hedging.py --essays 300 --latency-dist lognormal:0.3,0.6 --percentiles 90 95
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.update({"EVAL_CACHE": "0", "EVAL_COALESCE": "0", "LLM_MAX_IN_FLIGHT": "100000",
+                   "GRAPH_EXECUTION_MODE": "async", "EVAL_MODE": "fanout"})
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph
+from fake_llm import FakeLLM
+from llm_routing import LLMRouter, parse_routes
+
+ESSAY = "Inclusive growth needs investment in health, education and institutions [[score:4]]. " * 30
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def submission(graph_app):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    async for _ in graph_app.astream({}, config=config):
+        pass
+    await graph_app.aupdate_state(config, {"essay_content": ESSAY}, as_node="collect_essay")
+    t0 = time.perf_counter()
+    async for _ in graph_app.astream(None, config=config):
+        pass
+    return time.perf_counter() - t0
+
+async def run(essays, concurrency):
+    graph_app = graph.build_workflow("async", "fanout").compile(
+        checkpointer=MemorySaver(), interrupt_before=["collect_essay"])
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            return await submission(graph_app)
+
+    return await asyncio.gather(*(one() for _ in range(essays)))
+
+def measure(args, label, routes="", hedge_percentile=0.0, models=None):
+    default = FakeLLM(latency_dist=args.latency_dist)
+    models = models or {}
+    graph.llm = default
+    graph.router = LLMRouter(lambda model: models.get(model) or graph.make_llm(model), parse_routes(routes),
+                             hedge_percentile=hedge_percentile, hedge_min_samples=args.min_samples,
+                             hedge_budget=args.budget, adefault_client=graph.aget_llm)
+    latencies = asyncio.run(run(args.essays, args.concurrency))
+    # Answered calls; one per submission is its topic
+    calls = default.calls + sum(model.calls for model in models.values()) - args.essays
+    stats = graph.router.stats()
+    saved = f"{stats['saved_seconds']:.1f}s" if stats["hedged"] else "-"
+    print(f"  {label:<34} {percentile(latencies, 50):>6.2f}s {percentile(latencies, 95):>6.2f}s "
+          f"{percentile(latencies, 99):>6.2f}s {calls / args.essays:>10.2f} {stats['hedge_rate'] * 100:>6.1f}% "
+          f"{saved:>8} {stats['fallbacks']:>9}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--essays", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-dist", default="lognormal:0.3,0.6", help="FakeLLM latency of the default model")
+    parser.add_argument("--slow-dist", default="lognormal:0.4,1.0", help="latency of the model eval_depth is routed to")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=[90, 95])
+    parser.add_argument("--budget", type=float, default=0.15, help="LLM_HEDGE_BUDGET")
+    parser.add_argument("--min-samples", type=int, default=20, help="LLM_HEDGE_MIN_SAMPLES")
+    parser.add_argument("--timeout", type=float, default=1.5, help="timeout of the routed eval_depth model")
+    args = parser.parse_args()
+
+    print(f"{args.essays} submissions, {args.concurrency} at a time, LLM latency {args.latency_dist}")
+    print(f"  {'':<34} {'p50':>7} {'p95':>7} {'p99':>7} {'eval calls':>10} {'hedged':>7} {'saved':>8} {'fallbacks':>9}")
+    measure(args, "no hedging")
+    for pct in args.percentiles:
+        measure(args, f"hedge at p{pct:g}", hedge_percentile=pct)
+
+    def slow():
+        return {"depth-model": FakeLLM(latency_dist=args.slow_dist)}
+    route = '{"eval_depth": {"model": "depth-model"}}'
+    measure(args, f"eval_depth on {args.slow_dist}", routes=route, models=slow())
+    route = (f'{{"eval_depth": {{"model": "depth-model", "timeout": {args.timeout}, '
+             f'"fallback": "{graph.GEMINI_MODEL}"}}}}')
+    measure(args, f"  + timeout {args.timeout:g}s, fallback", routes=route, models=slow())
+    measure(args, f"  + fallback and hedge at p{args.percentiles[-1]:g}", routes=route,
+            hedge_percentile=args.percentiles[-1], models=slow())
+
+if __name__ == "__main__":
+    main_cli()
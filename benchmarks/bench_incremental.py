@@ -0,0 +1,114 @@
+"""
+Evaluator LLM calls per revision loop: full re-evaluation vs incremental re-evaluation.
+
+Runs backend/graph.py in-process with FakeLLM (evaluation cache and coalescing
+off). Each session submits a multi-paragraph draft and then --revisions revised
+drafts, with one kind of edit applied per revision:
+
+    typo       one word changed
+    reword     one paragraph reworded (same length, different words)
+    sentence   three sentences added to a paragraph
+    paragraph  one paragraph added
+    rewrite    half of the paragraphs rewritten
+
+and counts the evaluator calls each revision needed.
+
+    python benchmarks/bench_incremental.py --revisions 4 --threshold 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("CHECKPOINTER", "memory")
+os.environ.setdefault("EVAL_CACHE", "0")
+os.environ.setdefault("EVAL_COALESCE", "0")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph
+from fake_llm import FakeLLM
+
+SENTENCES = [
+    "Economic growth raises incomes but its benefits are rarely shared evenly across regions and classes.",
+    "Public investment in health and education widens the base of people who can take part in growth.",
+    "Accountable institutions keep growth from being captured by a narrow group of interests.",
+    "Social equity in turn sustains demand, political stability and the legitimacy of reform.",
+    "Evidence from several economies shows that inclusive policies and high growth can reinforce each other.",
+    "Without redistribution, inequality erodes trust and eventually slows investment and productivity.",
+]
+
+def paragraph(seed: int, sentences: int = 5) -> str:
+    return " ".join(SENTENCES[(seed + i) % len(SENTENCES)] for i in range(sentences))
+
+def first_draft(paragraphs: int = 8) -> list:
+    return [paragraph(i) for i in range(paragraphs)]
+
+def revise(paras: list, edit: str, number: int) -> list:
+    paras = list(paras)
+    target = number % len(paras)
+    if edit == "typo":
+        paras[target] = paras[target].replace("rarely", "seldom", 1) if number % 2 else paras[target].replace("seldom", "rarely", 1)
+    elif edit == "reword":
+        words = paras[target].split()
+        paras[target] = " ".join(f"{w}{number}" if i % 2 else w for i, w in enumerate(words))
+    elif edit == "sentence":
+        paras[target] = (f"Revision {number} restates the claim that fair access to opportunity is itself a "
+                         f"driver of growth. It also notes that stable institutions keep that access open to "
+                         f"every citizen. Both points answer the question directly. " + paras[target])
+    elif edit == "paragraph":
+        paras.insert(target, f"Revision {number} adds an example. " + paragraph(number + 3))
+    elif edit == "rewrite":
+        for i in range(0, len(paras), 2):
+            paras[i] = f"Rewritten in revision {number}. " + paragraph(i + number + 1, 4)
+    return paras
+
+def essay(paras: list) -> str:
+    # Pin a failing score so every revision loops back through feedback
+    return "[[score:2]]\n\n" + "\n\n".join(paras)
+
+async def session(graph_app, llm, edit, revisions):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph_app.ainvoke({}, config=config)
+    paras = first_draft()
+    calls = []
+    for number in range(revisions + 1):
+        if number:
+            paras = revise(paras, edit, number)
+        await graph_app.aupdate_state(config, {"essay_content": essay(paras)}, as_node="collect_essay")
+        before = llm.calls
+        await graph_app.ainvoke(None, config=config)
+        state = (await graph_app.aget_state(config)).values
+        # Every draft fails, so one of the calls is generate_feedback
+        calls.append(llm.calls - before - 1)
+    return calls[1:], state["revision_count"], state.get("reused_scores", [])
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=graph.REEVAL_THRESHOLD)
+    parser.add_argument("--eval-mode", default="fanout", choices=["fanout", "fused"])
+    args = parser.parse_args()
+
+    llm = FakeLLM(latency=0.0)
+    graph.llm = llm
+    print(f"Evaluator calls per revision ({args.revisions} revisions, eval mode {args.eval_mode}, "
+          f"threshold {args.threshold}):")
+    print(f"  {'edit':<10} {'full':>6} {'incremental':>12} {'saved':>7}   last reused")
+    for edit in ("typo", "reword", "sentence", "paragraph", "rewrite"):
+        results = {}
+        for incremental in (False, True):
+            graph_app = graph.build_workflow("async", args.eval_mode, incremental, args.threshold).compile(
+                checkpointer=MemorySaver(), interrupt_before=["collect_essay"])
+            calls, revision_count, reused = asyncio.run(session(graph_app, llm, edit, args.revisions))
+            assert revision_count == args.revisions, revision_count
+            results[incremental] = (sum(calls) / len(calls), reused)
+        full, (incremental, reused) = results[False][0], results[True]
+        saved = (1 - incremental / full) * 100 if full else 0
+        print(f"  {edit:<10} {full:>6.2f} {incremental:>12.2f} {saved:>6.0f}%   {', '.join(reused) or '-'}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,82 @@
+"""
+LLM calls through the shared governor (backend/llm_governor.py) against a quota-limited FakeLLM.
+
+FakeLLM fails calls beyond --quota concurrent ones with a 429. The benchmark
+first measures the delay the governor adds to a single call on an idle
+process, then fires --burst simultaneous evaluator calls:
+
+    unlimited  governor cap far above the quota, no retries (what a spike does today)
+    governed   default settings: adaptive in-flight cap, cooldown and retries
+
+and reports failed calls, 429s seen, p50/p95 latency and total time.
+
+    python benchmarks/bench_llm_governor.py --quota 8 --burst 120 --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import llm_calls
+from llm_governor import LLMGovernor
+from fake_llm import FakeLLM
+
+PROMPT = "Evaluate the following essay for CLARITY OF THOUGHT. Score it out of 5. " + "Essay text. " * 200
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def timed_call(llm):
+    t0 = time.perf_counter()
+    try:
+        await llm_calls.ainvoke_llm(llm, PROMPT, "eval_clarity")
+        return time.perf_counter() - t0, None
+    except Exception as error:
+        return time.perf_counter() - t0, error
+
+async def idle_overhead(calls=20):
+    llm_calls.governor = LLMGovernor()
+    waits = []
+    for _ in range(calls):
+        permit = await llm_calls.governor.aacquire(PROMPT)
+        waits.append(permit.waited)
+        llm_calls.governor.release(permit)
+    return max(waits)
+
+async def burst(name, governor, quota, size, latency):
+    llm_calls.governor = governor
+    llm = FakeLLM(latency=latency, max_concurrent=quota)
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(timed_call(llm) for _ in range(size)))
+    elapsed = time.perf_counter() - t0
+    latencies = [seconds for seconds, error in results if error is None]
+    failed = sum(1 for _, error in results if error is not None)
+    p50 = percentile(latencies, 50) if latencies else float("nan")
+    p95 = percentile(latencies, 95) if latencies else float("nan")
+    print(f"  {name:<10} failed={failed:4d}/{size}  429s={llm.rate_limited:4d}  "
+          f"p50={p50:.2f}s  p95={p95:.2f}s  total={elapsed:.2f}s  final cap={governor.stats()['limit']}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quota", type=int, default=8, help="concurrent calls the fake LLM accepts")
+    parser.add_argument("--burst", type=int, default=120, help="simultaneous calls in the spike")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--backoff-base", type=float, default=0.25)
+    args = parser.parse_args()
+
+    overhead = asyncio.run(idle_overhead())
+    print(f"Idle: max governor wait per call {overhead * 1000:.3f} ms")
+
+    print(f"Burst of {args.burst} calls against a quota of {args.quota} concurrent calls:")
+    asyncio.run(burst("unlimited", LLMGovernor(max_in_flight=100000, max_retries=0),
+                      args.quota, args.burst, args.latency))
+    asyncio.run(burst("governed", LLMGovernor(backoff_base=args.backoff_base, max_retries=5),
+                      args.quota, args.burst, args.latency))
+
+if __name__ == "__main__":
+    main_cli()
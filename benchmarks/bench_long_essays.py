@@ -0,0 +1,84 @@
+"""
+Evaluation latency vs essay length: single-prompt evaluators vs map-reduce over chunks.
+
+Runs backend/graph.py in-process with FakeLLM, whose calls take --latency seconds
+plus --per-1k seconds per 1,000 prompt tokens (evaluation cache and coalescing
+off). Each essay is evaluated up to aggregate_score; the time, LLM calls and
+prompt tokens are reported for each length, with chunking off and with
+EVAL_CHUNK_THRESHOLD / EVAL_CHUNK_TOKENS set to --threshold / --budget.
+
+    python benchmarks/bench_long_essays.py --words 300 600 1200 2400 4800 --budget 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("CHECKPOINTER", "memory")
+os.environ.setdefault("EVAL_CACHE", "0")
+os.environ.setdefault("EVAL_COALESCE", "0")
+os.environ.setdefault("LLM_MAX_IN_FLIGHT", "100000")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph
+from chunking import EssayChunker
+from fake_llm import FakeLLM
+
+SENTENCES = [
+    "Economic growth raises incomes but its benefits are rarely shared evenly across regions and classes.",
+    "Public investment in health and education widens the base of people who can take part in growth.",
+    "Accountable institutions keep growth from being captured by a narrow group of interests.",
+    "Social equity in turn sustains demand, political stability and the legitimacy of reform.",
+    "Evidence from several economies shows that inclusive policies and high growth can reinforce each other.",
+    "Without redistribution, inequality erodes trust and eventually slows investment and productivity.",
+]
+
+def make_essay(words: int, number: int) -> str:
+    paras, count = [], 0
+    while count < words:
+        para = " ".join(SENTENCES[(len(paras) + i) % len(SENTENCES)] for i in range(5))
+        paras.append(para)
+        count += len(para.split())
+    return f"Essay {number}.\n\n" + "\n\n".join(paras)
+
+async def evaluate(graph_app, essay):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph_app.aupdate_state(config, {"topic": "Growth and equity", "essay_content": essay, "revision_count": 0},
+                                  as_node="collect_essay")
+    t0 = time.perf_counter()
+    await graph_app.ainvoke(None, config=config)
+    return time.perf_counter() - t0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, nargs="+", default=[300, 600, 1200, 2400, 4800])
+    parser.add_argument("--threshold", type=int, default=1000, help="chunk essays above this many tokens")
+    parser.add_argument("--budget", type=int, default=500, help="maximum tokens per chunk")
+    parser.add_argument("--latency", type=float, default=0.4, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--per-1k", type=float, default=0.8, help="extra fake latency per 1k prompt tokens")
+    parser.add_argument("--eval-mode", default="fanout", choices=["fanout", "fused"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Evaluation latency ({args.eval_mode}; fake LLM {args.latency}s + {args.per_1k}s per 1k prompt tokens; "
+          f"chunks of <= {args.budget} tokens above {args.threshold})")
+    print(f"  {'words':>6} {'mode':<8} {'median':>8} {'calls':>6} {'prompt tokens':>14}")
+    for words in args.words:
+        for label, chunker in (("single", EssayChunker()), ("chunked", EssayChunker(args.threshold, args.budget))):
+            graph.chunker = chunker
+            llm = FakeLLM(latency=args.latency, latency_per_1k_tokens=args.per_1k)
+            graph.llm = llm
+            graph_app = graph.build_workflow("async", args.eval_mode).compile(
+                checkpointer=MemorySaver(), interrupt_before=["collect_essay", "generate_feedback"])
+            times = [asyncio.run(evaluate(graph_app, make_essay(words, n))) for n in range(args.repeat)]
+            print(f"  {words:>6} {label:<8} {statistics.median(times):>7.2f}s {llm.calls / args.repeat:>6.1f}"
+                  f" {llm.input_tokens // args.repeat:>14}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,151 @@
+"""
+Near-duplicate index (backend/near_duplicates.py): detection, lookup cost, LLM calls saved, persistence.
+
+1. Detection: generated essays of --words words, and copies with a share of their words
+   replaced. Reports the mean estimated similarity and the share flagged at --threshold
+   for each edit rate, and for unrelated essays (false positives).
+2. Lookup cost: signature + vectorized lookup time per essay, and index memory, for
+   topics holding --rows graded essays.
+3. Grading: backend/batch_grade.py with FakeLLM on a corpus where --dup-share of the
+   records are a lightly edited copy of another record (a shared template, small edits),
+   with --near-dup off and reuse. Reports LLM calls and near-duplicates flagged.
+4. Restart: saves the index to NEAR_DUP_PATH, loads it into a new process index and
+   grades a second corpus of copies of the first; reports save / load time and file size.
+
+    python benchmarks/bench_near_duplicates.py --words 600 --records 300 --dup-share 0.4 --threshold 0.8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.update({"EVAL_CACHE": "0", "EVAL_COALESCE": "0", "LLM_MAX_IN_FLIGHT": "100000"})
+
+import batch_grade
+import graph
+import near_duplicates
+from fake_llm import FakeLLM
+from near_duplicates import NearDuplicateIndex, signatures
+
+TOPIC = "Is economic growth without social equity sustainable?"
+SYLLABLES = ["ka", "lo", "mi", "ren", "sa", "tu", "vel", "zor", "pan", "dri", "neo", "quo", "bar", "fen", "gil"]
+
+def vocabulary(rng, size=5000):
+    return ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)]
+
+def make_essay(rng, words, vocab):
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+def edit(rng, essay, rate, vocab):
+    words = essay.split()
+    for i in rng.sample(range(len(words)), int(len(words) * rate)):
+        words[i] = rng.choice(vocab)
+    return " ".join(words)
+
+def detection(args):
+    rng = random.Random(3)
+    vocab = vocabulary(rng)
+    originals = [make_essay(rng, args.words, vocab) for _ in range(200)]
+    base = signatures(originals)
+    print(f"Detection ({args.words}-word essays, threshold {args.threshold}):")
+    print(f"  {'edit':<16} {'similarity':>10} {'flagged':>8}")
+    for rate in (0.01, 0.05, 0.1, 0.2, 0.4):
+        similarity = (signatures([edit(rng, e, rate, vocab) for e in originals]) == base).mean(axis=1)
+        print(f"  {f'{rate:.0%} of words':<16} {similarity.mean():>10.2f} {(similarity >= args.threshold).mean():>7.0%}")
+    others = signatures([make_essay(rng, args.words, vocab) for _ in range(200)])
+    similarity = (others[:, None, :] == base[None, :, :]).mean(axis=2).max(axis=1)
+    print(f"  {'unrelated':<16} {similarity.mean():>10.2f} {(similarity >= args.threshold).mean():>7.0%}")
+
+def lookup_cost(args):
+    rng = random.Random(5)
+    vocab = vocabulary(rng)
+    print(f"\nLookup cost ({args.words}-word essays):")
+    print(f"  {'rows':>6} {'signature':>10} {'lookup':>9} {'memory':>9}")
+    for rows in args.rows:
+        index = NearDuplicateIndex(per_topic=rows)
+        essays = [make_essay(rng, args.words, vocab) for _ in range(rows)]
+        for signature in signatures(essays):
+            index.add(TOPIC, signature, {"clarity": 3, "depth": 3, "vocab": 3}, owner=1)
+        probes = [make_essay(rng, args.words, vocab) for _ in range(200)]
+        t0 = time.perf_counter()
+        probe_signatures = [signatures([probe])[0] for probe in probes]
+        t1 = time.perf_counter()
+        for signature in probe_signatures:
+            index.lookup(TOPIC, signature)
+        t2 = time.perf_counter()
+        print(f"  {rows:>6} {(t1 - t0) / len(probes) * 1e3:>8.2f}ms {(t2 - t1) / len(probes) * 1e6:>7.0f}us "
+              f"{index.stats()['bytes'] / 2 ** 20:>7.2f}MB")
+
+def write_corpus(path, records):
+    with open(path, "w") as f:
+        for n, essay in enumerate(records):
+            f.write(json.dumps({"id": f"essay-{n}", "topic": TOPIC, "essay": essay}) + "\n")
+
+def grade(corpus, output, mode, concurrency):
+    llm = FakeLLM(latency=0.0)
+    graph.llm = llm
+    batch_grade.main_cli([corpus, "-o", output, "--concurrency", str(concurrency), "--near-dup", mode])
+    with open(output) as f:
+        flagged = sum(1 for line in f if "near_duplicate" in json.loads(line))
+    return llm.calls, flagged
+
+def grading(args):
+    rng = random.Random(11)
+    vocab = vocabulary(rng)
+    workdir = tempfile.mkdtemp()
+    records, copies = [], 0
+    for n in range(args.records):
+        if records and rng.random() < args.dup_share:
+            records.append(edit(rng, rng.choice(records), args.edit, vocab))
+            copies += 1
+        else:
+            records.append(make_essay(rng, args.words, vocab))
+    corpus = os.path.join(workdir, "corpus.jsonl")
+    write_corpus(corpus, records)
+
+    os.environ["NEAR_DUP_PATH"] = os.path.join(workdir, "near_duplicates.npz")
+    near_duplicates.index = None
+    print(f"\nGrading {args.records} records, {copies} of them copies with {args.edit:.0%} of words changed "
+          f"(concurrency {args.concurrency}):")
+    for mode in ("off", "reuse"):
+        calls, flagged = grade(corpus, os.path.join(workdir, f"graded-{mode}.jsonl"), mode, args.concurrency)
+        print(f"  NEAR_DUP={mode:<6} {calls:>6} LLM calls {flagged:>5} flagged")
+
+    # Restart: the index saved by the first process is loaded by the next one
+    t0 = time.perf_counter()
+    near_duplicates.index.save()
+    saved = time.perf_counter() - t0
+    size = os.path.getsize(os.environ["NEAR_DUP_PATH"])
+    t0 = time.perf_counter()
+    near_duplicates.index = NearDuplicateIndex.from_env()
+    loaded = time.perf_counter() - t0
+    print(f"  index saved in {saved * 1e3:.1f}ms ({size / 1024:.0f} KB, "
+          f"{near_duplicates.index.stats()['essays']} essays), loaded in {loaded * 1e3:.1f}ms")
+    second = os.path.join(workdir, "corpus-2.jsonl")
+    write_corpus(second, [edit(rng, essay, args.edit, vocab) for essay in records[:100]])
+    calls, flagged = grade(second, os.path.join(workdir, "graded-restart.jsonl"), "reuse", args.concurrency)
+    print(f"  after restart, 100 copies of graded essays: {calls} LLM calls, {flagged} flagged")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=600)
+    parser.add_argument("--threshold", type=float, default=graph.NEAR_DUP_THRESHOLD, help="NEAR_DUP_THRESHOLD")
+    parser.add_argument("--rows", type=int, nargs="+", default=[64, 512, 4096], help="graded essays per topic")
+    parser.add_argument("--records", type=int, default=300)
+    parser.add_argument("--dup-share", type=float, default=0.4, help="share of records that copy an earlier one")
+    parser.add_argument("--edit", type=float, default=0.02, help="share of words changed in a copy")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    graph.NEAR_DUP_THRESHOLD = args.threshold
+
+    detection(args)
+    lookup_cost(args)
+    grading(args)
+
+if __name__ == "__main__":
+    main_cli()
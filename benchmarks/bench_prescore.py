@@ -0,0 +1,115 @@
+"""
+Local pre-scoring: throughput of backend/prescore.py, and LLM calls the gate saves.
+
+1. Scores generated essays of --words words with PreScorer, one essay per call and
+   in batches, and reports essays per second.
+2. Grades a generated corpus where --junk of the records are empty, too short,
+   keyboard-mashed or one sentence repeated, with backend/batch_grade.py and
+   FakeLLM, with --prescore off and gate, and reports the LLM calls each needed.
+
+    python benchmarks/bench_prescore.py --words 600 --essays 4096 --junk 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("EVAL_CACHE", "0")
+os.environ.setdefault("EVAL_COALESCE", "0")
+os.environ.setdefault("LLM_MAX_IN_FLIGHT", "100000")
+
+import json
+
+import graph
+import batch_grade
+from fake_llm import FakeLLM
+from prescore import PreScorer
+
+TOPIC = "Is economic growth without social equity sustainable?"
+SENTENCES = [
+    "Economic growth raises incomes but its benefits are rarely shared evenly across regions and classes.",
+    "Public investment in health and education widens the base of people who can take part in growth.",
+    "Accountable institutions keep growth from being captured by a narrow group of interests.",
+    "Social equity in turn sustains demand, political stability and the legitimacy of reform.",
+    "Evidence from several economies shows that inclusive policies and high growth can reinforce each other.",
+    "Without redistribution, inequality erodes trust and eventually slows investment and productivity.",
+    "Rural livelihoods depend on irrigation, credit and markets that reward small farmers fairly.",
+    "Women's participation in the workforce remains one of the largest untapped sources of output.",
+    "Fiscal space for welfare schemes comes from a broad tax base and efficient public spending.",
+    "Climate shocks hit the poorest households first and can wipe out years of modest gains.",
+    "Digital public infrastructure lowers the cost of reaching citizens with benefits and services.",
+    "Cooperative federalism lets states experiment with programmes suited to local conditions.",
+]
+
+def make_essay(rng, words):
+    sentences, count = [], 0
+    while count < words:
+        sentence = rng.choice(SENTENCES)
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return " ".join(sentences)
+
+def make_junk(rng, kind, words):
+    if kind == "empty":
+        return ""
+    if kind == "short":
+        return "I agree that growth without equity is not sustainable."
+    if kind == "mashed":
+        return " ".join("".join(rng.choice("qwrtpsdfghjklzxcvbnm") for _ in range(rng.randint(3, 9)))
+                        for _ in range(words))
+    return " ".join([SENTENCES[0]] * (words // len(SENTENCES[0].split())))
+
+def throughput(words, essays):
+    rng = random.Random(7)
+    texts = [make_essay(rng, words) for _ in range(essays)]
+    topics = [TOPIC] * essays
+    scorer = PreScorer("gate")
+    print(f"Pre-scoring throughput, {words}-word essays:")
+    for batch_size in (1, 16, 64, 256, 1024):
+        count = min(essays, 2000) if batch_size == 1 else essays
+        t0 = time.perf_counter()
+        scorer.score(topics[:count], texts[:count], batch_size=batch_size)
+        elapsed = time.perf_counter() - t0
+        print(f"  batch size {batch_size:>5}   {count / elapsed:>8.0f} essays/s")
+
+def gate(records, junk, words, latency, concurrency):
+    rng = random.Random(11)
+    workdir = tempfile.mkdtemp()
+    corpus = os.path.join(workdir, "corpus.jsonl")
+    with open(corpus, "w") as f:
+        for n in range(records):
+            if rng.random() < junk:
+                essay = make_junk(rng, rng.choice(["empty", "short", "mashed", "repeated"]), words)
+            else:
+                essay = make_essay(rng, words)
+            f.write(json.dumps({"id": f"essay-{n}", "topic": TOPIC, "essay": essay}) + "\n")
+
+    calls = {}
+    for mode in ("off", "gate"):
+        llm = FakeLLM(latency=latency)
+        graph.llm = llm
+        batch_grade.main_cli([corpus, "-o", os.path.join(workdir, f"graded-{mode}.jsonl"),
+                              "--concurrency", str(concurrency), "--prescore", mode])
+        calls[mode] = llm.calls
+    print(f"\nLLM calls for {records} records ({junk:.0%} junk): off {calls['off']}, gate {calls['gate']} "
+          f"({(1 - calls['gate'] / calls['off']) * 100:.0f}% saved)")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=600)
+    parser.add_argument("--essays", type=int, default=4096, help="essays for the throughput measurement")
+    parser.add_argument("--records", type=int, default=300, help="records graded through the graph")
+    parser.add_argument("--junk", type=float, default=0.3, help="fraction of junk records in the graded corpus")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    throughput(args.words, args.essays)
+    gate(args.records, args.junk, args.words, args.latency, args.concurrency)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,176 @@
+"""
+Reconnecting to a dropped evaluation: resuming the stream vs starting over.
+
+Launches backend/main.py (NDJSON) and backend/server.py (/ws) with FakeLLM. For each
+transport a client submits a failing essay with token streaming, drops the connection
+--drop-after seconds in, reconnects --offline seconds later and either
+
+    resumes   with the thread's resume token and the last "seq" it read, or
+    starts over with a new thread and the same essay, as a client without resume had to,
+
+and reads until the feedback arrives. Reports the time from reconnect to feedback,
+the lines / frames replayed on resume, and the LLM calls the server made for the essay
+(from /metrics; the dropped run is not cancelled, so starting over pays for it twice).
+
+    python benchmarks/bench_resume.py --latency 0.5 --drop-after 0.3 --offline 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ESSAY = "Growth and equity reinforce each other in a developing economy [[score:2]]. " * 30
+RESULTS = ("feedback", "complete")
+LLM_CALLS = re.compile(r"^essay_llm_call_duration_seconds_count\{.*\} (\d+)$", re.M)
+
+class Server:
+    def __init__(self, module, port, **settings):
+        self.module = module
+        self.port = port
+        self.settings = settings
+
+    def __enter__(self):
+        env = {**os.environ, "CHECKPOINTER": "memory", "TOPIC_POOL_SIZE": "0", "EVAL_CACHE": "0",
+               "EVAL_COALESCE": "0", "LLM_MAX_IN_FLIGHT": "100000", **self.settings}
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"{self.module}:app", "--app-dir", BENCH_DIR,
+             "--port", str(self.port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{self.port}"
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                if httpx.get(f"{url}/topic-pool").status_code == 200:
+                    return url
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"server at {url} did not start")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+async def llm_calls(client, url):
+    return sum(int(n) for n in LLM_CALLS.findall((await client.get(f"{url}/metrics")).text))
+
+async def read_for(lines, seconds):
+    """Reads NDJSON lines for `seconds`; returns the last seq seen."""
+    seq = 0
+
+    async def read():
+        nonlocal seq
+        async for line in lines:
+            seq = json.loads(line).get("seq", seq)
+
+    try:
+        await asyncio.wait_for(read(), seconds)
+    except asyncio.TimeoutError:
+        pass
+    return seq
+
+async def ndjson_once(url, drop_after, offline, resume):
+    async with httpx.AsyncClient(timeout=60) as client:
+        calls0 = await llm_calls(client, url)
+        started = (await client.post(f"{url}/start")).json()
+        body = {"thread_id": started["thread_id"], "essay_content": ESSAY, "stream_tokens": True}
+        async with client.stream("POST", f"{url}/submit-essay", json=body) as response:
+            token = response.headers["X-Resume-Token"]
+            seq = await read_for(response.aiter_lines(), drop_after)
+
+        await asyncio.sleep(offline)
+        t0 = time.perf_counter()
+        replayed = 0
+        if resume:
+            request = client.stream("GET", f"{url}/resume", params={"token": token, "after": seq})
+        else:
+            started = (await client.post(f"{url}/start")).json()
+            request = client.stream("POST", f"{url}/submit-essay",
+                                    json={**body, "thread_id": started["thread_id"]})
+        async with request as response:
+            async for line in response.aiter_lines():
+                event = json.loads(line)
+                if event["type"] == "resumed":
+                    replayed = event["replayed"]
+                if event["type"] == "update" and event["node"] == "generate_feedback":
+                    break
+        elapsed = time.perf_counter() - t0
+        # Let the dropped run finish before counting its calls
+        await asyncio.sleep(drop_after + 2)
+        return elapsed, replayed, await llm_calls(client, url) - calls0
+
+async def ws_frames(ws, types):
+    while True:
+        frame = json.loads(await ws.recv())
+        if frame["type"] in types:
+            return frame
+
+async def ws_once(url, drop_after, offline, resume):
+    ws_url = url.replace("http://", "ws://") + "/ws"
+    async with httpx.AsyncClient(timeout=60) as client:
+        calls0 = await llm_calls(client, url)
+        seq = 0
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            await ws.send(json.dumps({"action": "generate_topic", "session": "s"}))
+            token = (await ws_frames(ws, ("session",)))["resume_token"]
+            await ws_frames(ws, ("topic_generated",))
+            await ws.send(json.dumps({"action": "submit_essay", "session": "s", "essay": ESSAY,
+                                      "stream_tokens": True}))
+
+            async def read():
+                nonlocal seq
+                while True:
+                    seq = json.loads(await ws.recv()).get("seq", seq)
+
+            try:
+                await asyncio.wait_for(read(), drop_after)
+            except asyncio.TimeoutError:
+                pass
+
+        await asyncio.sleep(offline)
+        t0 = time.perf_counter()
+        replayed = 0
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            if resume:
+                await ws.send(json.dumps({"action": "resume", "session": "s", "token": token, "after": seq}))
+                replayed = (await ws_frames(ws, ("resumed",)))["replayed"]
+            else:
+                await ws.send(json.dumps({"action": "generate_topic", "session": "s"}))
+                await ws_frames(ws, ("topic_generated",))
+                await ws.send(json.dumps({"action": "submit_essay", "session": "s", "essay": ESSAY,
+                                          "stream_tokens": True}))
+            await ws_frames(ws, RESULTS)
+        elapsed = time.perf_counter() - t0
+        await asyncio.sleep(drop_after + 2)
+        return elapsed, replayed, await llm_calls(client, url) - calls0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="fake LLM delay per output word")
+    parser.add_argument("--drop-after", type=float, default=0.3, help="seconds into the evaluation to disconnect")
+    parser.add_argument("--offline", type=float, default=0.5, help="seconds between disconnect and reconnect")
+    parser.add_argument("--port", type=int, default=8161)
+    args = parser.parse_args()
+    fake = {"FAKE_LLM_LATENCY": str(args.latency), "FAKE_LLM_TOKEN_DELAY": str(args.token_delay)}
+
+    print(f"Failing essay with token streaming, connection dropped {args.drop_after}s into the evaluation "
+          f"for {args.offline}s")
+    print(f"  {'transport':<10} {'reconnect':<12} {'to feedback':>12} {'replayed':>9} {'LLM calls':>10}")
+    for label, module, once in (("ndjson", "fake_server", ndjson_once), ("websocket", "fake_ws_server", ws_once)):
+        with Server(module, args.port, **fake) as url:
+            for mode, resume in (("resume", True), ("start over", False)):
+                elapsed, replayed, calls = asyncio.run(once(url, args.drop_after, args.offline, resume))
+                print(f"  {label:<10} {mode:<12} {elapsed:>11.2f}s {replayed if resume else '-':>9} {calls:>10}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,73 @@
+"""
+Fail-path latency with SPECULATION off, early_fail and eager.
+
+Runs backend/graph.py in-process (async fan-out) with FakeLLM, evaluation cache
+and coalescing off, and evaluator latencies drawn from --latency-dist so the
+three scores arrive at different times. Each essay is scored, aggregated and,
+when it fails, given feedback. Three kinds of essay are graded:
+
+    hopeless    1/5 on every dimension: failing is certain after two scores
+    borderline  3/5 on every dimension: fails, but only the last score decides it (eager guesses it)
+    passing     4/5 on every dimension: failing never becomes certain, no feedback is started (the guess passes)
+
+    python benchmarks/bench_speculation.py --essays 200 --latency-dist lognormal:0.5,0.6
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("CHECKPOINTER", "memory")
+os.environ.setdefault("EVAL_CACHE", "0")
+os.environ.setdefault("EVAL_COALESCE", "0")
+os.environ.setdefault("LLM_MAX_IN_FLIGHT", "100000")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph
+from fake_llm import FakeLLM
+
+ESSAYS = {"hopeless": 1, "borderline": 3, "passing": 4}
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def grade(graph_app, score, number):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    await graph_app.aupdate_state(config, {"topic": "Growth and equity", "revision_count": 0,
+                                           "essay_content": f"[[score:{score}]] Essay {number}"},
+                                  as_node="collect_essay")
+    t0 = time.perf_counter()
+    await graph_app.ainvoke(None, config=config)
+    return time.perf_counter() - t0
+
+async def run(graph_app, score, essays):
+    return await asyncio.gather(*(grade(graph_app, score, n) for n in range(essays)))
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--essays", type=int, default=200, help="essays of each kind, graded concurrently")
+    parser.add_argument("--latency-dist", default="lognormal:0.5,0.6", help="FakeLLM latency distribution")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="per output word; sets feedback length")
+    args = parser.parse_args()
+
+    print(f"{args.essays} essays of each kind, latency {args.latency_dist}, token delay {args.token_delay}s")
+    print(f"  {'essay':<11} {'mode':<11} {'p50':>7} {'p95':>7} {'LLM calls':>10}")
+    for kind, score in ESSAYS.items():
+        for mode in ("off", "early_fail", "eager"):
+            llm = FakeLLM(latency_dist=args.latency_dist, token_delay=args.token_delay)
+            graph.llm = llm
+            graph_app = graph.build_workflow("async", "fanout", speculation=mode).compile(
+                checkpointer=MemorySaver(), interrupt_before=["collect_essay"])
+            latencies = asyncio.run(run(graph_app, score, args.essays))
+            print(f"  {kind:<11} {mode:<11} {percentile(latencies, 50):>6.2f}s {percentile(latencies, 95):>6.2f}s"
+                  f" {llm.calls / args.essays:>10.2f}")
+
+if __name__ == "__main__":
+    main_cli()
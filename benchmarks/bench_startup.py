@@ -0,0 +1,106 @@
+"""
+Cold start of the two FastAPI apps: import time and time to first request.
+
+1. Imports backend/graph.py, backend/main.py (NDJSON app) and backend/server.py
+   (WebSocket app) in fresh interpreters and reports the median import time,
+   and whether the Gemini client library was loaded by the import.
+2. Starts each app under uvicorn (through fake_server.py / fake_ws_server.py,
+   so the LLM is FakeLLM and the topic pool is off) and measures the time from
+   launching the process to the first completed request: POST /start for the
+   NDJSON app, a generate_topic action answered with topic_generated on /ws.
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "backend")
+
+IMPORT_PROBE = """
+import sys, time
+sys.path.insert(0, {backend!r})
+t0 = time.perf_counter()
+import {module}
+print(time.perf_counter() - t0, "langchain_google_genai" in sys.modules)
+"""
+
+def environment():
+    return {**os.environ, "GOOGLE_API_KEY": "offline-benchmark", "CHECKPOINTER": "memory",
+            "TOPIC_POOL_SIZE": "0", "FAKE_LLM_LATENCY": "0"}
+
+def import_time(module):
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE.format(backend=BACKEND_DIR, module=module)],
+                            env=environment(), cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    seconds, genai = output.stdout.split()[-2:]
+    return float(seconds), genai == "True"
+
+async def first_http_request(url, deadline):
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        while time.perf_counter() < deadline:
+            try:
+                response = await client.post("/start")
+                response.raise_for_status()
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.005)
+    raise RuntimeError(f"server at {url} did not answer")
+
+async def first_ws_request(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            ws = await websockets.connect(f"{url.replace('http', 'ws')}/ws")
+        except OSError:
+            await asyncio.sleep(0.005)
+            continue
+        async with ws:
+            await ws.send(json.dumps({"action": "generate_topic"}))
+            while json.loads(await ws.recv())["type"] != "topic_generated":
+                pass
+            return
+    raise RuntimeError(f"server at {url} did not answer")
+
+def first_request(module, port, timeout=60.0):
+    url = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--app-dir", BENCH_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        env=environment(), stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait = first_ws_request if module == "fake_ws_server" else first_http_request
+        asyncio.run(wait(url, t0 + timeout))
+        return time.perf_counter() - t0
+    finally:
+        server.terminate()
+        server.wait()
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8141)
+    args = parser.parse_args()
+
+    print(f"Import time (median of {args.repeat} fresh interpreters)")
+    print(f"  {'module':<8} {'import':>8}   Gemini client library loaded")
+    for module in ("graph", "main", "server"):
+        runs = [import_time(module) for _ in range(args.repeat)]
+        print(f"  {module:<8} {statistics.median(t for t, _ in runs) * 1000:>6.0f}ms   {runs[0][1]}")
+
+    print(f"\nProcess launch to first completed request (median of {args.repeat})")
+    for label, module in (("main.py   POST /start", "fake_server"), ("server.py /ws generate_topic", "fake_ws_server")):
+        runs = [first_request(module, args.port) for _ in range(args.repeat)]
+        print(f"  {label:<30} {statistics.median(runs) * 1000:>6.0f}ms  (min {min(runs) * 1000:.0f}ms)")
+
+if __name__ == "__main__":
+    main_cli()
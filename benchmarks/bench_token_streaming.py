@@ -0,0 +1,78 @@
+"""
+Time to first feedback byte on /submit-essay, with and without stream_tokens.
+
+Runs backend/main.py under uvicorn with FakeLLM (first-token latency plus a
+per-word delay) and measures, per submission, when the first generate_feedback
+line arrives -- counted from the request and from the aggregate_score line,
+which is when feedback generation starts.
+
+    python benchmarks/bench_token_streaming.py --latency 0.8 --token-delay 0.03
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ESSAY = "Growth and equity reinforce each other when institutions are inclusive. " * 20
+
+def measure(client, url, stream_tokens):
+    thread_id = client.post(f"{url}/start").json()["thread_id"]
+    payload = {"thread_id": thread_id, "essay_content": ESSAY, "stream_tokens": stream_tokens}
+    t0 = time.perf_counter()
+    aggregated = first_feedback = None
+    with client.stream("POST", f"{url}/submit-essay", json=payload) as response:
+        for line in response.iter_lines():
+            if not line.strip():
+                continue
+            node = json.loads(line)["node"]
+            now = time.perf_counter() - t0
+            if node == "aggregate_score" and aggregated is None:
+                aggregated = now
+            if node == "generate_feedback" and first_feedback is None:
+                first_feedback = now
+    return first_feedback, first_feedback - aggregated
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.8, help="fake time to first token (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="fake delay per output word (seconds)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8111)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "CHECKPOINT_DB": os.path.join(tmp, "bench.sqlite"), "EVAL_CACHE": "0",
+               "FAKE_LLM_LATENCY": str(args.latency), "FAKE_LLM_TOKEN_DELAY": str(args.token_delay)}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fake_server:app", "--app-dir", BENCH_DIR,
+             "--port", str(args.port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{args.port}"
+        try:
+            with httpx.Client(timeout=120) as client:
+                for _ in range(150):
+                    try:
+                        client.get(f"{url}/topic-pool")
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.2)
+                print(f"{'mode':>10} {'from_request':>13} {'from_aggregate':>15}")
+                for stream_tokens in (False, True):
+                    results = [measure(client, url, stream_tokens) for _ in range(args.runs)]
+                    print(f"{'tokens' if stream_tokens else 'updates':>10} "
+                          f"{statistics.median(r[0] for r in results):>12.2f}s "
+                          f"{statistics.median(r[1] for r in results):>14.2f}s")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main_cli()
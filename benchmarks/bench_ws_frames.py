@@ -0,0 +1,127 @@
+"""
+WebSocket frame size and serialization time: the JSON protocol vs the compact protocol.
+
+Records the events of real sessions (topic, then --revisions failing drafts and
+a passing one) from the graph with FakeLLM, with and without token streaming,
+then replays them through backend/ws_protocol.py as each protocol would send
+them. Events that arrived within --coalesce-ms of each other share a compact
+frame, as in backend/server.py.
+
+    python benchmarks/bench_ws_frames.py --words 1500 --revisions 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("CHECKPOINTER", "memory")
+os.environ.setdefault("EVAL_CACHE", "0")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph
+from fake_llm import FakeLLM
+from streaming import stream_graph
+import ws_protocol
+from ws_protocol import FrameEncoder
+
+def make_essay(words: int, number: int, passing: bool) -> str:
+    base = "Inclusive growth requires investment in health education and institutions ".split()
+    body = " ".join(base[i % len(base)] for i in range(words))
+    return f"Draft {number} [[score:{4 if passing else 2}]] {body}"
+
+async def record_session(graph_app, words, revisions, stream_tokens):
+    """Returns a list of runs; each run is ([(arrival, event)], result frame)."""
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    runs = []
+
+    async def run(graph_input):
+        events = []
+        async for event in stream_graph(graph_app, graph_input, config, stream_tokens=stream_tokens):
+            events.append((time.perf_counter(), event))
+        return events
+
+    events = await run({})
+    state = await graph_app.aget_state(config)
+    runs.append((events, {"type": "topic_generated", "topic": state.values.get("topic")}))
+    for number in range(revisions + 1):
+        passing = number == revisions
+        await graph_app.aupdate_state(config, {"essay_content": make_essay(words, number, passing)},
+                                      as_node="collect_essay")
+        events = await run(None)
+        state = await graph_app.aget_state(config)
+        if state.next:
+            result = {"type": "feedback", "feedback": state.values.get("feedback")}
+        else:
+            result = {"type": "complete", "score": state.values.get("total_score"),
+                      "feedback": state.values.get("feedback", "No feedback")}
+        runs.append((events, result))
+    return runs
+
+def group(events, window):
+    groups = []
+    for arrived, event in events:
+        if groups and arrived - groups[-1][0] <= window:
+            groups[-1][1].append(event)
+        else:
+            groups.append((arrived, [event]))
+    return [events for _, events in groups]
+
+def frames_for(runs, protocol, encoding, window):
+    encoder = FrameEncoder(protocol, encoding, window * 1000)
+    frames = []
+    for events, result in runs:
+        if encoder.compact:
+            for events_in_frame in group(events, window):
+                frame = encoder.batch(events_in_frame)
+                if frame is not None:
+                    frames.append(frame)
+        else:
+            frames.extend(encoder.legacy(event) for _, event in events)
+        frames.append(encoder.result(result))
+    return encoder, frames
+
+def measure(runs, protocol, encoding, window, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        encoder, frames = frames_for(runs, protocol, encoding, window)
+        payloads = [encoder.encode(frame) for frame in frames]
+    elapsed = (time.perf_counter() - t0) / repeat
+    size = sum(len(p.encode() if isinstance(p, str) else p) for p in payloads)
+    return len(payloads), size, elapsed
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=1500)
+    parser.add_argument("--revisions", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    parser.add_argument("--coalesce-ms", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=200, help="encodings per measurement")
+    args = parser.parse_args()
+
+    graph.llm = FakeLLM(latency=args.latency, token_delay=args.token_delay)
+    graph_app = graph.build_workflow("async").compile(checkpointer=MemorySaver(), interrupt_before=["collect_essay"])
+    window = args.coalesce_ms / 1000
+
+    variants = [("json", "json"), ("compact", "json")]
+    if ws_protocol.msgpack is not None:
+        variants.append(("compact", "msgpack"))
+    for stream_tokens in (False, True):
+        runs = asyncio.run(record_session(graph_app, args.words, args.revisions, stream_tokens))
+        print(f"\nSession with {args.revisions} failing drafts + 1 passing, {args.words} words, "
+              f"stream_tokens={stream_tokens}")
+        print(f"  {'protocol':<18} {'frames':>7} {'bytes':>9} {'encode time':>12}")
+        baseline = None
+        for protocol, encoding in variants:
+            count, size, elapsed = measure(runs, protocol, encoding, window, args.repeat)
+            baseline = baseline or (size, elapsed)
+            print(f"  {protocol + '/' + encoding:<18} {count:>7} {size:>9} {elapsed * 1e6:>9.0f} us"
+                  f"   ({size / baseline[0] * 100:5.1f}% bytes, {elapsed / baseline[1] * 100:5.1f}% time)")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,198 @@
+"""
+Multiplexed /ws sessions: concurrency on one socket, slow consumers and cancellation.
+
+Launches backend/server.py with FakeLLM (fake_ws_server.py) and measures:
+
+1. --sessions essay sessions (topic, then one submission) on a single socket, one
+   action at a time as the original protocol allowed, and multiplexed with a
+   session id per message.
+2. A slow client: --sessions sessions stream tokens at once to a socket that takes
+   --send-delay seconds per frame (run in-process, as socket buffers would hide a
+   slow reader on loopback), with an effectively unbounded outbox and with outboxes
+   of --queue items under the "coalesce" and "drop" policies: frames sent, the
+   largest outbox, when the graph runs finished and when the last result arrived.
+3. Cancelling a submission --cancel-after seconds in: time until the "cancelled"
+   frame, and time for the next submission on the same session to finish.
+
+    python benchmarks/bench_ws_multiplex.py --sessions 8 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ESSAY = "Growth and equity reinforce each other in a developing economy [[score:2]]. " * 30
+RESULTS = ("feedback", "complete")
+
+class SlowSocket:
+    """Stands in for a client that takes `delay` seconds to accept each frame."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.frames = 0
+        self.results = 0
+
+    async def send_text(self, payload):
+        await asyncio.sleep(self.delay)
+        self.frames += 1
+        self.results += json.loads(payload)["type"] in RESULTS
+
+    send_bytes = send_text
+
+def launch(port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fake_ws_server:app", "--app-dir", BENCH_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+def wait_ready(url, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/topic-pool").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+class Server:
+    def __init__(self, port, **settings):
+        self.port = port
+        self.settings = settings
+
+    def __enter__(self):
+        env = {**os.environ, "CHECKPOINTER": "memory", "TOPIC_POOL_SIZE": "0", "EVAL_CACHE": "0",
+               "EVAL_COALESCE": "0", "LLM_MAX_IN_FLIGHT": "100000", **self.settings}
+        self.process = launch(self.port, env)
+        wait_ready(f"http://127.0.0.1:{self.port}")
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+async def until(ws, types, session=None):
+    """Reads frames until one of `types` arrives for `session`; returns (that frame, frames read)."""
+    frames = 0
+    while True:
+        frame = json.loads(await ws.recv())
+        frames += 1
+        if frame["type"] in types and frame.get("session") == session:
+            return frame, frames
+
+async def sequential(url, sessions):
+    t0 = time.perf_counter()
+    for _ in range(sessions):
+        async with websockets.connect(url, max_size=None) as ws:
+            await ws.send(json.dumps({"action": "generate_topic"}))
+            await until(ws, ("topic_generated",))
+            await ws.send(json.dumps({"action": "submit_essay", "essay": ESSAY}))
+            await until(ws, RESULTS)
+    return time.perf_counter() - t0
+
+async def multiplexed(url, sessions):
+    async with websockets.connect(url, max_size=None) as ws:
+        t0 = time.perf_counter()
+        for n in range(sessions):
+            await ws.send(json.dumps({"action": "generate_topic", "session": str(n)}))
+            await ws.send(json.dumps({"action": "submit_essay", "session": str(n), "essay": ESSAY}))
+        finished = 0
+        while finished < sessions:
+            if json.loads(await ws.recv())["type"] in RESULTS:
+                finished += 1
+        return time.perf_counter() - t0
+
+async def slow_consumer(sessions, send_delay, queue, policy, latency, token_delay):
+    import graph
+    import server
+    from fake_llm import FakeLLM
+    from ws_sessions import SessionMux
+
+    graph.llm = FakeLLM(latency=latency, token_delay=token_delay)
+    socket = SlowSocket(send_delay)
+    mux = SessionMux(socket, server.run_action, server.snapshot, max_sessions=sessions, queue_limit=queue,
+                     policy=policy)
+    for n in range(sessions):
+        await mux.dispatch({"action": "generate_topic", "session": str(n)})
+    await asyncio.gather(*(s.task for s in mux.sessions.values()))
+    # Let the sessions copy the topic frames into their outboxes, then discard them
+    await asyncio.sleep(0.01)
+    for session in mux.sessions.values():
+        session.outbox.items.clear()
+    t0 = time.perf_counter()
+    mux.start()
+    for n in range(sessions):
+        await mux.dispatch({"action": "submit_essay", "session": str(n), "essay": ESSAY, "stream_tokens": True})
+    peak = 0
+    runs_done = None
+    while socket.results < sessions:
+        peak = max(peak, max(len(s.outbox) for s in mux.sessions.values()))
+        if runs_done is None and all(s.task.done() for s in mux.sessions.values()):
+            runs_done = time.perf_counter() - t0
+        await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - t0
+    await mux.stop()
+    return socket.frames, peak, runs_done or delivered, delivered
+
+async def cancel_then_resubmit(url, cancel_after):
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"action": "generate_topic", "session": "s"}))
+        await until(ws, ("topic_generated",), "s")
+        await ws.send(json.dumps({"action": "submit_essay", "session": "s", "essay": ESSAY}))
+        await asyncio.sleep(cancel_after)
+        t0 = time.perf_counter()
+        await ws.send(json.dumps({"action": "cancel", "session": "s"}))
+        frame, _ = await until(ws, ("cancelled",), "s")
+        cancelled = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        await ws.send(json.dumps({"action": "submit_essay", "session": "s", "essay": ESSAY}))
+        await until(ws, RESULTS, "s")
+        return frame["active"], cancelled, time.perf_counter() - t0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency per call (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.001, help="fake LLM delay per output word")
+    parser.add_argument("--send-delay", type=float, default=0.01, help="slow client: seconds per frame")
+    parser.add_argument("--queue", type=int, default=16, help="bounded outbox size (WS_SESSION_QUEUE)")
+    parser.add_argument("--cancel-after", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8151)
+    args = parser.parse_args()
+    fake = {"FAKE_LLM_LATENCY": str(args.latency), "FAKE_LLM_TOKEN_DELAY": str(args.token_delay)}
+
+    with Server(args.port, **fake) as url:
+        one_at_a_time = asyncio.run(sequential(url, args.sessions))
+        concurrent = asyncio.run(multiplexed(url, args.sessions))
+    print(f"{args.sessions} sessions (topic + one submission) over one socket")
+    print(f"  one action at a time   {one_at_a_time:>6.2f}s")
+    print(f"  multiplexed            {concurrent:>6.2f}s")
+
+    sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "backend"))
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ.update({"CHECKPOINTER": "memory", "TOPIC_POOL_SIZE": "0", "EVAL_CACHE": "0", "EVAL_COALESCE": "0",
+                       "LLM_MAX_IN_FLIGHT": "100000"})
+    print(f"\n{args.sessions} sessions streaming tokens to a client that takes {args.send_delay * 1000:.0f}ms per frame")
+    print(f"  {'outbox':<16} {'frames':>7} {'largest outbox':>15} {'runs done':>10} {'last result':>12}")
+    for label, queue, policy in (("unbounded", 100000, "coalesce"), (f"{args.queue}, coalesce", args.queue, "coalesce"),
+                                 (f"{args.queue}, drop", args.queue, "drop")):
+        frames, peak, runs_done, delivered = asyncio.run(slow_consumer(
+            args.sessions, args.send_delay, queue, policy, args.latency, args.token_delay))
+        print(f"  {label:<16} {frames:>7} {peak:>15} {runs_done:>9.2f}s {delivered:>11.2f}s")
+
+    with Server(args.port, **fake) as url:
+        active, cancelled, resubmit = asyncio.run(cancel_then_resubmit(url, args.cancel_after))
+    print(f"\nCancel {args.cancel_after}s into a submission: 'cancelled' after {cancelled * 1000:.0f}ms "
+          f"(run was active: {active}); next submission finished in {resubmit:.2f}s")
+
+if __name__ == "__main__":
+    main_cli()
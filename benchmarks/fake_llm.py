@@ -0,0 +1,221 @@
+import asyncio
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, List, Optional
+from pydantic import PrivateAttr
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FEEDBACK = (
+    "- Strengthen your argument with concrete evidence such as recent data, committee reports "
+    "or case studies, and explain how each example supports the central claim of the essay.\n"
+    "- Give the essay a clearer structure: an introduction that frames the question, body "
+    "paragraphs that each take one dimension, and a conclusion that offers a balanced way forward.\n"
+    "- Broaden the analysis to cover the social, political and economic dimensions of the topic "
+    "and use more precise vocabulary in place of general phrases."
+)
+
+# Essays can pin their fake score with a marker, e.g. "[[score:4]]" -> 4 on every dimension.
+# Load tests use it to script the fail -> feedback -> resubmit -> pass loop.
+SCORE_MARKER = re.compile(r"\[\[score:(\d)\]\]")
+
+class FakeRateLimitError(Exception):
+    """Raised like Gemini's 429 RESOURCE_EXHAUSTED when FakeLLM.max_concurrent is exceeded."""
+
+class LatencyModel:
+    """
+    Samples call latencies from a spec string:
+        "fixed:0.5"            always 0.5 s
+        "uniform:0.2,0.8"      uniform between 0.2 and 0.8 s
+        "normal:0.5,0.1"       mean 0.5 s, std 0.1 s (clipped at 0)
+        "lognormal:0.5,0.6"    median 0.5 s, sigma 0.6 -- long tail, closest to real LLM APIs
+    """
+
+    def __init__(self, spec: str, seed: Optional[int] = None):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec!r}")
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return self._random.uniform(*self.args)
+        if self.kind == "normal":
+            return max(0.0, self._random.gauss(*self.args))
+        median, sigma = self.args
+        return self._random.lognormvariate(0, sigma) * median
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini-style token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+def prompt_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(m.content if isinstance(m.content, str) else str(m.content) for m in messages)
+
+class FakeLLM(BaseChatModel):
+    """
+    Offline stand-in for ChatGoogleGenerativeAI.
+
+    Answers the essay prompts with canned text. A call waits `latency` seconds
+    (or a sample from latency_dist, see LatencyModel), plus latency_per_1k_tokens
+    per 1k prompt tokens, before the first token. It then waits token_delay
+    seconds per output word. It blocks in invoke() and yields to the event loop
+    in ainvoke(). When LangGraph streams messages, the answer arrives word by
+    word. Scores are `score`, unless the essay carries a SCORE_MARKER. Token usage
+    is estimated from the prompt and reported on usage_metadata. With max_concurrent
+    set, calls beyond that many in flight fail with FakeRateLimitError (a 429).
+    """
+
+    latency: float = 0.5
+    latency_dist: Optional[str] = None
+    latency_per_1k_tokens: float = 0.0
+    token_delay: float = 0.0
+    score: int = 3
+    max_concurrent: int = 0
+    rate_limited: int = 0
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    _latency_model: Optional[LatencyModel] = PrivateAttr(default=None)
+    _active: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-essay-llm"
+
+    @classmethod
+    def from_env(cls):
+        """Configured by FAKE_LLM_LATENCY, FAKE_LLM_LATENCY_DIST, FAKE_LLM_TOKEN_DELAY, FAKE_LLM_SCORE
+        and FAKE_LLM_MAX_CONCURRENT."""
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.05")),
+            latency_dist=os.getenv("FAKE_LLM_LATENCY_DIST") or None,
+            token_delay=float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0")),
+            score=int(os.getenv("FAKE_LLM_SCORE", "3")),
+            max_concurrent=int(os.getenv("FAKE_LLM_MAX_CONCURRENT", "0")),
+        )
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        self._latency_model = LatencyModel(self.latency_dist) if self.latency_dist else None
+
+    def score_for(self, prompt: str) -> int:
+        match = SCORE_MARKER.search(prompt)
+        return int(match.group(1)) if match else self.score
+
+    def _record(self, prompt: str, output: str):
+        self.calls += 1
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(output)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    @contextmanager
+    def quota(self):
+        """Counts the call as in flight, failing it like a 429 past max_concurrent."""
+        if self.max_concurrent and self._active >= self.max_concurrent:
+            self.rate_limited += 1
+            raise FakeRateLimitError("429 RESOURCE_EXHAUSTED: quota exceeded for requests per minute")
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+
+    def delay(self, prompt) -> float:
+        """Time to first token for this prompt."""
+        base = self._latency_model.sample() if self._latency_model else self.latency
+        return base + estimate_tokens(prompt_text(prompt)) / 1000 * self.latency_per_1k_tokens
+
+    def answer(self, prompt: str) -> str:
+        if "essay topic" in prompt:
+            return "Is economic growth without social equity sustainable?"
+        if "Score it out of 5" in prompt:
+            return str(self.score_for(prompt))
+        return FEEDBACK
+
+    def _result(self, prompt: str, output: str) -> ChatResult:
+        message = AIMessage(content=output, usage_metadata=self._record(prompt, output))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = prompt_text(messages)
+        output = self.answer(prompt)
+        with self.quota():
+            time.sleep(self.delay(prompt) + len(output.split()) * self.token_delay)
+        return self._result(prompt, output)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = prompt_text(messages)
+        output = self.answer(prompt)
+        with self.quota():
+            await asyncio.sleep(self.delay(prompt) + len(output.split()) * self.token_delay)
+        return self._result(prompt, output)
+
+    def _chunks(self, prompt: str, output: str):
+        words = output.split(" ")
+        for i, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._record(prompt, output)))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = prompt_text(messages)
+        with self.quota():
+            time.sleep(self.delay(prompt))
+            for chunk in self._chunks(prompt, self.answer(prompt)):
+                yield chunk
+                time.sleep(self.token_delay)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = prompt_text(messages)
+        with self.quota():
+            await asyncio.sleep(self.delay(prompt))
+            for chunk in self._chunks(prompt, self.answer(prompt)):
+                yield chunk
+                await asyncio.sleep(self.token_delay)
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        return FakeStructuredLLM(parent=self, schema=schema, include_raw=include_raw)
+
+class FakeStructuredLLM:
+    """Structured-output runnable returned by FakeLLM.with_structured_output()."""
+
+    def __init__(self, parent: FakeLLM, schema, include_raw: bool = False):
+        self.parent = parent
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _respond(self, prompt):
+        score = self.parent.score_for(prompt_text(prompt))
+        result = self.schema(**{name: score for name in self.schema.model_fields})
+        output = result.model_dump_json()
+        usage = self.parent._record(prompt_text(prompt), output)
+        if self.include_raw:
+            raw = AIMessage(content=output, usage_metadata=usage)
+            return {"raw": raw, "parsed": result, "parsing_error": None}
+        return result
+
+    def invoke(self, prompt, *args, **kwargs):
+        with self.parent.quota():
+            time.sleep(self.parent.delay(prompt))
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        with self.parent.quota():
+            await asyncio.sleep(self.parent.delay(prompt))
+        return self._respond(prompt)
@@ -0,0 +1,20 @@
+"""
+ASGI entry point for backend/server.py (the /ws app) with the Gemini client
+replaced by FakeLLM.
+
+    uvicorn fake_ws_server:app --app-dir benchmarks --port 8001
+
+The fake is configured from FAKE_LLM_* environment variables (see FakeLLM.from_env).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+import graph
+from fake_llm import FakeLLM
+
+graph.llm = FakeLLM.from_env()
+
+from server import app
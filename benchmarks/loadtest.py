@@ -0,0 +1,258 @@
+"""
+Offline load test for both transports, with the Gemini client replaced by FakeLLM.
+
+Starts backend/main.py (NDJSON) and backend/server.py (/ws) under uvicorn with
+fake_server.py / fake_ws_server.py, then drives --clients concurrent closed-loop
+clients through complete sessions:
+
+    HTTP: POST /start -> POST /submit-essay (fails, feedback) x --revisions -> POST /submit-essay (passes)
+    WS:   generate_topic -> submit_essay (feedback) x --revisions -> submit_essay (complete)
+
+Drafts carry a [[score:N]] marker so FakeLLM fails them until the last one.
+Reports p50/p95/p99 per request, per graph node (measured from the stream:
+time between a node's update and the updates of the nodes it waits on) and end
+to end, plus throughput. --save writes the report as a JSON baseline; --compare
+prints the change against a saved baseline.
+
+    python benchmarks/loadtest.py --clients 20 --sessions 200 --latency-dist lognormal:0.3,0.5 --save baseline.json
+    python benchmarks/loadtest.py --clients 20 --sessions 200 --latency-dist lognormal:0.3,0.5 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BODY = "Inclusive growth needs investment in health, education and accountable institutions. " * 25
+
+# Nodes each graph node waits on; a node's latency is measured from the latest of these
+PARENTS = {
+    "eval_clarity": ["collect_essay"],
+    "eval_depth": ["collect_essay"],
+    "eval_vocab": ["collect_essay"],
+    "eval_fused": ["collect_essay"],
+    "aggregate_score": ["eval_clarity", "eval_depth", "eval_vocab", "eval_fused"],
+    "generate_feedback": ["aggregate_score"],
+}
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, name, seconds):
+        self.latencies[name].append(seconds)
+
+    def add_nodes(self, started, events):
+        """events: [(arrival_time, node)] from one streamed run."""
+        seen = {}
+        for arrived, node in events:
+            if node.startswith("__"):
+                continue
+            parents = [seen[p] for p in PARENTS.get(node, []) if p in seen]
+            self.add(f"node.{node}", arrived - max(parents, default=started))
+            seen[node] = arrived
+
+    def summary(self):
+        return {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for name, values in sorted(self.latencies.items())
+        }
+
+def draft(session_id, number, revisions):
+    score = 3 if number < revisions else 4
+    return f"Session {session_id}, draft {number} [[score:{score}]]. {BODY}"
+
+async def http_session(client, recorder, session_id, revisions):
+    t0 = time.perf_counter()
+    response = await client.post("/start")
+    response.raise_for_status()
+    thread_id = response.json()["thread_id"]
+    recorder.add("http.start", time.perf_counter() - t0)
+    for number in range(revisions + 1):
+        started = time.perf_counter()
+        events = []
+        payload = {"thread_id": thread_id, "essay_content": draft(session_id, number, revisions)}
+        async with client.stream("POST", "/submit-essay", json=payload) as stream:
+            stream.raise_for_status()
+            async for line in stream.aiter_lines():
+                if line.strip():
+                    events.append((time.perf_counter(), json.loads(line)["node"]))
+        recorder.add("http.submit", time.perf_counter() - started)
+        recorder.add_nodes(started, events)
+        got_feedback = any(node == "generate_feedback" for _, node in events)
+        if got_feedback != (number < revisions):
+            raise AssertionError(f"draft {number}: unexpected path {[n for _, n in events]}")
+    recorder.add("session.http", time.perf_counter() - t0)
+
+async def ws_run(ws, message, until):
+    """Sends one action and collects update frames until a frame of a type in `until` arrives."""
+    started = time.perf_counter()
+    events = []
+    await ws.send(json.dumps(message))
+    while True:
+        frame = json.loads(await ws.recv())
+        if frame["type"] == "update":
+            events.append((time.perf_counter(), frame["node"]))
+        elif frame["type"] == "error":
+            raise RuntimeError(frame["message"])
+        elif frame["type"] in until:
+            return started, events, frame
+
+async def ws_session(url, recorder, session_id, revisions):
+    t0 = time.perf_counter()
+    async with websockets.connect(url, max_size=None) as ws:
+        started, events, _ = await ws_run(ws, {"action": "generate_topic"}, {"topic_generated"})
+        recorder.add("ws.generate_topic", time.perf_counter() - started)
+        recorder.add_nodes(started, events)
+        for number in range(revisions + 1):
+            message = {"action": "submit_essay", "essay": draft(session_id, number, revisions)}
+            started, events, frame = await ws_run(ws, message, {"feedback", "complete"})
+            recorder.add("ws.submit", time.perf_counter() - started)
+            recorder.add_nodes(started, events)
+            expected = "feedback" if number < revisions else "complete"
+            if frame["type"] != expected:
+                raise AssertionError(f"draft {number}: expected {expected}, got {frame['type']}")
+    recorder.add("session.ws", time.perf_counter() - t0)
+
+async def drive(transport, base_url, clients, sessions, revisions):
+    recorder = Recorder()
+    counter = iter(range(sessions))
+
+    async def client_loop(client):
+        for session_id in counter:
+            try:
+                if transport == "http":
+                    await http_session(client, recorder, session_id, revisions)
+                else:
+                    await ws_session(f"{base_url.replace('http', 'ws')}/ws", recorder, session_id, revisions)
+            except Exception as error:
+                recorder.errors[type(error).__name__] += 1
+                print(f"[{transport}] session {session_id} failed: {error!r}")
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        elapsed = time.perf_counter() - t0
+    completed = len(recorder.latencies.get(f"session.{transport}", []))
+    return {
+        "sessions": completed,
+        "errors": dict(recorder.errors),
+        "elapsed": elapsed,
+        "sessions_per_sec": completed / elapsed,
+        "requests_per_sec": completed * (revisions + 2) / elapsed,
+        "latency": recorder.summary(),
+    }
+
+def launch(module, port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--app-dir", BENCH_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+def wait_ready(url, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/topic-pool").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+def print_report(report):
+    for transport, result in report["results"].items():
+        print(f"\n[{transport}] {result['sessions']} sessions in {result['elapsed']:.1f}s  "
+              f"{result['sessions_per_sec']:.2f} sessions/s  {result['requests_per_sec']:.2f} req/s  "
+              f"errors={result['errors'] or 0}")
+        print(f"  {'metric':<26} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for name, stats in result["latency"].items():
+            print(f"  {name:<26} {stats['count']:>6} {stats['p50']:>7.3f}s {stats['p95']:>7.3f}s {stats['p99']:>7.3f}s")
+
+def print_comparison(report, baseline):
+    print("\nChange vs baseline (negative is faster):")
+    for transport, result in report["results"].items():
+        base = baseline["results"].get(transport)
+        if not base:
+            continue
+        change = (result["sessions_per_sec"] - base["sessions_per_sec"]) / base["sessions_per_sec"] * 100
+        print(f"[{transport}] throughput {base['sessions_per_sec']:.2f} -> {result['sessions_per_sec']:.2f} "
+              f"sessions/s ({change:+.1f}%)")
+        for name, stats in result["latency"].items():
+            if name not in base["latency"]:
+                continue
+            deltas = []
+            for pct in ("p50", "p95", "p99"):
+                old, new = base["latency"][name][pct], stats[pct]
+                deltas.append(f"{pct} {old:.3f}->{new:.3f}s ({(new - old) / old * 100 if old else 0:+.1f}%)")
+            print(f"  {name:<26} " + "  ".join(deltas))
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=["http", "ws", "both"], default="both")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent closed-loop clients")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions per transport")
+    parser.add_argument("--revisions", type=int, default=1, help="failing drafts before the passing one")
+    parser.add_argument("--latency-dist", default="lognormal:0.3,0.5", help="FakeLLM latency distribution")
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--http-port", type=int, default=8121)
+    parser.add_argument("--ws-port", type=int, default=8122)
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    args = parser.parse_args()
+
+    transports = ["http", "ws"] if args.transport == "both" else [args.transport]
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")}, "results": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "CHECKPOINT_DB": os.path.join(tmp, "loadtest.sqlite"),
+               "FAKE_LLM_LATENCY_DIST": args.latency_dist, "FAKE_LLM_TOKEN_DELAY": str(args.token_delay)}
+        servers = {}
+        try:
+            if "http" in transports:
+                servers["http"] = (launch("fake_server", args.http_port, env), f"http://127.0.0.1:{args.http_port}")
+            if "ws" in transports:
+                servers["ws"] = (launch("fake_ws_server", args.ws_port, env), f"http://127.0.0.1:{args.ws_port}")
+            for transport in transports:
+                url = servers[transport][1]
+                wait_ready(url)
+                report["results"][transport] = asyncio.run(
+                    drive(transport, url, args.clients, args.sessions, args.revisions)
+                )
+        finally:
+            for process, _ in servers.values():
+                process.terminate()
+                process.wait()
+
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+if __name__ == "__main__":
+    main_cli()
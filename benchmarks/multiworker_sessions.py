@@ -0,0 +1,102 @@
+"""
+Multi-worker session check: start, submit and resubmit each land on a different worker.
+
+Launches --workers separate uvicorn processes of backend/main.py (with FakeLLM),
+all pointed at one shared SQLite checkpoint file, then routes every step of each
+session to the next worker round-robin. Then submits a draft of --concurrent sessions
+to two workers at the same moment: the run lease in the shared checkpointer must let
+exactly one of them run (the other gets a 409). Exits non-zero if any worker fails to
+resume a thread that another worker created, or if both concurrent submissions ran.
+
+    python benchmarks/multiworker_sessions.py --workers 3 --sessions 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ESSAY = "Growth and equity reinforce each other when institutions are inclusive. " * 20
+
+def launch(port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fake_server:app", "--app-dir", BENCH_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+def wait_ready(client, url, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if client.get(f"{url}/topic-pool").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"worker at {url} did not start")
+
+def submit(client, url, thread_id):
+    response = client.post(f"{url}/submit-essay", json={"thread_id": thread_id, "essay_content": ESSAY})
+    response.raise_for_status()
+    return [json.loads(line)["node"] for line in response.text.splitlines() if line.strip()]
+
+def submit_status(client, url, thread_id):
+    response = client.post(f"{url}/submit-essay", json={"thread_id": thread_id, "essay_content": ESSAY})
+    return response.status_code
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--concurrent", type=int, default=10, help="sessions submitted to two workers at once")
+    parser.add_argument("--base-port", type=int, default=8101)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "CHECKPOINTER": "sqlite", "CHECKPOINT_DB": os.path.join(tmp, "shared.sqlite"),
+               "FAKE_LLM_LATENCY": "0.02", "EVAL_CACHE": "0"}
+        urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.workers)]
+        workers = [launch(args.base_port + i, env) for i in range(args.workers)]
+        failures = 0
+        try:
+            with httpx.Client(timeout=60) as client:
+                for url in urls:
+                    wait_ready(client, url)
+                for n in range(args.sessions):
+                    start_url, submit_url, resubmit_url = (urls[(n + k) % len(urls)] for k in range(3))
+                    thread_id = client.post(f"{start_url}/start").json()["thread_id"]
+                    try:
+                        # The fake LLM scores 3/3/3, so both submissions fail and loop through feedback
+                        for url in (submit_url, resubmit_url):
+                            nodes = submit(client, url, thread_id)
+                            assert "aggregate_score" in nodes and "generate_feedback" in nodes, nodes
+                    except (httpx.HTTPStatusError, AssertionError) as error:
+                        failures += 1
+                        print(f"session {thread_id}: {start_url} -> {submit_url} -> {resubmit_url} failed: {error}")
+                doubled = 0
+                with ThreadPoolExecutor(2) as pool:
+                    for n in range(args.concurrent):
+                        thread_id = client.post(f"{urls[0]}/start").json()["thread_id"]
+                        pair = (urls[n % len(urls)], urls[(n + 1) % len(urls)])
+                        statuses = sorted(pool.map(lambda url: submit_status(client, url, thread_id), pair))
+                        if statuses != [200, 409]:
+                            doubled += statuses == [200, 200]
+                            print(f"session {thread_id}: concurrent submissions to {pair} got {statuses}")
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.wait()
+
+    print(f"{args.sessions - failures}/{args.sessions} sessions resumed across {args.workers} workers")
+    print(f"{args.concurrent - doubled}/{args.concurrent} concurrent submissions to two workers ran once")
+    sys.exit(1 if failures or doubled else 0)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,86 @@
+"""
+Checkpointer soak: resident memory over tens of thousands of sessions.
+
+Every session is a fresh thread_id that generates a topic, submits an essay,
+receives feedback and never comes back -- the same pattern as one WebSocket
+connection to backend/server.py. With the bounded checkpointers, RSS should
+level off once max_threads is reached; the unbounded MemorySaver keeps growing.
+
+    python benchmarks/soak_checkpointer.py --backend sqlite --sessions 20000
+    python benchmarks/soak_checkpointer.py --backend unbounded --sessions 20000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import eval_cache
+import graph
+from checkpointer import BoundedMemorySaver, BoundedSqliteSaver
+from fake_llm import FakeLLM
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak RSS only, but the best portable fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def session(app, index):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    async for _ in app.astream({}, config=config):
+        pass
+    essay = f"Draft {index}: growth must be inclusive to be sustainable. " * 20
+    await app.aupdate_state(config, {"essay_content": essay}, as_node="collect_essay")
+    async for _ in app.astream(None, config=config):
+        pass
+
+async def soak(checkpointer, sessions, concurrency, report_every):
+    app = graph.build_workflow("async").compile(checkpointer=checkpointer, interrupt_before=["collect_essay"])
+    t0 = time.perf_counter()
+    done = 0
+    print(f"{'sessions':>9} {'rss_mb':>8} {'threads':>8} {'elapsed':>8}")
+    while done < sessions:
+        batch = min(concurrency, sessions - done)
+        await asyncio.gather(*(session(app, done + i) for i in range(batch)))
+        done += batch
+        if done % report_every < batch or done == sessions:
+            threads = checkpointer.thread_count() if hasattr(checkpointer, "thread_count") else len(checkpointer.storage)
+            print(f"{done:>9} {rss_mb():>8.1f} {threads:>8} {time.perf_counter() - t0:>7.1f}s")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "memory", "unbounded"], default="sqlite")
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--max-threads", type=int, default=1000)
+    parser.add_argument("--max-versions", type=int, default=5)
+    parser.add_argument("--report-every", type=int, default=2000)
+    args = parser.parse_args()
+
+    graph.llm = FakeLLM(latency=0)
+    # Essays differ per session; keep the evaluation cache out of the measurement
+    eval_cache.CACHE_ENABLED = False
+    limits = {"max_threads": args.max_threads, "max_versions": args.max_versions, "sweep_interval": 1.0}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.backend == "sqlite":
+            checkpointer = BoundedSqliteSaver.from_path(os.path.join(tmp, "soak.sqlite"), **limits)
+        elif args.backend == "memory":
+            checkpointer = BoundedMemorySaver(**limits)
+        else:
+            checkpointer = MemorySaver()
+        asyncio.run(soak(checkpointer, args.sessions, args.concurrency, args.report_every))
+
+if __name__ == "__main__":
+    main_cli()
@@ -56,13 +56,20 @@ function App() {
   const eventQueue = useRef([]);
   const isProcessingQueue = useRef(false);
 
+  // Last score shown per evaluator, for dimensions the backend reuses on a revision
+  const lastScores = useRef({});
+
   // Helper: Update specific node status
-  const updateNodeStatus = (nodeId, status, score = undefined) => {
+  const updateNodeStatus = (nodeId, status, score = undefined, cached = undefined, reused = undefined, provisional = false) => {
+    if (score !== undefined && !provisional) lastScores.current[nodeId] = score;
     setNodes((nds) =>
       nds.map((node) => {
         if (node.id === nodeId) {
           const newData = { ...node.data, status };
           if (score !== undefined) newData.score = score;
+          if (cached !== undefined) newData.cached = cached;
+          if (reused !== undefined) newData.reused = reused;
+          if (score !== undefined) newData.provisional = provisional;
           return { ...node, data: newData };
         }
         return node;
@@ -76,7 +83,7 @@ function App() {
 
     isProcessingQueue.current = true;
     const event = eventQueue.current.shift(); // Dequeue
-    const { node, data } = event;
+    const { node, data, cached } = event;
 
     console.log("Processing Event:", node, "Data:", data);
 
@@ -107,7 +114,25 @@ function App() {
     if (node === 'eval_vocab') docScore = getScore(data.vocab_score);
     if (node === 'aggregate_score') docScore = getScore(data.total_score);
 
-    updateNodeStatus(node, 'completed', docScore);
+    // Speculative early fail: the evaluator was cancelled once the essay could no longer pass
+    const skipped = ['clarity', 'depth', 'vocab'].some((d) => node === `eval_${d}` && data[`${d}_score`] === null);
+
+    updateNodeStatus(node, skipped ? 'skipped' : 'completed', docScore, cached);
+
+    // Fused evaluation mode: one node carries all three dimension scores
+    if (node === 'eval_fused') {
+      updateNodeStatus('eval_clarity', 'completed', getScore(data.clarity_score), cached);
+      updateNodeStatus('eval_depth', 'completed', getScore(data.depth_score), cached);
+      updateNodeStatus('eval_vocab', 'completed', getScore(data.vocab_score), cached);
+    }
+
+    // Incremental re-evaluation: these dimensions kept the previous draft's score
+    if (node === 'aggregate_score' && Array.isArray(data.reused_scores)) {
+      data.reused_scores.forEach((dimension) => {
+        const evaluator = `eval_${dimension}`;
+        updateNodeStatus(evaluator, 'completed', lastScores.current[evaluator], false, true);
+      });
+    }
 
     // 4. Handle Logic
     const totalScore = getScore(data.total_score);
@@ -133,6 +158,29 @@ function App() {
     processQueue();
   };
 
+  // Local pre-scores arrive before any LLM call: show them on the evaluator cards straight away.
+  // A draft the pre-scoring gate rejects comes back with its feedback and no evaluation.
+  const handlePrescore = (event) => {
+    const { provisional_scores: scores, prescore_rejected: rejected, feedback } = event.data || {};
+    ['clarity', 'depth', 'vocab'].forEach((dimension) => {
+      if (scores && scores[dimension] !== undefined) {
+        updateNodeStatus(`eval_${dimension}`, rejected ? 'skipped' : 'idle', scores[dimension], false, false, true);
+      }
+    });
+    if (rejected) {
+      setFeedbackContent(feedback);
+      setIsFeedbackModalOpen(true);
+    }
+  };
+
+  // Token frames bypass the visual queue so feedback text appears as it is generated
+  const handleToken = (event) => {
+    if (event.node !== 'generate_feedback') return;
+    updateNodeStatus('generate_feedback', 'active');
+    setFeedbackContent((prev) => prev + event.content);
+    setIsFeedbackModalOpen(true);
+  };
+
 
   const handleStart = async () => {
     setStatus('generating_topic');
@@ -141,7 +189,7 @@ function App() {
     setFinalScore(null);
     setFeedbackContent('');
     // Clear node statuses
-    setNodes((nds) => nds.map(n => ({ ...n, data: { ...n.data, status: 'idle', score: undefined } })));
+    setNodes((nds) => nds.map(n => ({ ...n, data: { ...n.data, status: 'idle', score: undefined, cached: false, reused: false, provisional: false } })));
     updateNodeStatus('generate_topic', 'active');
 
     try {
@@ -171,12 +219,13 @@ function App() {
   const handleSubmitEssay = async (essayContent) => {
     setIsEssayModalOpen(false);
     setStatus('evaluating');
+    setFeedbackContent('');
     updateNodeStatus('collect_essay', 'completed');
 
     // Reset Evaluators for a fresh run
     setNodes((nds) => nds.map(n => {
       if (['eval_clarity', 'eval_depth', 'eval_vocab', 'aggregate_score', 'generate_feedback'].includes(n.id)) {
-        return { ...n, data: { ...n.data, status: 'idle', score: undefined } };
+        return { ...n, data: { ...n.data, status: 'idle', score: undefined, cached: false, reused: false, provisional: false } };
       }
       return n;
     }));
@@ -185,7 +234,7 @@ function App() {
       const response = await fetch('http://localhost:8000/submit-essay', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ thread_id: threadId, essay_content: essayContent }),
+        body: JSON.stringify({ thread_id: threadId, essay_content: essayContent, stream_tokens: true }),
       });
 
       const reader = response.body.getReader();
@@ -204,6 +253,14 @@ function App() {
           if (!line.trim()) continue;
           try {
             const event = JSON.parse(line);
+            if (event.type === 'token') {
+              handleToken(event);
+              continue;
+            }
+            if (event.node === 'prescore') {
+              handlePrescore(event);
+              continue;
+            }
             enqueueEvent(event); // Add to queue
           } catch (e) {
             console.error("Error parsing SSE:", e);
@@ -18,6 +18,9 @@ export default function CustomNode({ data }) {
         statusClasses = "bg-green-50 border-green-400 shadow-md";
         icon = <CheckCircle2 className="w-4 h-4 text-green-500 mb-2" />;
         labelColor = "text-green-800 font-medium";
+    } else if (data.status === 'skipped') {
+        statusClasses = "bg-gray-50 border-gray-300 border-dashed";
+        labelColor = "text-gray-500";
     } else if (data.status === 'error') {
         statusClasses = "bg-red-50 border-red-400";
         labelColor = "text-red-800";
@@ -40,10 +43,30 @@ export default function CustomNode({ data }) {
             {/* Show score if available with a nice badge look */}
             {data.score !== undefined && (
                 <div className="mt-2 text-xs font-bold px-2 py-0.5 bg-white/60 rounded-full border border-gray-200/50 text-gray-700">
-                    Score: {typeof data.score === 'object' ? JSON.stringify(data.score) : data.score}
+                    {data.provisional ? 'Provisional: ~' : 'Score: '}{typeof data.score === 'object' ? JSON.stringify(data.score) : data.score}
                 </div>
             )}
 
+            {/* Result reused from the evaluation cache */}
+            {data.cached && (
+                <div className="mt-1 text-[10px] font-semibold uppercase tracking-wide text-indigo-500">
+                    Cached
+                </div>
+            )}
+
+            {/* Score carried over from the previous draft (incremental re-evaluation) */}
+            {data.reused && (
+                <div className="mt-1 text-[10px] font-semibold uppercase tracking-wide text-amber-500">
+                    Reused
+                </div>
+            )}
+
+            {/* Evaluator cancelled because the essay could no longer pass (speculative early fail) */}
+            {data.status === 'skipped' && (
+                <div className="mt-1 text-[10px] font-semibold uppercase tracking-wide text-gray-400">
+                    Skipped
+                </div>
+            )}
 
             <Handle type="source" position={Position.Bottom} className="!w-1.5 !h-1.5 !bg-gray-400 !border-0" />
         </div>
@@ -1,157 +1,31 @@
 import os
-import operator
-from typing import TypedDict, List, Annotated
+import sys
+import uuid
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 
+# The CLI runs the backend's graph (backend/graph.py), sharing its nodes, settings, evaluation
+# cache, topic pool, checkpointer and metrics; only the interactive loop lives here.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
 load_dotenv()
+import graph
 
-# Define the Shared State
-class EssayState(TypedDict):
-    topic: str
-    essay_content: str
-    clarity_score: int
-    depth_score: int
-    vocab_score: int
-    total_score: int
-    feedback: str
-    revision_count: int
-
-# Initialize Gemini Model
-if not os.getenv("GOOGLE_API_KEY"):
-    print("Warning: GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
-
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.5)
-
-def generate_topic(state: EssayState):
-    """Generates a UPSC standard essay topic."""
-    print("Node: Generating Topic...")
-    prompt = "Generate a single, complex UPSC essay topic on social or economic issues. Output ONLY the topic text."
-    response = llm.invoke(prompt)
-    return {"topic": response.content.strip(), "revision_count": 0}
-
-def collect_essay(state: EssayState):
-    """
-    Placeholder for human input. 
-    State is updated externally before this node resumes.
-    """
-    pass 
-
-def eval_clarity(state: EssayState):
-    """Evaluates flow, coherence, and structure."""
-    print("Node: Evaluating Clarity...")
-    prompt = f"""
-    Evaluate the following essay on the topic '{state['topic']}' for CLARITY OF THOUGHT.
-    Score it out of 5. Return ONLY the integer score.
-    
-    Essay: {state['essay_content']}
-    """
-    response = llm.invoke(prompt)
-    try:
-        score = int(''.join(filter(str.isdigit, response.content)))
-    except:
-        score = 0
-    return {"clarity_score": score}
-
-def eval_depth(state: EssayState):
-    """Evaluates multidimensional analysis and evidence."""
-    print("Node: Evaluating Depth...")
-    prompt = f"""
-    Evaluate the following essay on the topic '{state['topic']}' for DEPTH OF ANALYSIS.
-    Did they cover social, political, economic dimensions?
-    Score it out of 5. Return ONLY the integer score.
-    
-    Essay: {state['essay_content']}
-    """
-    response = llm.invoke(prompt)
-    try:
-        score = int(''.join(filter(str.isdigit, response.content)))
-    except:
-        score = 0
-    return {"depth_score": score}
-
-def eval_vocab(state: EssayState):
-    """Evaluates language precision and vocabulary."""
-    print("Node: Evaluating Vocabulary...")
-    prompt = f"""
-    Evaluate the following essay on the topic '{state['topic']}' for LANGUAGE & VOCABULARY.
-    Score it out of 5. Return ONLY the integer score.
-    
-    Essay: {state['essay_content']}
+def build_app():
     """
-    response = llm.invoke(prompt)
-    try:
-        score = int(''.join(filter(str.isdigit, response.content)))
-    except:
-        score = 0
-    return {"vocab_score": score}
-
-def aggregate_score(state: EssayState):
-    """Sync node: Waits for parallel evaluations and sums them."""
-    print("Node: Aggregating Scores...")
-    total = state.get('clarity_score', 0) + state.get('depth_score', 0) + state.get('vocab_score', 0)
-    return {"total_score": total}
-
-def generate_feedback(state: EssayState):
-    """Generates feedback if the score is low."""
-    print("Node: Generating Feedback...")
-    prompt = f"""
-    The student scored {state['total_score']}/15.
-    Clarity: {state['clarity_score']}, Depth: {state['depth_score']}, Language: {state['vocab_score']}.
-    Provide 3 bullet points on how to improve this specific essay for the next draft.
+    The backend graph with its blocking nodes (the loop below streams synchronously),
+    compiled against the shared checkpointer and paused before collect_essay. Optional
+    stages (PRESCORE, NEAR_DUP) import NumPy only when they are on, and the Gemini client
+    is created on the first LLM call.
     """
-    response = llm.invoke(prompt)
-    return {"feedback": response.content}
-
-def check_pass_fail(state: EssayState):
-    if state['total_score'] >= 10:
-        return "pass"
-    return "fail"
-
-# Initialize Graph
-workflow = StateGraph(EssayState)
-
-# Add Nodes
-workflow.add_node("generate_topic", generate_topic)
-workflow.add_node("collect_essay", collect_essay)
-workflow.add_node("eval_clarity", eval_clarity)
-workflow.add_node("eval_depth", eval_depth)
-workflow.add_node("eval_vocab", eval_vocab)
-workflow.add_node("aggregate_score", aggregate_score)
-workflow.add_node("generate_feedback", generate_feedback)
-
-# Add Edges
-workflow.set_entry_point("generate_topic")
-workflow.add_edge("generate_topic", "collect_essay")
-
-workflow.add_edge("collect_essay", "eval_clarity")
-workflow.add_edge("collect_essay", "eval_depth")
-workflow.add_edge("collect_essay", "eval_vocab")
-
-workflow.add_edge("eval_clarity", "aggregate_score")
-workflow.add_edge("eval_depth", "aggregate_score")
-workflow.add_edge("eval_vocab", "aggregate_score")
-
-workflow.add_conditional_edges(
-    "aggregate_score",
-    check_pass_fail,
-    {
-        "pass": END,
-        "fail": "generate_feedback"
-    }
-)
-
-workflow.add_edge("generate_feedback", "collect_essay")
-
-checkpointer = MemorySaver()
-# interrupt_before=['collect_essay'] pauses the graph right before entering that node
-app = workflow.compile(checkpointer=checkpointer, interrupt_before=["collect_essay"])
+    from checkpointer import make_checkpointer
+    # interrupt_before=['collect_essay'] pauses the graph right before entering that node
+    return graph.build_workflow(execution_mode="sync").compile(checkpointer=make_checkpointer(),
+                                                               interrupt_before=["collect_essay"])
 
 if __name__ == "__main__":
-    # Configuration for the session
-    config = {"configurable": {"thread_id": "session_1"}}
+    app = build_app()
+    # A new thread per run: the checkpointer may persist (CHECKPOINTER=sqlite), and a fixed
+    # id would resume the previous run's session instead of starting a new one
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
 
     print("--- STARTING UPSC ESSAY EVALUATION WORKFLOW ---")
 
@@ -184,6 +58,11 @@ if __name__ == "__main__":
             
             # Resume the graph (pass None to indicate resumption from interrupt)
             for event in app.stream(None, config=config):
+                if event.get("prescore", {}).get("prescore_rejected"):
+                    print(f"\nREJECTED BEFORE EVALUATION:\n{event['prescore']['feedback']}")
+                if event.get("near_duplicate", {}).get("near_duplicate"):
+                    match = event["near_duplicate"]["near_duplicate"]
+                    print(f"\nNEAR-DUPLICATE of a graded essay ({match['similarity']:.0%} similar), scores {match['scores']}")
                 if "aggregate_score" in event:
                     scores = event['aggregate_score']
                     print(f"\nTotal Score: {scores['total_score']}/15")